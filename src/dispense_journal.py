@@ -0,0 +1,122 @@
+# keglevel app
+#
+# dispense_journal.py
+import os
+import time
+import threading
+
+JOURNAL_BATCH_RECORDS = 20        # fsync after this many records...
+JOURNAL_FSYNC_INTERVAL_S = 2.0    # ...or once the oldest unsynced record is this old
+
+
+class DispenseJournal:
+    """
+    Append-only log of dispensed volume, one line per pour tick:
+
+        <seq> <timestamp> <keg_id> <delta_liters> <pulses>
+
+    Records are written as they happen and fsynced in batches, so a crash
+    loses at most one batch. SettingsManager folds the journal into
+    keg_library.json from time to time (compaction) and replays whatever is
+    left over on startup. Sequence numbers let a replay skip records that a
+    compaction already saved, even if the app died before truncating.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.last_seq = 0
+        self.record_count = 0           # Records written since the last reset
+        self._file = None
+        self._unsynced = 0
+        self._first_unsynced_time = 0.0
+        self._lock = threading.Lock()
+
+    def append(self, keg_id, delta_liters, pulses, timestamp=None):
+        if timestamp is None: timestamp = time.time()
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self.last_seq += 1
+                self._file.write(f"{self.last_seq} {timestamp:.3f} {keg_id} {delta_liters:.6f} {int(pulses)}\n")
+                self.record_count += 1
+                if self._unsynced == 0: self._first_unsynced_time = time.monotonic()
+                self._unsynced += 1
+                if (self._unsynced >= JOURNAL_BATCH_RECORDS or
+                        time.monotonic() - self._first_unsynced_time >= JOURNAL_FSYNC_INTERVAL_S):
+                    self._sync_locked()
+            except Exception as e:
+                print(f"DispenseJournal: Error appending record: {e}")
+
+    def sync(self):
+        """Flushes and fsyncs any buffered records (call at pour end)."""
+        with self._lock:
+            try: self._sync_locked()
+            except Exception as e: print(f"DispenseJournal: Error syncing journal: {e}")
+
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def replay(self):
+        """
+        Returns every intact record on disk as (seq, timestamp, keg_id,
+        delta_liters, pulses). A torn final line from a crash is skipped.
+        """
+        records = []
+        with self._lock:
+            if not os.path.exists(self.path): return records
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        rec = self._parse(line)
+                        if rec: records.append(rec)
+            except Exception as e:
+                print(f"DispenseJournal: Error reading journal: {e}")
+            if records:
+                self.last_seq = max(self.last_seq, records[-1][0])
+                self.record_count = len(records)
+        return records
+
+    def reset(self, through_seq):
+        """
+        Drops records up to and including through_seq once they have been
+        compacted into the keg library. Anything appended after the
+        compaction snapshot is kept.
+        """
+        with self._lock:
+            try:
+                self._sync_locked()
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                keep = []
+                if self.last_seq > through_seq and os.path.exists(self.path):
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        keep = [line for line in f if (self._parse(line) or (0,))[0] > through_seq]
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.writelines(keep)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.record_count = len(keep)
+            except Exception as e:
+                print(f"DispenseJournal: Error truncating journal: {e}")
+
+    def close(self):
+        with self._lock:
+            try: self._sync_locked()
+            except Exception: pass
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def _parse(line):
+        parts = line.split()
+        if len(parts) != 5: return None
+        try:
+            return int(parts[0]), float(parts[1]), parts[2], float(parts[3]), int(parts[4])
+        except ValueError:
+            return None
@@ -0,0 +1,102 @@
+# keglevel app
+#
+# expander_pins.py
+#
+# Flow sensors wired to a GPIO expander (or any other external edge counter)
+# show up in the pin map as "virtual" pins: strings of the form
+# "<driver>:<channel>", e.g. "mock:3". Plain integers stay BCM GPIO pins.
+#
+# A driver owns the channels of its pins and reports edges through the
+# on_edges(pin, count, timestamp) callback it is started with. Drivers are
+# looked up by name in EXPANDER_DRIVERS; hardware drivers register themselves
+# with register_expander_driver().
+import abc
+import threading
+import time
+
+
+class ExpanderDriver(abc.ABC):
+    """Base class for drivers that back virtual flow sensor pins; subclasses must implement start()."""
+
+    name = None
+
+    @abc.abstractmethod
+    def start(self, pins, on_edges):
+        """Begins reporting edges for pins (full "<driver>:<channel>" specs)."""
+
+    def stop(self):
+        pass
+
+
+class MockExpanderDriver(ExpanderDriver):
+    """Driver with no hardware behind it; call inject() to simulate edges."""
+
+    name = "mock"
+
+    def __init__(self):
+        self.pins = []
+        self._on_edges = None
+        self._lock = threading.Lock()
+
+    def start(self, pins, on_edges):
+        self.pins = list(pins)
+        self._on_edges = on_edges
+
+    def inject(self, channel, count=1, timestamp=None):
+        if self._on_edges is None: return
+        if timestamp is None: timestamp = time.monotonic()
+        with self._lock:
+            self._on_edges(f"{self.name}:{channel}", count, timestamp)
+
+    def stop(self):
+        self._on_edges = None
+
+
+EXPANDER_DRIVERS = {"mock": MockExpanderDriver}
+
+
+def register_expander_driver(name, factory):
+    """Makes "<name>:<channel>" pins available; factory() returns a driver."""
+    EXPANDER_DRIVERS[name] = factory
+
+
+def is_virtual_pin(pin):
+    return isinstance(pin, str)
+
+
+def parse_pin(pin):
+    """
+    Validates one pin map entry. Returns the BCM pin as an int, or the
+    normalised "<driver>:<channel>" string for a virtual pin. Raises
+    ValueError for anything else.
+    """
+    if isinstance(pin, bool): raise ValueError(f"invalid flow sensor pin {pin!r}")
+    if isinstance(pin, int):
+        if not 0 <= pin <= 27: raise ValueError(f"BCM pin {pin} is out of range")
+        return pin
+    if isinstance(pin, str) and ":" in pin:
+        driver, _, channel = pin.partition(":")
+        driver = driver.strip()
+        if driver and channel.strip().isdigit():
+            return f"{driver}:{int(channel)}"
+    raise ValueError(f"invalid flow sensor pin {pin!r}")
+
+
+def start_expanders(pins, on_edges):
+    """
+    Starts one driver per driver name used in pins and returns them as
+    {name: driver}. Unknown driver names raise ValueError, and a driver
+    missing start() raises TypeError, before any driver is started.
+    """
+    by_driver = {}
+    for pin in pins:
+        if is_virtual_pin(pin):
+            by_driver.setdefault(pin.partition(":")[0], []).append(pin)
+    unknown = [name for name in by_driver if name not in EXPANDER_DRIVERS]
+    if unknown: raise ValueError(f"no expander driver registered for {', '.join(unknown)}")
+
+    drivers = {name: EXPANDER_DRIVERS[name]() for name in by_driver}
+    for name, driver_pins in by_driver.items():
+        drivers[name].start(driver_pins, on_edges)
+        print(f"[Expander] {name}: watching {len(driver_pins)} channel(s)")
+    return drivers
@@ -0,0 +1,210 @@
+# gpiochip_sensor_logic.py
+# Linux GPIO character-device backend for KegLevel Lite.
+#
+# Implements the same interface as SensorLogic (it is a subclass) but instead
+# of one RPi.GPIO callback per pulse it asks the kernel for rising-edge events
+# on all flow sensor lines at once and reads them from /dev/gpiochipN in
+# batches. Each event carries a CLOCK_MONOTONIC kernel timestamp, which goes
+# straight into the SensorLogic pulse ring buffers.
+#
+# Uses the GPIO uAPI v2 ioctls (Linux 5.10+, i.e. Raspberry Pi OS Bullseye
+# and later). MockGpioChip stands in for the device on other machines.
+
+import os
+import select
+import struct
+import threading
+import time
+import fcntl
+
+import sensor_logic
+from sensor_logic import SensorLogic, PIN_TO_SLOT, FLOW_DEBOUNCE_MS
+
+DEFAULT_GPIOCHIP   = "/dev/gpiochip0"
+GPIOCHIP_CONSUMER  = "keglevel"
+EVENT_BATCH_SIZE   = 64      # max edge events pulled per read()
+EVENT_BUFFER_SIZE  = 1024    # kernel-side event queue for the line request
+READER_POLL_S      = 0.5     # select() timeout so the reader notices shutdown
+
+# --- GPIO uAPI v2 (include/uapi/linux/gpio.h) ---
+_GPIO_V2_GET_LINE_IOCTL    = 0xC250B407   # _IOWR(0xB4, 0x07, struct gpio_v2_line_request)
+_GPIO_V2_LINES_MAX         = 64
+_GPIO_V2_LINE_FLAG_INPUT          = 1 << 2
+_GPIO_V2_LINE_FLAG_EDGE_RISING    = 1 << 4
+_GPIO_V2_LINE_FLAG_BIAS_PULL_DOWN = 1 << 9
+_GPIO_V2_LINE_ATTR_ID_DEBOUNCE    = 3
+
+# struct gpio_v2_line_request is 592 bytes; fields are packed at their
+# kernel offsets (the config block is 8-byte aligned, attrs are 24 bytes each).
+_LINE_REQUEST_SIZE    = 592
+_OFF_OFFSETS          = 0      # u32 offsets[64]
+_OFF_CONSUMER         = 256    # char consumer[32]
+_OFF_CONFIG_FLAGS     = 288    # u64 config.flags
+_OFF_CONFIG_NUM_ATTRS = 296    # u32 config.num_attrs
+_OFF_CONFIG_ATTRS     = 320    # {u32 id, u32 pad, u64 value, u64 mask} attrs[10]
+_OFF_NUM_LINES        = 560    # u32 num_lines
+_OFF_EVENT_BUF_SIZE   = 564    # u32 event_buffer_size
+_OFF_FD               = 588    # s32 fd (filled in by the kernel)
+
+# struct gpio_v2_line_event: timestamp_ns, id, offset, seqno, line_seqno, pad[6]
+LINE_EVENT = struct.Struct("=QIIII24x")
+
+
+def _pack_line_request(offsets, debounce_us, consumer):
+    buf = bytearray(_LINE_REQUEST_SIZE)
+    struct.pack_into("=%dI" % len(offsets), buf, _OFF_OFFSETS, *offsets)
+    struct.pack_into("=31s", buf, _OFF_CONSUMER, consumer.encode())
+    flags = _GPIO_V2_LINE_FLAG_INPUT | _GPIO_V2_LINE_FLAG_EDGE_RISING | _GPIO_V2_LINE_FLAG_BIAS_PULL_DOWN
+    struct.pack_into("=Q", buf, _OFF_CONFIG_FLAGS, flags)
+    if debounce_us > 0:
+        all_lines = (1 << len(offsets)) - 1
+        struct.pack_into("=I", buf, _OFF_CONFIG_NUM_ATTRS, 1)
+        struct.pack_into("=IIQQ", buf, _OFF_CONFIG_ATTRS, _GPIO_V2_LINE_ATTR_ID_DEBOUNCE, 0, int(debounce_us), all_lines)
+    struct.pack_into("=I", buf, _OFF_NUM_LINES, len(offsets))
+    struct.pack_into("=I", buf, _OFF_EVENT_BUF_SIZE, EVENT_BUFFER_SIZE)
+    return buf
+
+
+class GpioChip:
+    """Requests rising-edge events for a set of lines on /dev/gpiochipN."""
+
+    def __init__(self, path=DEFAULT_GPIOCHIP):
+        self.path = path
+        self._chip_fd = None
+        self._line_fd = None
+
+    def request_edge_events(self, offsets, debounce_us=0, consumer=GPIOCHIP_CONSUMER):
+        """Returns a file descriptor that yields LINE_EVENT records."""
+        if len(offsets) > _GPIO_V2_LINES_MAX:
+            raise ValueError(f"at most {_GPIO_V2_LINES_MAX} lines per request")
+        self._chip_fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            buf = _pack_line_request(offsets, debounce_us, consumer)
+            try:
+                fcntl.ioctl(self._chip_fd, _GPIO_V2_GET_LINE_IOCTL, buf, True)
+            except OSError:
+                if not debounce_us: raise
+                # Some chips refuse debounce; fall back to raw edges
+                print(f"[GpioChip] Debounce not supported on {self.path}, requesting raw edges.")
+                buf = _pack_line_request(offsets, 0, consumer)
+                fcntl.ioctl(self._chip_fd, _GPIO_V2_GET_LINE_IOCTL, buf, True)
+            self._line_fd = struct.unpack_from("=i", buf, _OFF_FD)[0]
+        finally:
+            # The line request keeps its own reference to the chip
+            os.close(self._chip_fd)
+            self._chip_fd = None
+        return self._line_fd
+
+    def close(self):
+        if self._line_fd is not None:
+            try: os.close(self._line_fd)
+            except OSError: pass
+            self._line_fd = None
+
+
+class MockGpioChip:
+    """
+    Stand-in for /dev/gpiochipN. The returned descriptor is a pipe carrying
+    the same LINE_EVENT records the kernel would produce, so the reader and
+    parser are exercised unchanged. Call inject_edges() to simulate pulses.
+    """
+
+    def __init__(self, path="mock"):
+        self.path = path
+        self.offsets = []
+        self.debounce_us = 0
+        self._read_fd = None
+        self._write_fd = None
+        self._seqno = 0
+        self._lock = threading.Lock()
+
+    def request_edge_events(self, offsets, debounce_us=0, consumer=GPIOCHIP_CONSUMER):
+        self.offsets = list(offsets)
+        self.debounce_us = debounce_us
+        self._read_fd, self._write_fd = os.pipe()
+        return self._read_fd
+
+    def inject_edges(self, offset, count=1, timestamp_ns=None, spacing_ns=0):
+        """Queues count rising edges on a line, spaced spacing_ns apart."""
+        if self._write_fd is None: return
+        if timestamp_ns is None: timestamp_ns = time.monotonic_ns()
+        with self._lock:
+            records = bytearray()
+            for i in range(count):
+                self._seqno += 1
+                records += LINE_EVENT.pack(timestamp_ns + i * spacing_ns, 1, offset, self._seqno, self._seqno)
+            os.write(self._write_fd, bytes(records))
+
+    def close(self):
+        for fd in (self._write_fd, self._read_fd):
+            if fd is not None:
+                try: os.close(fd)
+                except OSError: pass
+        self._read_fd = self._write_fd = None
+
+
+class GpioChipSensorLogic(SensorLogic):
+    """
+    SensorLogic variant that reads batched kernel edge events instead of
+    registering one RPi.GPIO interrupt callback per pulse.
+    """
+
+    def __init__(self, num_sensors_from_config, ui_callbacks, settings_manager, chip=None):
+        super().__init__(num_sensors_from_config, ui_callbacks, settings_manager)
+        self.chip = chip if chip is not None else GpioChip(settings_manager.get_gpiochip_device() or DEFAULT_GPIOCHIP)
+        self._event_fd = None
+        self._reader_running = False
+        self._reader_thread = None
+        self.events_read = 0
+        self.batches_read = 0
+
+    def _setup_gpios(self):
+        if self._reader_thread is not None and self._reader_thread.is_alive():
+            return
+        self._setup_expanders()
+        if not self.gpio_pins: return
+        self._event_fd = self.chip.request_edge_events(self.gpio_pins, FLOW_DEBOUNCE_MS * 1000)
+        print(f"[GpioChip] Watching lines {self.gpio_pins} on {self.chip.path}")
+        self._reader_running = True
+        self._reader_thread = threading.Thread(target=self._event_reader_loop, daemon=True)
+        self._reader_thread.start()
+
+    def _event_reader_loop(self):
+        fd = self._event_fd
+        pending = b""
+        edges = [[] for _ in sensor_logic.FLOW_SENSOR_PINS]
+        while self._reader_running:
+            try:
+                ready, _, _ = select.select([fd], [], [], READER_POLL_S)
+                if not ready: continue
+                data = os.read(fd, LINE_EVENT.size * EVENT_BATCH_SIZE)
+            except (OSError, ValueError):
+                break
+            if not data: break
+
+            # Pipes (MockGpioChip) may split a record; the kernel never does
+            data = pending + data
+            usable = len(data) - (len(data) % LINE_EVENT.size)
+            pending = data[usable:]
+
+            for timestamp_ns, _id, offset, _seq, _line_seq in LINE_EVENT.iter_unpack(data[:usable]):
+                slot = PIN_TO_SLOT.get(offset)
+                if slot is not None: edges[slot].append(timestamp_ns / 1e9)
+            for slot, stamps in enumerate(edges):
+                if stamps:
+                    sensor_logic.record_edges(slot, stamps)
+                    self.events_read += len(stamps)
+                    stamps.clear()
+            self.batches_read += 1
+
+    def cleanup_gpio(self):
+        self._running = False
+        self._reader_running = False
+        self.stop_pulse_trace()
+        self._stop_expanders()
+        if self._reader_thread is not None:
+            self._reader_thread.join(timeout=READER_POLL_S * 2)
+            self._reader_thread = None
+        self.chip.close()
+        self._event_fd = None
+        print("[GpioChip] Edge event request released.")
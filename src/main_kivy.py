@@ -59,12 +59,23 @@ from kivy.metrics import Metrics
 
 # --- 2. IMPORT BACKEND LOGIC ---
 from settings_manager import SettingsManager, UNASSIGNED_KEG_ID, UNASSIGNED_BEVERAGE_ID
+from settings_events import KEG_UPDATED, BEVERAGES_CHANGED, ASSIGNMENT_CHANGED, K_FACTORS_CHANGED, UNITS_CHANGED
 from sensor_logic import SensorLogic, FLOW_SENSOR_PINS
 try:
     from pico_sensor_logic import PicoSensorLogic
     _PICO_BACKEND_AVAILABLE = True
 except ImportError:
     _PICO_BACKEND_AVAILABLE = False
+try:
+    from pico_federation import FederatedPicoSensorLogic
+    _FEDERATION_BACKEND_AVAILABLE = True
+except ImportError:
+    _FEDERATION_BACKEND_AVAILABLE = False
+try:
+    from gpiochip_sensor_logic import GpioChipSensorLogic
+    _GPIOCHIP_BACKEND_AVAILABLE = True
+except ImportError:
+    _GPIOCHIP_BACKEND_AVAILABLE = False
 from notification_manager import NotificationManager
 from version import APP_VERSION
 
@@ -141,6 +152,8 @@ class SettingsConfigTab(BoxLayout):
             else:
                 self.ids.btn_metric.state = 'down'
                 self.ids.btn_imperial.state = 'normal'
+            # One choice per tap the controller has (pin map or Pico nodes), not a fixed 5
+            self.ids.spin_taps.values = [str(n) for n in range(1, app.settings_manager.num_sensors + 1)]
             taps = app.settings_manager.get_displayed_taps()
             self.ids.spin_taps.text = str(taps)
             # Sensor backend
@@ -180,43 +193,24 @@ class SettingsConfigTab(BoxLayout):
         known_host = self.ids.txt_pico_host.text.strip()
 
         def _verify_or_scan():
-            from pico_sensor_logic import scan_for_pico, get_local_subnet_prefix
-            import json
-            ip = None
-            if known_host:
-                # Fast path: just confirm the already-configured IP responds
-                try:
-                    import urllib.request as _ur
-                    req = _ur.Request(
-                        f"http://{known_host}/api/version",
-                        headers={"Accept": "application/json"}
-                    )
-                    with _ur.urlopen(req, timeout=2.0) as resp:
-                        data = json.loads(resp.read().decode())
-                        if "version" in data:
-                            ip = known_host
-                except Exception:
-                    pass
-                if ip is None:
-                    # Known host didn't respond — fall back to full scan
-                    from kivy.clock import Clock
-                    Clock.schedule_once(lambda dt: setattr(btn, 'text', 'Scanning...'))
-                    prefix = get_local_subnet_prefix()
-                    ip = scan_for_pico(prefix) if prefix else None
-                else:
-                    from kivy.clock import Clock
-                    Clock.schedule_once(lambda dt: setattr(btn, 'text', 'Verifying...'))
-            else:
-                # No host configured — do a full subnet scan
-                from kivy.clock import Clock
-                Clock.schedule_once(lambda dt: setattr(btn, 'text', 'Scanning...'))
-                prefix = get_local_subnet_prefix()
-                ip = scan_for_pico(prefix) if prefix else None
-
+            from pico_scanner import find_pico, parse_networks
             from kivy.clock import Clock
-            Clock.schedule_once(lambda dt: self._on_find_pico_result(ip))
-
-        btn.text = "Verifying..." if known_host else "Scanning..."
+            app = App.get_running_app()
+            networks = None
+            preferred = [app.settings_manager.get_pico_last_known_ip()]
+            if "/" in known_host:
+                # A CIDR range in the host field: scan just that range
+                try: networks = parse_networks(known_host.split(","))
+                except ValueError: networks = []
+            elif known_host:
+                # The configured host is probed first; a full scan only runs if it stays silent
+                preferred.insert(0, known_host)
+            result = find_pico(networks, preferred)
+            if result["ip"]:
+                app.settings_manager.save_pico_last_known_ip(result["ip"])
+            Clock.schedule_once(lambda dt: self._on_find_pico_result(result["ip"]))
+
+        btn.text = "Verifying..." if known_host and "/" not in known_host else "Scanning..."
         threading.Thread(target=_verify_or_scan, daemon=True).start()
 
     def _on_find_pico_result(self, ip):
@@ -278,6 +272,9 @@ class SettingsUpdatesTab(BoxLayout):
         if hasattr(app, 'sensor_logic') and app.sensor_logic:
             app.sensor_logic.stop_monitoring()
             app.sensor_logic.cleanup_gpio()
+        # execv skips atexit handlers, so write out pending settings now
+        if hasattr(app, 'settings_manager'):
+            app.settings_manager.flush()
 
         # 2. Exec new process
         python = sys.executable
@@ -806,7 +803,6 @@ class KegEditScreen(Screen):
         
         # 7. Refresh
         app.refresh_keg_list()
-        app.refresh_dashboard_metadata()
         app.sensor_logic.force_recalculation()
         app.navigate_to('inventory')
 
@@ -1126,11 +1122,9 @@ class SettingsAlertsTab(BoxLayout):
         cond["high_temp_f"]      = float(self.ids.slider_high_temp.value)
         app.settings_manager.save_conditional_notification_settings(cond)
 
+        # NotificationManager reschedules itself on the change events of these saves
         print("SettingsAlertsTab: Notification settings saved.")
 
-        if hasattr(app, "notification_manager") and app.notification_manager:
-            Clock.schedule_once(lambda dt: app.notification_manager.force_reschedule(), 0.1)
-
     def save_all_settings(self):
         """Save settings and remain on the tab."""
         self._save_to_backend()
@@ -1343,28 +1337,51 @@ class KegLevelApp(App):
         # 5. Define Logic Callbacks
         def bridge_callback(idx, rate, rem, status, pour_vol):
             Clock.schedule_once(lambda dt: self.update_tap_ui(idx, rate, rem, status, pour_vol))
+
+        def batch_bridge_callback(updates):
+            # One main-thread hop per sensor tick, however many taps changed
+            Clock.schedule_once(lambda dt: self.update_tap_ui_batch(updates))
         
         def cal_bridge_callback(idx, pulses):
              cal_tab = self.settings_screen.ids.get('tab_cal_content') 
              if cal_tab:
                  Clock.schedule_once(lambda dt: cal_tab.update_pulse_data(idx, pulses))
 
+        def ui_thread_callback(fn):
+            # Completion callbacks of queued Pico writes
+            Clock.schedule_once(lambda dt: fn())
+
         callbacks = {
             "update_sensor_data_cb": bridge_callback,
+            "update_sensor_batch_cb": batch_bridge_callback,
             "update_cal_data_cb": lambda x, y: None, 
-            "auto_cal_pulse_cb": cal_bridge_callback 
+            "auto_cal_pulse_cb": cal_bridge_callback,
+            "run_on_ui_cb": ui_thread_callback
         }
 
         # 6. Initialize Sensor Logic (GPIO or Pico W backend)
         sensor_backend = self.settings_manager.get_sensor_backend()
         if sensor_backend == 'pico_w' and _PICO_BACKEND_AVAILABLE:
-            print(f"[App] Using Pico W sensor backend.")
-            self.sensor_logic = PicoSensorLogic(self.num_sensors, callbacks, self.settings_manager)
+            if len(self.settings_manager.get_pico_nodes()) > 1 and _FEDERATION_BACKEND_AVAILABLE:
+                print(f"[App] Using Pico W sensor backend across {len(self.settings_manager.get_pico_nodes())} Picos.")
+                self.sensor_logic = FederatedPicoSensorLogic(self.num_sensors, callbacks, self.settings_manager)
+            else:
+                print(f"[App] Using Pico W sensor backend.")
+                self.sensor_logic = PicoSensorLogic(self.num_sensors, callbacks, self.settings_manager)
         else:
             if sensor_backend == 'pico_w':
                 print("[App] Pico W backend requested but pico_sensor_logic.py not found — falling back to GPIO.")
-            self.sensor_logic = SensorLogic(self.num_sensors, callbacks, self.settings_manager)
+            if self.settings_manager.get_gpiochip_device() and _GPIOCHIP_BACKEND_AVAILABLE:
+                print(f"[App] Using gpiochip edge events on {self.settings_manager.get_gpiochip_device()}.")
+                self.sensor_logic = GpioChipSensorLogic(self.num_sensors, callbacks, self.settings_manager)
+            else:
+                self.sensor_logic = SensorLogic(self.num_sensors, callbacks, self.settings_manager)
         
+        # Saved changes reach the UI as SettingsManager events, on this thread;
+        # the trigger folds a burst of them into one dashboard refresh per frame
+        self._dashboard_refresh = Clock.create_trigger(lambda dt: self.refresh_dashboard_metadata())
+        self.settings_manager.subscribe(self.on_settings_changed, run_on_ui=ui_thread_callback)
+
         # 7. Refresh UI & Start Hardware
         self.refresh_dashboard_metadata()
         self.refresh_keg_list()
@@ -1561,6 +1578,10 @@ class KegLevelApp(App):
         print("Simulation: All flows stopped.")
 
     
+    def update_tap_ui_batch(self, updates):
+        for idx, rate, rem, status, pour_vol in updates:
+            self.update_tap_ui(idx, rate, rem, status, pour_vol)
+
     def update_tap_ui(self, idx, rate, rem, status, pour_vol):
         if idx >= len(self.tap_widgets): return
         widget = self.tap_widgets[idx]
@@ -1573,7 +1594,7 @@ class KegLevelApp(App):
             widget.percent_full = 0
             return
             
-        units = self.settings_manager.get_display_units()
+        units = self.settings_manager.get_config_snapshot().display_units
         if units == "metric": widget.remaining_text = f"{rem:.2f} L"
         else: widget.remaining_text = f"{(rem * LITERS_TO_GAL):.2f} Gal"
         
@@ -1586,6 +1607,27 @@ class KegLevelApp(App):
         percent = (rem / max_vol) * 100.0
         widget.percent_full = max(0, min(100, percent))
 
+    def on_settings_changed(self, event):
+        """SettingsManager change event (on the Kivy thread)."""
+        if event.kind in (KEG_UPDATED, BEVERAGES_CHANGED, ASSIGNMENT_CHANGED):
+            self._dashboard_refresh()
+        elif event.kind == UNITS_CHANGED:
+            # Re-sends every tap, so remaining volumes redraw in the new units
+            if getattr(self, 'sensor_logic', None): self.sensor_logic.force_recalculation()
+        elif event.kind == K_FACTORS_CHANGED:
+            self._push_k_factors(list(event.value))
+
+    def _push_k_factors(self, factors):
+        """Pico backend: the Pico converts pulses itself, so it needs the new K-factors (sent in the background)."""
+        if not hasattr(getattr(self, 'sensor_logic', None), 'push_k_factors_to_pico'): return
+
+        def on_done(result):
+            if not result:
+                cal_tab = self.settings_screen.ids.get('tab_cal_content')
+                if cal_tab:
+                    cal_tab.instruction_text = "Saved, but the Pico could not be updated. Save again when it is online."
+        self.sensor_logic.push_k_factors_to_pico(factors, on_done=on_done)
+
     def refresh_dashboard_metadata(self):
         assignments = self.settings_manager.get_sensor_keg_assignments()
         bev_assigns = self.settings_manager.get_sensor_beverage_assignments()
@@ -1721,7 +1763,6 @@ class KegLevelApp(App):
             self.settings_manager.save_sensor_beverage_assignment(tap_index, b_id)
             
         self.sensor_logic.force_recalculation()
-        self.refresh_dashboard_metadata()
         self.update_tap_ui(tap_index, 0, 0, "Idle", 0)
         
     def prepare_keg_kick_screen(self, tap_index, popup):
@@ -1809,7 +1850,6 @@ class KegLevelApp(App):
 
         # 4. Refresh System
         self.sensor_logic.force_recalculation()
-        self.refresh_dashboard_metadata()
         self.update_tap_ui(tap_index, 0, 0, "Idle", 0)
 
         # 5. Close Popup
@@ -1880,7 +1920,6 @@ class KegLevelApp(App):
     def perform_delete_keg(self, keg_id):
         self.settings_manager.delete_keg_definition(keg_id)
         self.refresh_keg_list()
-        self.refresh_dashboard_metadata()
         self.sensor_logic.force_recalculation()
 
     def add_new_keg(self): self.open_keg_edit(None)
@@ -1991,7 +2030,6 @@ class KegLevelApp(App):
         
         self.settings_manager.save_beverage_library(lib)
         self.refresh_beverage_list()
-        self.refresh_dashboard_metadata()
         self.navigate_to('inventory')
     
     def request_delete_beverage(self, bev_id):
@@ -2067,7 +2105,6 @@ class KegLevelApp(App):
         # 5. Refresh System
         self.refresh_beverage_list()
         self.refresh_keg_list()
-        self.refresh_dashboard_metadata()
         if hasattr(self, 'sensor_logic') and self.sensor_logic:
             self.sensor_logic.force_recalculation()
 
@@ -2092,15 +2129,32 @@ class KegLevelApp(App):
             
         def bridge_callback(idx, rate, rem, status, pour_vol):
             Clock.schedule_once(lambda dt: self.update_tap_ui(idx, rate, rem, status, pour_vol))
+
+        def batch_bridge_callback(updates):
+            Clock.schedule_once(lambda dt: self.update_tap_ui_batch(updates))
+
+        def ui_thread_callback(fn):
+            Clock.schedule_once(lambda dt: fn())
             
         callbacks = {
             "update_sensor_data_cb": bridge_callback,
-            "update_cal_data_cb": lambda x, y: None 
+            "update_sensor_batch_cb": batch_bridge_callback,
+            "update_cal_data_cb": lambda x, y: None,
+            "run_on_ui_cb": ui_thread_callback
         }
 
         sensor_backend = self.settings_manager.get_sensor_backend()
         if sensor_backend == 'pico_w' and _PICO_BACKEND_AVAILABLE:
-            self.sensor_logic = PicoSensorLogic(
+            pico_class = PicoSensorLogic
+            if len(self.settings_manager.get_pico_nodes()) > 1 and _FEDERATION_BACKEND_AVAILABLE:
+                pico_class = FederatedPicoSensorLogic
+            self.sensor_logic = pico_class(
+                num_sensors_from_config=self.num_sensors,
+                ui_callbacks=callbacks,
+                settings_manager=self.settings_manager
+            )
+        elif self.settings_manager.get_gpiochip_device() and _GPIOCHIP_BACKEND_AVAILABLE:
+            self.sensor_logic = GpioChipSensorLogic(
                 num_sensors_from_config=self.num_sensors,
                 ui_callbacks=callbacks,
                 settings_manager=self.settings_manager
@@ -2138,6 +2192,10 @@ class KegLevelApp(App):
         if hasattr(self, 'sensor_logic') and self.sensor_logic:
             self.sensor_logic.cleanup_gpio()
 
+        # Last, so the window geometry and final tap totals are written too
+        if hasattr(self, 'settings_manager'):
+            self.settings_manager.flush()
+
 def run_splash_screen(queue):
     """
     Runs a standalone Tkinter loading dialog in a separate process.
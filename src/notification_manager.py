@@ -8,6 +8,8 @@ import smtplib
 from datetime import datetime
 from email.mime.text import MIMEText
 
+from settings_events import NOTIFICATIONS_CHANGED
+
 # --- Constants ---
 
 FREQUENCY_SECONDS = {
@@ -20,6 +22,7 @@ FREQUENCY_SECONDS = {
 CONDITIONAL_CHECK_INTERVAL_S = 60   # How often to evaluate conditional alerts
 TEMP_ALERT_COOLDOWN_S = 7200        # 2 hours between repeated temperature alerts
 ERROR_DEBOUNCE_S = 3600             # 1 hour between repeated error log entries
+SCHEDULER_MIN_WAIT_S = 10.0         # Shortest sleep between ticks (a failed push retries at this rate)
 
 # Sentinel values matching the OFF positions on the settings sliders.
 # If a stored value equals the sentinel, that alert type is disabled.
@@ -43,7 +46,9 @@ class NotificationManager:
     ------------
     * Email-only (no SMS).  Frequency = "None" disables push emails entirely.
     * A single daemon thread drives both push and conditional scheduling.
-    * All settings are read fresh from SettingsManager on every tick so that
+    * The thread sleeps until the next push or conditional check is due.
+      Settings are read fresh on every tick, and a NOTIFICATIONS_CHANGED
+      event from SettingsManager wakes it (and reschedules the push) so
       changes saved from the UI take effect without restarting.
     * Conditional alert state is persisted through SettingsManager helpers so
       that sent-flags survive an app restart.
@@ -66,6 +71,7 @@ class NotificationManager:
         self._scheduler_running = False
         self._scheduler_thread  = None
         self._scheduler_event   = threading.Event()
+        self._unsubscribe       = lambda: None
 
         # Tracks when the last scheduled push email was sent
         self.last_push_sent_time = 0
@@ -85,6 +91,8 @@ class NotificationManager:
 
         self._scheduler_running = True
         self._scheduler_event.clear()
+        self._unsubscribe = self.settings_manager.subscribe(
+            self._on_settings_changed, kinds=(NOTIFICATIONS_CHANGED,))
 
         # Initialise the push timer so the first notification fires ~60 s
         # after startup rather than immediately.
@@ -118,6 +126,7 @@ class NotificationManager:
             return
         print("[NotificationManager] Stopping scheduler...")
         self._scheduler_running = False
+        self._unsubscribe()
         self._scheduler_event.set()
         if self._scheduler_thread and self._scheduler_thread.is_alive():
             self._scheduler_thread.join(timeout=3)
@@ -143,6 +152,13 @@ class NotificationManager:
 
         self._scheduler_event.set()   # Wake the loop immediately
 
+    def _on_settings_changed(self, event):
+        """SettingsManager change event (runs on the thread that saved)."""
+        if event.value == "push":
+            self.force_reschedule()
+        else:
+            self._scheduler_event.set()   # Re-evaluate with the new thresholds
+
     def send_manual_status(self):
         """
         Send a status email immediately on demand (UI TEST SEND button).
@@ -165,6 +181,8 @@ class NotificationManager:
     def _scheduler_loop(self):
         print("[NotificationManager] Scheduler loop running.")
         while self._scheduler_running:
+            # Cleared before reading settings, so a change saved during the tick still wakes the next wait
+            self._scheduler_event.clear()
             now = time.time()
 
             # 1. Scheduled push notification
@@ -182,9 +200,11 @@ class NotificationManager:
                 self._check_conditional_alerts()
                 self.last_conditional_check_time = now
 
-            # Wait up to 10 s before the next tick
-            self._scheduler_event.clear()
-            self._scheduler_event.wait(timeout=10.0)
+            # Sleep until the next push or conditional check is due
+            next_due = self.last_conditional_check_time + CONDITIONAL_CHECK_INTERVAL_S
+            if interval > 0:
+                next_due = min(next_due, self.last_push_sent_time + interval)
+            self._scheduler_event.wait(timeout=max(SCHEDULER_MIN_WAIT_S, next_due - time.time()))
 
             if not self._scheduler_running:
                 break
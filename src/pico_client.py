@@ -0,0 +1,246 @@
+# pico_client.py
+# Persistent HTTP/1.1 connection to the Pico W REST API.
+#
+# urllib opens a new TCP connection for every request, which during a pour
+# means a handshake every POUR_POLL_INTERVAL_S. PicoClient keeps one
+# keep-alive http.client connection open, reconnects when the Pico drops it
+# (reboot, idle timeout, Wi-Fi blip) and records per-request latency.
+
+import http.client
+import json
+import threading
+import time
+from collections import deque
+
+import pico_codec
+
+REQUEST_TIMEOUT_S   = 2.0    # Pico can take up to ~1s during flash writes / GC
+LATENCY_SAMPLES     = 256    # recent requests kept for the latency stats
+
+# Errors meaning the kept-alive socket went stale between requests; a
+# request that hits one of these on a reused connection is sent once more.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                            BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+class PicoClient:
+    """
+    One keep-alive connection to a Pico. Safe to share between threads;
+    requests are serialised on the connection.
+    """
+
+    def __init__(self, host, timeout=REQUEST_TIMEOUT_S):
+        self.host = host
+        self.timeout = timeout
+        self._conn = None
+        self._reused = False        # True once the open socket has served a request
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.failures = 0
+        self.connects = 0
+        self.bytes_received = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    # ------------------------------------------------------------------
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Sends one request and returns (status, response headers, body bytes),
+        or None if the Pico could not be reached.
+        """
+        headers = dict(headers or {})
+        with self._lock:
+            start = time.monotonic()
+            self.requests += 1
+            for attempt in range(2):
+                conn = self._connection()
+                reused = self._reused
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    self._reused = True
+                    if resp.will_close: self._close()
+                    self._latencies.append(time.monotonic() - start)
+                    self.bytes_received += len(data)
+                    return resp.status, resp.headers, data
+                except _STALE_CONNECTION_ERRORS:
+                    self._close()
+                    if not reused or attempt: break  # A fresh socket failed: the Pico is down
+                except (OSError, http.client.HTTPException):
+                    self._close()
+                    break
+            self.failures += 1
+            return None
+
+    def get_json(self, path):
+        """GET → parsed reply (JSON or MessagePack), or None on any error."""
+        return self._json(self.request("GET", path, headers={"Accept": pico_codec.ACCEPT}))
+
+    def post_json(self, path, data=None):
+        """POST with a JSON body → parsed reply, or None on any error."""
+        body = json.dumps(data or {}).encode()
+        return self._json(self.request("POST", path, body=body,
+                                       headers={"Content-Type": "application/json",
+                                                "Accept":       pico_codec.ACCEPT}))
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        """Request counters plus latency percentiles (ms) over recent requests."""
+        lat = sorted(self._latencies)
+        pick = lambda q: round(lat[min(len(lat) - 1, int(len(lat) * q))] * 1000.0, 2) if lat else None
+        return {
+            "host": self.host,
+            "requests": self.requests,
+            "failures": self.failures,
+            "connects": self.connects,
+            "bytes_received": self.bytes_received,
+            "latency_ms_p50": pick(0.50),
+            "latency_ms_p95": pick(0.95),
+            "latency_ms_max": round(lat[-1] * 1000.0, 2) if lat else None,
+            "jitter_ms": round((pick(0.95) - pick(0.50)), 2) if lat else None,
+        }
+
+    # ------------------------------------------------------------------
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, timeout=self.timeout)
+            self._reused = False
+            self.connects += 1
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try: self._conn.close()
+            except Exception: pass
+            self._conn = None
+        self._reused = False
+
+    @staticmethod
+    def _json(result):
+        if result is None: return None
+        status, headers, data = result
+        if status != 200: return None
+        try:
+            return pico_codec.decode(headers, data)
+        except ValueError:
+            return None
+
+
+class AsyncPicoClient:
+    """
+    asyncio counterpart of PicoClient: one keep-alive HTTP/1.1 connection,
+    reconnect-and-resend once on a stale socket, same stats. Used where many
+    Picos are polled from one event loop (pico_federation.py).
+    """
+
+    def __init__(self, host, timeout=REQUEST_TIMEOUT_S):
+        import asyncio
+        self._asyncio = asyncio
+        self.host = host
+        name, _, port = host.partition(":")
+        self._addr = (name, int(port) if port.isdigit() else 80)
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._reused = False
+        self._lock = None           # Created on first use, inside the loop
+
+        self.requests = 0
+        self.failures = 0
+        self.connects = 0
+        self.bytes_received = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    stats = PicoClient.stats
+
+    async def request(self, method, path, body=None, headers=None):
+        """Same contract as PicoClient.request()."""
+        asyncio = self._asyncio
+        if self._lock is None: self._lock = asyncio.Lock()
+        async with self._lock:
+            start = time.monotonic()
+            self.requests += 1
+            for attempt in range(2):
+                reused = self._reused and self._writer is not None
+                try:
+                    result = await asyncio.wait_for(self._exchange(method, path, body, headers or {}),
+                                                    self.timeout)
+                    self._latencies.append(time.monotonic() - start)
+                    self.bytes_received += len(result[2])
+                    return result
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    await self._close()
+                    if not reused or attempt: break
+                except (OSError, ValueError, asyncio.TimeoutError, http.client.HTTPException):
+                    await self._close()
+                    break
+            self.failures += 1
+            return None
+
+    async def get_json(self, path):
+        return PicoClient._json(await self.request("GET", path, headers={"Accept": pico_codec.ACCEPT}))
+
+    async def close(self):
+        await self._close()
+
+    async def _exchange(self, method, path, body, headers):
+        if self._writer is None:
+            self._reader, self._writer = await self._asyncio.open_connection(*self._addr)
+            self._reused = False
+            self.connects += 1
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", "Connection: keep-alive"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        lines.append(f"Content-Length: {len(body or b'')}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+        await self._writer.drain()
+
+        reader = self._reader
+        status_line = await reader.readline()
+        if not status_line: raise http.client.RemoteDisconnected("connection closed by the Pico")
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit(): raise http.client.BadStatusLine(status_line)
+        status = int(parts[1])
+        resp_headers = http.client.HTTPMessage()    # Case-insensitive, like resp.headers
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            name, _, value = line.decode("latin-1").partition(":")
+            resp_headers[name.strip()] = value.strip()
+
+        if (resp_headers.get("Transfer-Encoding") or "").lower() == "chunked":
+            data = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                data += await reader.readexactly(size)
+                await reader.readexactly(2)
+            data = bytes(data)
+        elif "Content-Length" in resp_headers:
+            data = await reader.readexactly(int(resp_headers["Content-Length"]))
+        elif status in (204, 304):
+            data = b""
+        else:
+            data = await reader.read()              # Body runs to connection close
+            await self._close()
+            return status, resp_headers, data
+
+        self._reused = True
+        if (resp_headers.get("Connection") or "").lower() == "close":
+            await self._close()
+        return status, resp_headers, data
+
+    async def _close(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        self._reused = False
+        if writer is not None:
+            writer.close()
+            try: await writer.wait_closed()
+            except Exception: pass
@@ -0,0 +1,221 @@
+# pico_codec.py
+# Body encodings of the Pico W REST API: JSON, or MessagePack when the
+# firmware supports it.
+#
+# The host asks for MessagePack through the Accept header and decodes by the
+# reply's Content-Type, so firmware that only speaks JSON keeps working
+# unchanged. The MessagePack codec below is plain Python (the subset the
+# Pico uses: nil, bool, int, float, str, bin, array, map); if the msgpack
+# package happens to be installed its C decoder is used instead.
+
+import json
+import struct
+
+try:
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+
+JSON_TYPE    = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK_TYPE, "application/x-msgpack")
+
+# Accept header for replies the host decodes itself
+ACCEPT = f"{MSGPACK_TYPE}, {JSON_TYPE};q=0.5"
+ACCEPT_JSON = JSON_TYPE
+
+
+# ----------------------------------------------------------------------
+# MessagePack encoder
+# ----------------------------------------------------------------------
+
+def packb(obj, single_float=False):
+    """obj → MessagePack bytes. single_float packs floats as float32 (as MicroPython does)."""
+    out = []
+    _pack(obj, out.append, single_float)
+    return b"".join(out)
+
+
+def _pack(obj, write, single_float):
+    if obj is None:
+        write(b"\xc0")
+    elif obj is True:
+        write(b"\xc3")
+    elif obj is False:
+        write(b"\xc2")
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            write(bytes((obj,)))
+        elif -32 <= obj < 0:
+            write(bytes((obj & 0xff,)))
+        elif obj >= 0:
+            if obj <= 0xff:         write(struct.pack(">BB", 0xcc, obj))
+            elif obj <= 0xffff:     write(struct.pack(">BH", 0xcd, obj))
+            elif obj <= 0xffffffff: write(struct.pack(">BI", 0xce, obj))
+            else:                   write(struct.pack(">BQ", 0xcf, obj))
+        else:
+            if obj >= -0x80:        write(struct.pack(">Bb", 0xd0, obj))
+            elif obj >= -0x8000:    write(struct.pack(">Bh", 0xd1, obj))
+            elif obj >= -0x80000000: write(struct.pack(">Bi", 0xd2, obj))
+            else:                   write(struct.pack(">Bq", 0xd3, obj))
+    elif isinstance(obj, float):
+        write(struct.pack(">Bf", 0xca, obj) if single_float else struct.pack(">Bd", 0xcb, obj))
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        n = len(data)
+        if n < 32:        write(bytes((0xa0 | n,)))
+        elif n <= 0xff:   write(struct.pack(">BB", 0xd9, n))
+        elif n <= 0xffff: write(struct.pack(">BH", 0xda, n))
+        else:             write(struct.pack(">BI", 0xdb, n))
+        write(data)
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n <= 0xff:     write(struct.pack(">BB", 0xc4, n))
+        elif n <= 0xffff: write(struct.pack(">BH", 0xc5, n))
+        else:             write(struct.pack(">BI", 0xc6, n))
+        write(bytes(obj))
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:        write(bytes((0x90 | n,)))
+        elif n <= 0xffff: write(struct.pack(">BH", 0xdc, n))
+        else:             write(struct.pack(">BI", 0xdd, n))
+        for item in obj:
+            _pack(item, write, single_float)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:        write(bytes((0x80 | n,)))
+        elif n <= 0xffff: write(struct.pack(">BH", 0xde, n))
+        else:             write(struct.pack(">BI", 0xdf, n))
+        for key, value in obj.items():
+            _pack(key, write, single_float)
+            _pack(value, write, single_float)
+    else:
+        raise TypeError(f"cannot pack {type(obj).__name__}")
+
+
+# ----------------------------------------------------------------------
+# MessagePack decoder
+# ----------------------------------------------------------------------
+
+_unpack_from = struct.unpack_from
+
+# Fixed-size scalars: type byte → (struct format, size)
+_SCALARS = {
+    0xca: (">f", 4), 0xcb: (">d", 8),
+    0xcc: (">B", 1), 0xcd: (">H", 2), 0xce: (">I", 4), 0xcf: (">Q", 8),
+    0xd0: (">b", 1), 0xd1: (">h", 2), 0xd2: (">i", 4), 0xd3: (">q", 8),
+}
+# Variable-length types: type byte → (kind, length format, length size)
+_SIZED = {
+    0xd9: ("str", ">B", 1), 0xda: ("str", ">H", 2), 0xdb: ("str", ">I", 4),
+    0xc4: ("bin", ">B", 1), 0xc5: ("bin", ">H", 2), 0xc6: ("bin", ">I", 4),
+    0xdc: ("array", ">H", 2), 0xdd: ("array", ">I", 4),
+    0xde: ("map", ">H", 2), 0xdf: ("map", ">I", 4),
+}
+
+
+def unpackb(data):
+    """MessagePack bytes → Python object. Raises ValueError on malformed or trailing data."""
+    if _msgpack is not None:
+        try:
+            return _msgpack.unpackb(data, raw=False, strict_map_key=False)
+        except Exception as e:
+            raise ValueError(f"bad MessagePack body: {e}") from None
+    try:
+        obj, pos = _unpack(data, 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"bad MessagePack body: {e}") from None
+    if pos != len(data):
+        raise ValueError("bad MessagePack body: trailing data")
+    return obj
+
+
+def _unpack(data, pos):
+    b = data[pos]
+    pos += 1
+    if b < 0x80:                            # positive fixint
+        return b, pos
+    if b >= 0xe0:                           # negative fixint
+        return b - 0x100, pos
+    if 0xa0 <= b <= 0xbf:                   # fixstr
+        end = pos + (b & 0x1f)
+        if end > len(data): raise IndexError("truncated str")
+        return data[pos:end].decode("utf-8"), end
+    if 0x80 <= b <= 0x8f:                   # fixmap
+        return _unpack_map(data, pos, b & 0x0f)
+    if 0x90 <= b <= 0x9f:                   # fixarray
+        return _unpack_array(data, pos, b & 0x0f)
+    if b == 0xc0: return None, pos
+    if b == 0xc2: return False, pos
+    if b == 0xc3: return True, pos
+    scalar = _SCALARS.get(b)
+    if scalar:
+        fmt, size = scalar
+        return _unpack_from(fmt, data, pos)[0], pos + size
+    sized = _SIZED.get(b)
+    if sized is None:
+        raise ValueError(f"bad MessagePack body: unsupported type 0x{b:02x}")
+    kind, fmt, size = sized
+    n = _unpack_from(fmt, data, pos)[0]
+    pos += size
+    if kind == "array":
+        return _unpack_array(data, pos, n)
+    if kind == "map":
+        return _unpack_map(data, pos, n)
+    end = pos + n
+    if end > len(data): raise IndexError(f"truncated {kind}")
+    return (data[pos:end].decode("utf-8") if kind == "str" else bytes(data[pos:end])), end
+
+
+def _unpack_array(data, pos, n):
+    items = []
+    for _ in range(n):
+        item, pos = _unpack(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(data, pos, n):
+    result = {}
+    for _ in range(n):
+        key, pos = _unpack(data, pos)
+        value, pos = _unpack(data, pos)
+        if isinstance(key, list): key = tuple(key)
+        result[key] = value
+    return result, pos
+
+
+# ----------------------------------------------------------------------
+# Negotiation
+# ----------------------------------------------------------------------
+
+def content_type(headers):
+    """Media type of a reply ("application/json", ...), without parameters."""
+    value = headers.get("Content-Type") if headers is not None else None
+    return (value or JSON_TYPE).split(";", 1)[0].strip().lower()
+
+
+def decode(headers, body):
+    """Reply body → Python object by its Content-Type (JSON if none). Raises ValueError."""
+    if content_type(headers) in MSGPACK_TYPES:
+        return unpackb(body)
+    try:
+        return json.loads(body.decode())
+    except UnicodeDecodeError as e:
+        raise ValueError(str(e)) from None
+
+
+def prefers_msgpack(accept):
+    """True if an Accept header ranks MessagePack above JSON (server side)."""
+    best = {}
+    for part in (accept or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        media, q = fields[0].lower(), 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try: q = float(param[2:])
+                except ValueError: q = 0.0
+        best[media] = max(q, best.get(media, 0.0))
+    msgpack_q = max(best.get(t, 0.0) for t in MSGPACK_TYPES)
+    json_q = best.get(JSON_TYPE, best.get("*/*", 0.0))
+    return msgpack_q > 0.0 and msgpack_q >= json_q
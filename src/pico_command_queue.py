@@ -0,0 +1,159 @@
+# pico_command_queue.py
+# Ordered background queue for writes to the Pico W (tap resets, K-factor
+# pushes, calibration posts).
+#
+# The UI handlers that trigger these must not wait out REQUEST_TIMEOUT_S on a
+# slow or offline Pico. Commands run one at a time on a worker thread, in the
+# order submitted; a failed command is retried with a growing delay before the
+# next one runs. Commands that toggle state on the Pico (ending calibration)
+# are submitted with retry=False: a lost reply must not get them sent twice.
+# A command submitted with a coalesce_key replaces a pending one with the
+# same key (only the latest K-factors matter). Completion
+# callbacks get the Pico's reply, or None if every attempt failed, and run
+# through run_on_ui so Kivy handlers can touch widgets.
+
+import threading
+import time
+from collections import deque
+
+COMMAND_RETRIES   = 3      # attempts after the first
+COMMAND_RETRY_S   = 1.0    # delay before the first retry; doubles each time
+COMMAND_FLUSH_S   = 5.0    # how long close() waits for queued commands
+
+
+class _Command:
+    def __init__(self, name, fn, key, retry):
+        self.name      = name
+        self.fn        = fn
+        self.key       = key
+        self.retry     = retry
+        self.callbacks = []
+
+
+class PicoCommandQueue:
+    """Runs Pico write commands in order on one background thread."""
+
+    def __init__(self, run_on_ui=None, retries=COMMAND_RETRIES, retry_delay_s=COMMAND_RETRY_S, log_prefix="[PicoSensor]"):
+        self.run_on_ui     = run_on_ui
+        self.retries       = retries
+        self.retry_delay_s = retry_delay_s
+        self.log_prefix    = log_prefix
+
+        self._cond    = threading.Condition()
+        self._pending = deque()
+        self._by_key  = {}          # coalesce_key → pending command
+        self._busy    = False
+        self._closing = False
+        self._thread  = None
+        self._stats   = {"submitted": 0, "coalesced": 0, "sent": 0, "retries": 0, "failed": 0}
+
+    def submit(self, name, fn, on_done=None, coalesce_key=None, retry=True):
+        """
+        Queues fn (returns the Pico's reply, or None on failure). on_done(reply)
+        is called once the command finished or was given up on. retry=False
+        sends it once: for commands that are not safe to repeat.
+        """
+        with self._cond:
+            self._stats["submitted"] += 1
+            cmd = self._by_key.get(coalesce_key) if coalesce_key is not None else None
+            if cmd is not None:
+                # Not started yet: send the newer request in its place
+                cmd.name, cmd.fn, cmd.retry = name, fn, retry
+                self._stats["coalesced"] += 1
+            else:
+                cmd = _Command(name, fn, coalesce_key, retry)
+                self._pending.append(cmd)
+                if coalesce_key is not None:
+                    self._by_key[coalesce_key] = cmd
+            if on_done:
+                cmd.callbacks.append(on_done)
+            if self._thread is None or not self._thread.is_alive():
+                self._closing = False
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending) + (1 if self._busy else 0)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending) + (1 if self._busy else 0))
+
+    def flush(self, timeout=COMMAND_FLUSH_S):
+        """Waits until every queued command has finished. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self, timeout=COMMAND_FLUSH_S):
+        """Flushes (up to timeout), then stops the worker; unsent commands are dropped."""
+        done = self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            dropped = len(self._pending)
+            self._pending.clear()
+            self._by_key.clear()
+            self._cond.notify_all()
+        if not done:
+            print(f"{self.log_prefix} Warning: {dropped} Pico command(s) not sent before shutdown.")
+        return done
+
+    # ------------------------------------------------------------------
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if self._closing:
+                    return
+                cmd = self._pending.popleft()
+                if cmd.key is not None:
+                    self._by_key.pop(cmd.key, None)
+                self._busy = True
+            try:
+                result = self._run(cmd)
+                for cb in cmd.callbacks:
+                    self._deliver(cb, result)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _run(self, cmd):
+        delay = self.retry_delay_s
+        for attempt in range((self.retries if cmd.retry else 0) + 1):
+            if attempt:
+                with self._cond:
+                    self._stats["retries"] += 1
+                    self._cond.wait_for(lambda: self._closing, delay)
+                    if self._closing:
+                        break
+                delay *= 2
+            try:
+                result = cmd.fn()
+            except Exception as e:
+                print(f"{self.log_prefix} {cmd.name}: {e}")
+                result = None
+            if result:
+                with self._cond: self._stats["sent"] += 1
+                return result
+        with self._cond: self._stats["failed"] += 1
+        print(f"{self.log_prefix} Warning: {cmd.name} failed after {attempt + 1} attempt(s).")
+        return None
+
+    def _deliver(self, cb, result):
+        try:
+            if self.run_on_ui:
+                self.run_on_ui(lambda: cb(result))
+            else:
+                cb(result)
+        except Exception as e:
+            print(f"{self.log_prefix} Command callback error: {e}")
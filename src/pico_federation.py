@@ -0,0 +1,339 @@
+# pico_federation.py
+# Several Pico W flow controllers presented as one tap space.
+#
+# The "pico_nodes" system setting lists the Picos in tap order, e.g.
+#
+#     [{"host": "192.168.1.40", "taps": 4}, {"host": "192.168.1.41", "taps": 4}]
+#
+# gives taps 1-4 on the first Pico and taps 5-8 on the second. Every node is
+# polled by its own coroutine on one asyncio loop (a single background
+# thread), with its own conditional-poll sequence, failure count and backoff,
+# so a slow or offline Pico only delays -- and only marks "Offline" -- its own
+# taps. Booking, calibration and the UI batch are shared with
+# PicoSensorLogic; tap indexes are translated at the node boundary. Each node
+# keeps its own pour log cursor (saved per host), so pours made on any Pico
+# while the app was not running are replayed one by one on the next start.
+
+import asyncio
+import re
+import threading
+import time
+
+import pico_codec
+from pico_client import PicoClient, AsyncPicoClient
+from pico_sensor_logic import (PicoSensorLogic, NOT_MODIFIED, REQUEST_TIMEOUT_S,
+                               POLL_INTERVAL_S, POUR_POLL_INTERVAL_S, OFFLINE_RETRY_S,
+                               IDLE_MAX_POLL_INTERVAL_S, pour_log_cursor)
+from poll_scheduler import PollScheduler
+
+NODE_BACKOFF_MAX_S = 30.0   # ceiling for the retry delay of an offline node
+NODE_ERROR_RETRY_S = 5.0    # pause after an unexpected error in one node's poll
+
+_TAP_PATH = re.compile(r"/api/tap/(\d+)/(.+)")
+
+
+class PicoNode:
+    """One Pico of the federation and its polling health."""
+
+    def __init__(self, host, offset, taps, offline_after, pour_cursor=None):
+        self.host     = host
+        self.offset   = offset      # global index of the node's first tap
+        self.taps     = taps
+        self.client   = PicoClient(host, timeout=REQUEST_TIMEOUT_S)    # sync calls (UI thread)
+        self.aclient  = None        # AsyncPicoClient, owned by the poll loop
+        self.scheduler = PollScheduler(POUR_POLL_INTERVAL_S, POLL_INTERVAL_S, OFFLINE_RETRY_S,
+                                       offline_after=offline_after, max_backoff_s=NODE_BACKOFF_MAX_S,
+                                       idle_max_s=IDLE_MAX_POLL_INTERVAL_S)
+        self.seq      = None
+        self.online   = False
+        self.offline_reported = False
+        self.last_ok  = None
+        self.last_error = None      # last unexpected poll error, logged once
+        # Saved pour log position (None: never saved for this host), and the latest "pour_log"
+        self.pour_cursor      = pour_cursor
+        self.pour_log_state   = None
+        self.pour_log_checked = False
+
+    def owns(self, tap_index):
+        return self.offset <= tap_index < self.offset + self.taps
+
+    def health(self):
+        return {
+            "host": self.host,
+            "taps": [self.offset + 1, self.offset + self.taps],
+            "online": self.online,
+            **self.scheduler.stats(),
+            "last_ok_age_s": None if self.last_ok is None else round(time.monotonic() - self.last_ok, 1),
+            "http": self.aclient.stats() if self.aclient else None,
+        }
+
+
+class FederatedPicoSensorLogic(PicoSensorLogic):
+    """
+    PicoSensorLogic over several Picos. Same constructor and interface; the
+    push event stream is not used, every node is polled.
+    """
+
+    def __init__(self, num_sensors_from_config, ui_callbacks, settings_manager):
+        super().__init__(num_sensors_from_config, ui_callbacks, settings_manager)
+        self.commands.log_prefix = "[PicoFederation]"
+        self.nodes  = []
+        offset = 0
+        cursors = settings_manager.get_pico_node_pour_cursors()
+        for node in settings_manager.get_pico_nodes():
+            taps = min(node["taps"], self.num_sensors - offset)
+            if taps <= 0:
+                print(f"[PicoFederation] {node['host']}: no taps left in the tap space — ignored")
+                continue
+            self.nodes.append(PicoNode(node["host"], offset, taps, self._OFFLINE_THRESHOLD,
+                                       cursors.get(node["host"])))
+            offset += taps
+        self.host     = self.nodes[0].host if self.nodes else None
+        self.base_url = f"http://{self.host}" if self.host else None
+
+        self._cal_lock = None
+        self._loop     = None
+        self._main_task = None
+
+    # ------------------------------------------------------------------
+    # Routing of the synchronous helpers (calibration, keg change, config)
+    # ------------------------------------------------------------------
+
+    def _node_for_tap(self, tap_index):
+        for node in self.nodes:
+            if node.owns(tap_index):
+                return node
+        return None
+
+    def _route(self, path):
+        """(node, node-local path) for an API path with a global tap index."""
+        m = _TAP_PATH.fullmatch(path)
+        if m:
+            node = self._node_for_tap(int(m.group(1)))
+            if node is None:
+                return None, path
+            return node, f"/api/tap/{int(m.group(1)) - node.offset}/{m.group(2)}"
+        return (self.nodes[0] if self.nodes else None), path
+
+    def _get(self, path):
+        node, path = self._route(path)
+        return node.client.get_json(path) if node else None
+
+    def _post(self, path, data=None):
+        node, path = self._route(path)
+        return node.client.post_json(path, data) if node else None
+
+    def push_k_factors_to_pico(self, k_factors, on_done=None):
+        """
+        Queues a push to each Pico of the K-factors of its own taps.
+        on_done(reply or None) runs on the UI thread once per Pico.
+        """
+        for node in self.nodes:
+            part = list(k_factors[node.offset:node.offset + node.taps])
+            if not part:
+                continue
+            def push(node=node, part=part):
+                result = node.client.post_json("/api/config", {"k_factors": part})
+                if result:
+                    print(f"[PicoFederation] K-factors pushed to {node.host}: {part}")
+                return result
+            self.commands.submit(f"K-factor push to {node.host}", push, on_done,
+                                 coalesce_key=("k_factors", node.host))
+
+    def get_http_stats(self):
+        return [node.aclient.stats() for node in self.nodes if node.aclient]
+
+    def get_node_health(self):
+        """Per-node polling health, in tap order."""
+        return [node.health() for node in self.nodes]
+
+    # ------------------------------------------------------------------
+    # Monitoring lifecycle
+    # ------------------------------------------------------------------
+
+    def start_monitoring(self):
+        self._running = True
+        print(f"[PicoFederation] Polling {len(self.nodes)} Pico(s): "
+              + ", ".join(f"{n.host} (taps {n.offset + 1}-{n.offset + n.taps})" for n in self.nodes))
+        if self.sensor_thread is None or not self.sensor_thread.is_alive():
+            self.sensor_thread = threading.Thread(target=self._run_loop, daemon=True)
+            self.sensor_thread.start()
+
+    def stop_monitoring(self):
+        self._running = False
+        loop, task = self._loop, self._main_task
+        if loop is not None and task is not None:
+            try: loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError: pass   # Loop already closed
+        if self.sensor_thread:
+            self.sensor_thread.join(timeout=2.0)
+
+    def _save_pico_baselines(self):
+        cursors = {}
+        for node in self.nodes:
+            cursor = pour_log_cursor(node.pour_log_state)
+            if cursor is not None:
+                cursors[node.host] = cursor
+        self.settings_manager.save_pico_tap_last_dispensed(self._pico_baselines(), node_pour_cursors=cursors)
+
+    def cleanup_gpio(self):
+        super().cleanup_gpio()
+        for node in self.nodes:
+            node.client.close()
+
+    def _run_loop(self):
+        try:
+            asyncio.run(self._poll_all())
+        except Exception as e:
+            print(f"[PicoFederation] Poll loop stopped: {e}")
+
+    async def _poll_all(self):
+        self._loop      = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        self._cal_lock  = asyncio.Lock()
+        for node in self.nodes:
+            node.aclient = AsyncPicoClient(node.host, timeout=REQUEST_TIMEOUT_S)
+        try:
+            await asyncio.gather(*(self._poll_node(node) for node in self.nodes))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for node in self.nodes:
+                await node.aclient.close()
+            self._loop = self._main_task = None
+
+    # ------------------------------------------------------------------
+    # Per-node polling
+    # ------------------------------------------------------------------
+
+    async def _poll_node(self, node):
+        while self._running:
+            try:
+                await self._poll_node_once(node)
+                node.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Contained here: gather() would otherwise take every other node down with this one
+                if str(e) != node.last_error:
+                    print(f"[PicoFederation] {node.host}: poll error: {e}")
+                    node.last_error = str(e)
+                node.seq = None
+                await asyncio.sleep(NODE_ERROR_RETRY_S)
+
+    async def _poll_node_once(self, node):
+        """One poll of one node, then the wait before the next."""
+        if self.is_paused:
+            await asyncio.sleep(POLL_INTERVAL_S)
+            return
+
+        t0 = time.monotonic()
+        gens  = list(self._reset_gen)
+        state = await self._poll_node_state(node)
+        now = time.monotonic()
+
+        if state is None:
+            # Jittered backoff keeps retries of several dead nodes from lining up
+            if node.scheduler.record_failure() >= self._OFFLINE_THRESHOLD:
+                self._node_offline(node)
+            await asyncio.sleep(node.scheduler.next_delay())
+            return
+
+        node.last_ok = now
+        self._node_online(node)
+
+        if self._auto_cal_mode:
+            node.scheduler.wake()
+            await self._calibrate_from(node, state)
+        elif state is not NOT_MODIFIED:
+            if not node.pour_log_checked:
+                await self._loop.run_in_executor(None, self._reconcile_node_pour_log, node)
+            self._apply_node_state(node, state, gens)
+            self.ui_updates.flush()
+
+        pouring = any(self.tap_is_active[node.offset:node.offset + node.taps])
+        node.scheduler.record_success(now - t0, pouring)
+        await asyncio.sleep(node.scheduler.next_delay())
+
+    async def _poll_node_state(self, node):
+        """_poll_state() for one node, on its async client."""
+        headers = {"Accept": pico_codec.ACCEPT}
+        path    = "/api/state"
+        if node.seq is not None:
+            headers["If-None-Match"] = f'"{node.seq}"'
+            path += f"?since={node.seq}"
+        return self._parse_state_reply(await node.aclient.request("GET", path, headers=headers))
+
+    def _node_online(self, node):
+        node.offline_reported = False
+        if not node.online:
+            node.online = True
+            self._pico_online = True
+            print(f"[PicoFederation] {node.host} online (taps {node.offset + 1}-{node.offset + node.taps})")
+
+    def _node_offline(self, node):
+        """Shows the node's taps "Offline" -- once per outage, not on every retry."""
+        node.seq = None     # It may come back with a new sequence
+        if node.offline_reported:
+            return
+        node.offline_reported = True
+        if node.online:
+            node.online = False
+            self._pico_online = any(n.online for n in self.nodes)
+            print(f"[PicoFederation] {node.host} offline — backing off")
+        for i in range(node.offset, node.offset + node.taps):
+            self._update_ui(i, 0.0, self.last_known_remaining_liters[i], "Offline", self.last_pour_volumes[i])
+        self.ui_updates.flush()
+
+    def start_auto_calibration_mode(self):
+        super().start_auto_calibration_mode()
+        for node in self.nodes:
+            node.seq = None
+
+    def _displayed_taps(self, available):
+        if self._config.version != self.settings_manager.config_version:
+            for node in self.nodes:
+                node.seq = None
+        return super()._displayed_taps(available)
+
+    def _apply_node_state(self, node, state, gens):
+        """_apply_state() for one node's document, shifted into the global tap space."""
+        node.seq = state.get("seq")
+        if "pour_log" in state:
+            node.pour_log_state = state["pour_log"]
+        if "temperature" in state and node is self.nodes[0]:
+            self._pico_temperature = state["temperature"]
+        displayed = self._displayed_taps(self.num_sensors)
+        if state.get("delta"):
+            entries = ((int(tap.get("tap", -1)), tap) for tap in state.get("taps", []))
+        else:
+            entries = enumerate(state.get("taps", []))
+        for local, tap in entries:
+            i = node.offset + local
+            if 0 <= local < node.taps and i < displayed:
+                self._apply_tap(i,
+                                float(tap.get("dispensed_liters", 0.0)),
+                                bool(tap.get("pouring", False)),
+                                float(tap.get("flow_rate_lpm", 0.0)),
+                                gens[i])
+
+    def _reconcile_node_pour_log(self, node):
+        """_reconcile_pour_log() for one node, from its own cursor (blocking: run in the executor)."""
+        node.pour_log_checked = True
+        if node.pour_cursor is None:
+            return      # Its baselines were saved without a cursor: totals only
+        def save_cursor(cursor):
+            self.settings_manager.save_pico_node_pour_cursor(node.host, cursor)
+            node.pour_cursor = dict(cursor)
+        self._replay_pour_log(node.client.get_json, node.pour_cursor, save_cursor,
+                              node.offset, node.taps, f"[PicoFederation] {node.host}:")
+
+    async def _calibrate_from(self, node, state):
+        """Merges the node's taps (if not a 304) into the calibration mirror and runs one calibration pass."""
+        if state is not NOT_MODIFIED:
+            self._merge_cal_taps(state, node.offset, node.taps)
+            node.seq = state.get("seq")
+        displayed = self._displayed_taps(self.num_sensors)
+        async with self._cal_lock:
+            # _process_calibration makes blocking requests to the locked tap's node
+            await self._loop.run_in_executor(None, self._process_calibration, self._cal_taps, displayed)
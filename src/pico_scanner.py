@@ -0,0 +1,180 @@
+# pico_scanner.py
+# Finds a Pico W on the local network by probing /api/version.
+#
+# One asyncio loop probes every candidate address with at most
+# MAX_IN_FLIGHT connects open at a time; the first Pico to answer cancels
+# the rest. Candidates come from every local IPv4 interface (or from
+# explicit CIDR ranges), with preferred addresses -- the configured host,
+# the last IP a Pico was seen at -- probed first.
+
+import asyncio
+import ipaddress
+import json
+import socket
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:     # Windows: interfaces come from the default route only
+    fcntl = None
+
+PROBE_TIMEOUT_S  = 0.5
+MAX_IN_FLIGHT    = 128
+AUTO_MAX_PREFIX  = 22    # wider interface networks are narrowed to the /22 around us
+PROBE_PATH       = "/api/version"
+PREFERRED_HEAD_START_S = 0.2   # known addresses get this long before the sweep starts
+
+_SIOCGIFADDR    = 0x8915
+_SIOCGIFNETMASK = 0x891B
+
+
+def _interface_networks():
+    """(address, network) of every IPv4 interface, via ioctl (Linux)."""
+    found = []
+    if fcntl is None or not hasattr(socket, "if_nameindex"):
+        return found
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _index, name in socket.if_nameindex():
+            req = struct.pack("256s", name.encode()[:15])
+            try:
+                addr = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, req)[20:24])
+                mask = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), _SIOCGIFNETMASK, req)[20:24])
+            except OSError:
+                continue    # Interface without an IPv4 address
+            found.append((ipaddress.IPv4Address(addr),
+                          ipaddress.IPv4Network(f"{addr}/{mask}", strict=False)))
+    finally:
+        sock.close()
+    return found
+
+
+def _default_route_network():
+    """(address, /24) of the interface holding the default route, or None."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(("8.8.8.8", 80))   # No packet is sent for a UDP connect
+        addr = ipaddress.IPv4Address(sock.getsockname()[0])
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    return addr, ipaddress.IPv4Network(f"{addr}/24", strict=False)
+
+
+def local_networks():
+    """
+    LAN networks to scan: every non-loopback, non-link-local IPv4
+    interface, each narrowed to at most a /AUTO_MAX_PREFIX around the
+    host's own address.
+    """
+    entries = _interface_networks()
+    if not entries:
+        fallback = _default_route_network()
+        entries = [fallback] if fallback else []
+    networks = []
+    for addr, net in entries:
+        if addr.is_loopback or addr.is_link_local:
+            continue
+        if net.prefixlen < AUTO_MAX_PREFIX:
+            net = ipaddress.IPv4Network(f"{addr}/{AUTO_MAX_PREFIX}", strict=False)
+        if net not in networks:
+            networks.append(net)
+    return networks
+
+
+def local_addresses():
+    return {str(addr) for addr, _net in _interface_networks()}
+
+
+def parse_networks(specs):
+    """CIDR strings ("192.168.1.0/24", or a bare IP for one host) → networks. Raises ValueError."""
+    return [ipaddress.ip_network(spec.strip(), strict=False) for spec in specs if spec.strip()]
+
+
+def _sweep(networks, skip):
+    seen = set(skip)
+    for net in networks:
+        hosts = net.hosts() if net.num_addresses > 2 else iter(net)
+        for addr in hosts:
+            ip = str(addr)
+            if ip not in seen:
+                seen.add(ip)
+                yield ip
+
+
+async def _probe(ip, port, timeout):
+    """True if ip:port answers GET /api/version with a JSON "version"."""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        writer.write(f"GET {PROBE_PATH} HTTP/1.0\r\nHost: {ip}\r\nAccept: application/json\r\n\r\n".encode())
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)    # HTTP/1.0: body ends at close
+        head, _, body = raw.partition(b"\r\n\r\n")
+        if head.split(b"\r\n", 1)[0].split()[1:2] != [b"200"]:
+            return False
+        return "version" in json.loads(body.decode())
+    except (OSError, asyncio.TimeoutError, ValueError, UnicodeDecodeError, AttributeError, TypeError):
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def scan_async(networks, preferred=(), port=80, timeout=PROBE_TIMEOUT_S, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Probes the preferred IPs, then -- unless one answered within
+    PREFERRED_HEAD_START_S -- every host of networks as well, with at most
+    max_in_flight connects open. Returns (ip or None, hosts probed).
+    """
+    own = local_addresses()
+    preferred = [ip for ip in dict.fromkeys(preferred) if ip and ip not in own]
+    found = asyncio.get_running_loop().create_future()
+    probed = 0
+
+    async def probe(ip):
+        nonlocal probed
+        probed += 1
+        if await _probe(ip, port, timeout) and not found.done():
+            found.set_result(ip)
+
+    async def worker(candidates):
+        for ip in candidates:       # Shared iterator: each IP goes to one worker
+            await probe(ip)
+
+    tasks = [asyncio.ensure_future(probe(ip)) for ip in preferred]
+    try:
+        if tasks:
+            await asyncio.wait([found], timeout=PREFERRED_HEAD_START_S)
+        if not found.done():
+            candidates = _sweep(networks, own | set(preferred))
+            tasks += [asyncio.ensure_future(worker(candidates)) for _ in range(max_in_flight)]
+            all_done = asyncio.ensure_future(asyncio.wait(tasks))
+            await asyncio.wait([found, all_done], return_when=asyncio.FIRST_COMPLETED)
+            all_done.cancel()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return (found.result() if found.done() else None), probed
+
+
+def find_pico(networks=None, preferred=(), port=80, timeout=PROBE_TIMEOUT_S, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Blocking scan; call from a worker thread. networks defaults to
+    local_networks(). Returns {"ip", "duration_s", "probed", "networks"}.
+    """
+    start = time.monotonic()
+    if networks is None:
+        networks = local_networks()
+    ip, probed = asyncio.run(scan_async(networks, list(preferred), port, timeout, max_in_flight))
+    duration = time.monotonic() - start
+    nets = ", ".join(str(n) for n in networks) or "no networks"
+    if ip:
+        print(f"[PicoScan] Pico found at {ip} in {duration:.2f} s ({probed} host(s) probed on {nets})")
+    else:
+        print(f"[PicoScan] No Pico found in {duration:.2f} s ({probed} host(s) probed on {nets})")
+    return {"ip": ip, "duration_s": round(duration, 3), "probed": probed,
+            "networks": [str(n) for n in networks]}
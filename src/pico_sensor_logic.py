@@ -11,19 +11,30 @@
 import threading
 import time
 import json
+import http.client
+import ipaddress
 
-try:
-    import urllib.request as _urllib_request
-    import urllib.error   as _urllib_error
-except ImportError:
-    _urllib_request = None
-    _urllib_error   = None
+import pico_codec
+from tap_update_batcher import TapUpdateBatcher
+from pico_client import PicoClient
+from pico_command_queue import PicoCommandQueue
+from poll_scheduler import PollScheduler
+from pico_scanner import find_pico, local_networks, PROBE_TIMEOUT_S
 
 DEFAULT_PICO_HOST  = "keglevel-pico.local"
 REQUEST_TIMEOUT_S    = 2.0   # Pico can take up to ~1s during flash writes / GC
 POLL_INTERVAL_S      = 0.5   # normal idle poll rate
+IDLE_MAX_POLL_INTERVAL_S = 2.0   # idle rate after a quiet minute or more (see poll_scheduler)
 POUR_POLL_INTERVAL_S = 0.1   # fast poll rate while any tap is actively pouring
-OFFLINE_RETRY_S      = 5.0   # sleep between polls once truly offline
+OFFLINE_RETRY_S      = 5.0   # first retry delay once truly offline; doubles up to 60 s
+EVENT_STREAM_PATH    = "/api/events"
+STREAM_IDLE_TIMEOUT_S = 15.0  # Pico sends a keep-alive comment well within this
+STREAM_RETRY_S       = 60.0  # poll this long before trying the stream again
+
+NOT_MODIFIED = object()      # _poll_state(): the Pico answered 304
+POUR_LOG_PATH        = "/api/pours"
+POUR_LOG_PAGE        = 50    # pours per /api/pours request
+POUR_LOG_MAX_PAGES   = 200   # one reconciliation books at most this many pages
 DISCOVERY_PORT     = 5005
 DISCOVERY_DEVICE   = "keglevel-pico"
 
@@ -39,6 +50,7 @@ class PicoSensorLogic:
     def __init__(self, num_sensors_from_config, ui_callbacks, settings_manager):
         self.num_sensors      = num_sensors_from_config
         self.ui_callbacks     = ui_callbacks
+        self.ui_updates       = TapUpdateBatcher(self.num_sensors, ui_callbacks)
         self.settings_manager = settings_manager
 
         raw_host           = settings_manager.get_pico_w_host()
@@ -46,6 +58,12 @@ class PicoSensorLogic:
         self._discovery_mode = not bool(self._manual_host)
         self.host          = self._manual_host if self._manual_host else None
         self.base_url      = f"http://{self.host}" if self.host else None
+        self._client       = None               # PicoClient for self.host
+        self._client_lock  = threading.Lock()
+
+        # Writes triggered from the UI (tap reset, K-factors, calibration) run
+        # here so a slow Pico never blocks the render loop
+        self.commands = PicoCommandQueue(run_on_ui=ui_callbacks.get("run_on_ui_cb"))
 
         # Per-tap state — mirrors what SensorLogic maintains
         self.keg_ids_assigned            = [None] * self.num_sensors
@@ -58,10 +76,24 @@ class PicoSensorLogic:
         # Last Pico-reported dispensed values (used to compute deltas)
         self._last_dispensed = [None] * self.num_sensors
 
+        # Bumped when a tap's Pico accumulator is reset; a report requested
+        # before the reset carries the old total and is dropped (see _apply_tap)
+        self._reset_gen = [0] * self.num_sensors
+        self._tap_lock  = threading.Lock()
+
         # Pico dispensed baselines saved from the previous app session.
         # Used to capture volume poured while the app was not running.
         self._saved_pico_dispensed = settings_manager.get_pico_tap_last_dispensed()
 
+        # Pour log position those baselines were read at (see _reconcile_pour_log)
+        self._pour_cursor      = settings_manager.get_pico_pour_cursor()
+        self._pour_log_state   = None     # "pour_log" of the latest /api/state
+        self._pour_log_checked = False
+        self._pour_replayed    = [0.0] * self.num_sensors
+
+        # Settings read by the loop; swapped only when the version changes
+        self._config = settings_manager.get_config_snapshot()
+
         # Temperature dict from last /api/state poll
         self._pico_temperature = None
 
@@ -71,12 +103,31 @@ class PicoSensorLogic:
         self._auto_cal_session_pulses = 0
         self._cal_started_on_pico     = False
         self._is_calibrating          = False   # compatibility stub checked by screen on_leave
+        self._cal_taps                = [{} for _ in range(self.num_sensors)]  # latest document of every tap
 
         # Threading
         self._running      = False
         self.is_paused     = False
         self.sensor_thread = None
         self._pico_online  = False
+        self._offline_reported = False
+
+        # Poll interval from activity and round-trip time, backoff while offline
+        self._scheduler = PollScheduler(POUR_POLL_INTERVAL_S, POLL_INTERVAL_S, OFFLINE_RETRY_S,
+                                        offline_after=self._OFFLINE_THRESHOLD,
+                                        idle_max_s=IDLE_MAX_POLL_INTERVAL_S)
+        self._last_rtt  = None
+
+        # Last /api/state sequence number seen (None = ask for the full document)
+        self._state_seq  = None
+        self._poll_stats = {"polls": 0, "full": 0, "delta": 0, "not_modified": 0,
+                            "msgpack": 0, "bytes": 0, "parse_s": 0.0}
+
+        # Event stream state (see _run_event_stream)
+        self._stream_conn      = None
+        self._stream_retry_at  = 0.0
+        self._stream_connects  = 0
+        self._stream_events    = 0
 
         self._load_initial_volumes()
 
@@ -105,32 +156,32 @@ class PicoSensorLogic:
     # HTTP helpers
     # ------------------------------------------------------------------
 
+    def _pico(self):
+        """Keep-alive client for the current host (replaced if discovery moves it)."""
+        with self._client_lock:
+            host = self.host
+            if host is None:
+                return None
+            if self._client is None or self._client.host != host:
+                if self._client is not None:
+                    self._client.close()
+                self._client = PicoClient(host, timeout=REQUEST_TIMEOUT_S)
+            return self._client
+
     def _get(self, path):
         """HTTP GET → parsed JSON dict, or None on any error."""
-        try:
-            req = _urllib_request.Request(
-                self.base_url + path,
-                headers={"Accept": "application/json"}
-            )
-            with _urllib_request.urlopen(req, timeout=REQUEST_TIMEOUT_S) as resp:
-                return json.loads(resp.read().decode())
-        except Exception:
-            return None
+        client = self._pico()
+        return client.get_json(path) if client else None
 
     def _post(self, path, data=None):
         """HTTP POST with JSON body → parsed JSON dict, or None on any error."""
-        try:
-            body = json.dumps(data or {}).encode()
-            req  = _urllib_request.Request(
-                self.base_url + path,
-                data=body,
-                headers={"Content-Type": "application/json",
-                         "Accept":       "application/json"}
-            )
-            with _urllib_request.urlopen(req, timeout=REQUEST_TIMEOUT_S) as resp:
-                return json.loads(resp.read().decode())
-        except Exception:
-            return None
+        client = self._pico()
+        return client.post_json(path, data) if client else None
+
+    def get_http_stats(self):
+        """Request counts and latency percentiles of the Pico connection."""
+        client = self._client
+        return client.stats() if client else None
 
     # ------------------------------------------------------------------
     # Monitoring lifecycle (matches SensorLogic.start/stop_monitoring)
@@ -200,6 +251,9 @@ class PicoSensorLogic:
 
     def stop_monitoring(self):
         self._running = False
+        conn = self._stream_conn
+        if conn is not None:
+            conn.close()    # Unblocks the stream read
         if self.sensor_thread:
             self.sensor_thread.join(timeout=2.0)
 
@@ -213,7 +267,7 @@ class PicoSensorLogic:
     _OFFLINE_THRESHOLD = 3
 
     def _sensor_loop(self):
-        _consecutive_failures = 0
+        scheduler = self._scheduler
 
         while self._running:
             if self.is_paused:
@@ -225,125 +279,452 @@ class PicoSensorLogic:
                 time.sleep(OFFLINE_RETRY_S)
                 continue
 
-            state = self._get("/api/state")
+            # Prefer the push event stream; poll only while it is unavailable
+            if not self._auto_cal_mode and time.monotonic() >= self._stream_retry_at:
+                if self._run_event_stream():
+                    # Stream ended: one poll catches anything missed, then reconnect
+                    scheduler.record_success(None, any(self.tap_is_active))
+                    self._stream_retry_at = time.monotonic() + POLL_INTERVAL_S
+                else:
+                    self._stream_retry_at = time.monotonic() + STREAM_RETRY_S
+
+            gens  = list(self._reset_gen)
+            state = self._poll_state()
 
             if state is None:
-                _consecutive_failures += 1
-                print(f"[PicoSensor] Poll failed (#{_consecutive_failures})")
-
-                if _consecutive_failures >= self._OFFLINE_THRESHOLD:
-                    # Sustained outage — tell the UI and slow down polling
-                    if self._pico_online:
-                        self._pico_online = False
-                        print("[PicoSensor] Pico offline — slowing retry rate")
-                    for i in range(self.num_sensors):
-                        self._update_ui(i, 0.0,
-                                        self.last_known_remaining_liters[i],
-                                        "Offline",
-                                        self.last_pour_volumes[i])
-                    time.sleep(OFFLINE_RETRY_S)
-                else:
-                    # Transient blip — stay silent, retry at the normal rate
-                    time.sleep(POLL_INTERVAL_S)
+                if scheduler.record_failure() >= self._OFFLINE_THRESHOLD:
+                    self._mark_offline()
+                # Transient blips retry at the idle rate; a sustained outage backs off
+                time.sleep(scheduler.next_delay())
                 continue
 
-            _consecutive_failures = 0
-            if not self._pico_online:
-                self._pico_online = True
-                print(f"[PicoSensor] Pico online at {self.host}")
+            self._mark_online()
 
-            # Cache temperature for main_kivy to read
-            self._pico_temperature = state.get("temperature")
+            if self._auto_cal_mode:
+                scheduler.wake()
+                # A 304 still moves calibration on: the locked tap's pulses are fetched separately
+                if state is not NOT_MODIFIED:
+                    self._state_seq = state.get("seq")
+                    if "temperature" in state:
+                        self._pico_temperature = state["temperature"]
+                    self._merge_cal_taps(state, 0, self.num_sensors)
+                self._process_calibration(self._cal_taps, self._displayed_taps(self.num_sensors))
+            elif state is not NOT_MODIFIED:
+                self._apply_state(state, gens)
+                self.ui_updates.flush()
+
+            scheduler.record_success(self._last_rtt, any(self.tap_is_active))
+            time.sleep(scheduler.next_delay())
+
+    def _mark_online(self):
+        self._offline_reported = False
+        if not self._pico_online:
+            self._pico_online = True
+            print(f"[PicoSensor] Pico online at {self.host}")
+            self._remember_ip()
+
+    def _mark_offline(self):
+        """Shows every tap "Offline" -- once per outage, not on every retry."""
+        self._state_seq = None      # It may come back with a new sequence
+        if self._offline_reported:
+            return
+        self._offline_reported = True
+        self._pico_online = False
+        print(f"[PicoSensor] Pico offline after {self._scheduler.failures} failed polls — backing off")
+        for i in range(self.num_sensors):
+            self._update_ui(i, 0.0, self.last_known_remaining_liters[i], "Offline", self.last_pour_volumes[i])
+        self.ui_updates.flush()
 
-            taps          = state.get("taps", [])
-            displayed     = self.settings_manager.get_displayed_taps()
-            displayed     = min(displayed, self.num_sensors, len(taps))
+    def _remember_ip(self):
+        """Saves the Pico's IP so the next scan probes it first."""
+        import socket as _socket
+        name = self.host.rsplit(":", 1)[0] if self.host.count(":") == 1 else self.host
+        try:
+            ip = _socket.gethostbyname(name)
+        except OSError:
+            return
+        self.settings_manager.save_pico_last_known_ip(ip)
+
+    def _displayed_taps(self, available):
+        if self._config.version != self.settings_manager.config_version:
+            self._config = self.settings_manager.get_config_snapshot()
+            self._state_seq = None      # Next poll fetches every tap again
+        return min(self._config.displayed_taps, self.num_sensors, available)
+
+    def _poll_state(self):
+        """
+        Conditional GET of /api/state. Sends the last sequence number seen
+        (as ?since= and If-None-Match) so current firmware can answer 304
+        or a delta with only the changed taps; older firmware ignores both
+        and sends the full document. Returns the parsed document,
+        NOT_MODIFIED, or None on failure.
+        """
+        client = self._pico()
+        if client is None:
+            return None
+        headers = {"Accept": pico_codec.ACCEPT}
+        path    = "/api/state"
+        if self._state_seq is not None:
+            headers["If-None-Match"] = f'"{self._state_seq}"'
+            path += f"?since={self._state_seq}"
+        t0 = time.monotonic()
+        result = client.request("GET", path, headers=headers)
+        self._last_rtt = time.monotonic() - t0 if result is not None else None
+        return self._parse_state_reply(result)
+
+    def _parse_state_reply(self, result):
+        """Turns a PicoClient /api/state reply into _poll_state()'s return value."""
+        if result is None:
+            return None
+        status, resp_headers, body = result
+        self._poll_stats["polls"] += 1
+        if status == 304:
+            self._poll_stats["not_modified"] += 1
+            return NOT_MODIFIED
+        if status != 200:
+            return None
+        t0 = time.perf_counter()
+        try:
+            state = pico_codec.decode(resp_headers, body)
+        except ValueError:
+            return None
+        if not isinstance(state, dict):
+            return None
+        self._poll_stats["parse_s"] += time.perf_counter() - t0
+        self._poll_stats["bytes"] += len(body)
+        self._poll_stats["delta" if state.get("delta") else "full"] += 1
+        if pico_codec.content_type(resp_headers) in pico_codec.MSGPACK_TYPES:
+            self._poll_stats["msgpack"] += 1
+        if "seq" not in state:
+            etag = (resp_headers.get("ETag") or "").strip().strip('W/').strip('"')
+            if etag.isdigit():
+                state["seq"] = int(etag)
+        return state
+
+    def get_poll_stats(self):
+        """State poll counters (full / delta / not-modified, MessagePack replies, body bytes, decode time) and the current interval."""
+        stats = dict(self._poll_stats)
+        stats.update(self._scheduler.stats())
+        return stats
+
+    def _apply_state(self, state, gens):
+        """
+        Processes an /api/state document (poll result or stream "state" event).
+        A delta document ("delta": true) lists only the changed taps, each
+        with its "tap" index, and includes "temperature" only if it changed.
+        gens are the taps' reset generations when the document was requested.
+        """
+        if not self._pour_log_checked:
+            self._reconcile_pour_log()
+        self._state_seq = state.get("seq")
+        if "pour_log" in state:
+            self._pour_log_state = state["pour_log"]
+        if state.get("delta"):
+            if "temperature" in state:
+                self._pico_temperature = state["temperature"]
+            displayed = self._displayed_taps(self.num_sensors)
+            for tap in state.get("taps", []):
+                i = int(tap.get("tap", -1))
+                if 0 <= i < displayed:
+                    self._apply_tap(i,
+                                    float(tap.get("dispensed_liters", 0.0)),
+                                    bool(tap.get("pouring", False)),
+                                    float(tap.get("flow_rate_lpm", 0.0)),
+                                    gens[i])
+            return
+
+        # Cache temperature for main_kivy to read
+        self._pico_temperature = state.get("temperature")
+
+        taps      = state.get("taps", [])
+        displayed = self._displayed_taps(len(taps))
+        for i in range(displayed):
+            tap = taps[i]
+            self._apply_tap(i,
+                            float(tap.get("dispensed_liters", 0.0)),
+                            bool(tap.get("pouring", False)),
+                            float(tap.get("flow_rate_lpm", 0.0)),
+                            gens[i])
+
+    def _apply_tap(self, i, pico_dispensed, pouring, flow_rate, gen):
+        """
+        Books one tap's reported state, unless the tap was reset after the
+        report was requested (gen is stale): that total belongs to the old keg.
+        """
+        with self._tap_lock:
+            if gen == self._reset_gen[i]:
+                self._book_tap(i, pico_dispensed, pouring, flow_rate)
+
+    def _book_tap(self, i, pico_dispensed, pouring, flow_rate):
+        """Books one tap's reported state against its keg and stages the UI."""
+        # First report: check for volume dispensed while app was offline
+        if self._last_dispensed[i] is None:
+            saved = self._saved_pico_dispensed[i] if i < len(self._saved_pico_dispensed) else 0.0
+            # Pours replayed from the pour log are already booked individually
+            offline_delta = max(0.0, pico_dispensed - saved - self._pour_replayed[i])
+            if offline_delta > 0.001:
+                print(f"[PicoSensor] Tap {i+1}: {offline_delta:.3f} L poured while app was offline"
+                      f"{' (not in the pour log)' if self._pour_replayed[i] else ''} — applying.")
+                keg_id = self.keg_ids_assigned[i]
+                if keg_id:
+                    new_total = self.keg_dispensed_liters[i] + offline_delta
+                    self.keg_dispensed_liters[i] = new_total
+                    self.settings_manager.update_keg_dispensed_volume(
+                        keg_id, new_total, pulses=0
+                    )
+                self.last_known_remaining_liters[i] -= offline_delta
+            self._last_dispensed[i] = pico_dispensed
+            self._update_ui(i, 0.0,
+                            self.last_known_remaining_liters[i],
+                            "Idle",
+                            self.last_pour_volumes[i])
+            return
+
+        # If Pico dispensed went backwards (reset / keg change), re-baseline
+        if pico_dispensed < self._last_dispensed[i]:
+            print(f"[PicoSensor] Tap {i+1}: Pico dispensed reset detected — re-baselining.")
+            self._last_dispensed[i] = pico_dispensed
+
+        delta = max(0.0, pico_dispensed - self._last_dispensed[i])
+        self._last_dispensed[i] = pico_dispensed
+
+        if delta > 0:
+            keg_id = self.keg_ids_assigned[i]
+            if keg_id:
+                new_total = self.keg_dispensed_liters[i] + delta
+                self.keg_dispensed_liters[i] = new_total
+                self.settings_manager.update_keg_dispensed_volume(
+                    keg_id, new_total, pulses=0
+                )
+            self.last_known_remaining_liters[i] -= delta
+            self.current_pour_volume[i]         += delta
+
+        if pouring:
+            self.tap_is_active[i] = True
+            self._update_ui(i, flow_rate,
+                            self.last_known_remaining_liters[i],
+                            "Pouring",
+                            self.current_pour_volume[i])
+        elif self.tap_is_active[i]:
+            # Pour just stopped
+            self.tap_is_active[i]     = False
+            self.last_pour_volumes[i]  = self.current_pour_volume[i]
+            self.current_pour_volume[i] = 0.0
+            self.settings_manager.save_last_pour_volumes(self.last_pour_volumes)
+            self.settings_manager.save_all_keg_dispensed_volumes()
+            self._save_pico_baselines()     # Next startup replays only later pours
+            self._update_ui(i, 0.0,
+                            self.last_known_remaining_liters[i],
+                            "Idle",
+                            self.last_pour_volumes[i])
+        else:
+            self._update_ui(i, 0.0,
+                            self.last_known_remaining_liters[i],
+                            "Idle",
+                            self.last_pour_volumes[i])
 
-            if self._auto_cal_mode:
-                self._process_calibration(taps, displayed)
-                time.sleep(POLL_INTERVAL_S)
+    # ------------------------------------------------------------------
+    # Pour log reconciliation
+    # ------------------------------------------------------------------
+    #
+    # The Pico keeps a ring buffer of finished pours:
+    #
+    #   GET /api/pours?after=<seq>&limit=<n>
+    #   {"boot": "<log id>", "oldest": 12, "next": 61, "more": true,
+    #    "pours": [{"id": 13, "tap": 0, "liters": 0.47, "end_total": 12.3,
+    #               "ended_at": <unix time>}, ...]}
+    #
+    # and reports {"boot", "seq"} of the newest pour as "pour_log" in
+    # /api/state. That position is saved with the dispensed baselines, so on
+    # the next start every later pour can be booked on its own (with its own
+    # timestamp in the dispense journal) instead of one lump per tap. "boot"
+    # changes when the Pico's log restarts; the whole buffer is new then.
+
+    def _reconcile_pour_log(self):
+        """Books the pours logged since the saved cursor, page by page."""
+        self._pour_log_checked = True
+        self._replay_pour_log(self._get, self._pour_cursor, self._save_pour_cursor,
+                              0, self.num_sensors, "[PicoSensor]")
+
+    def _save_pour_cursor(self, cursor):
+        self.settings_manager.save_pico_pour_cursor(cursor)
+        self._pour_cursor = dict(cursor)
+
+    def _replay_pour_log(self, get, cursor, save_cursor, offset, taps, prefix):
+        """
+        Books one Pico's logged pours after cursor, whose taps are global
+        taps offset to offset + taps - 1. get(path) fetches from that Pico;
+        save_cursor(cursor) persists each page's end position.
+        """
+        cursor   = dict(cursor)
+        booked   = 0
+        liters   = 0.0
+        restarted = False
+        for _ in range(POUR_LOG_MAX_PAGES):
+            page = get(f"{POUR_LOG_PATH}?after={cursor['seq']}&limit={POUR_LOG_PAGE}")
+            if not isinstance(page, dict) or not isinstance(page.get("pours"), list):
+                if not booked:
+                    return      # Older firmware (404) or Pico unreachable: totals only
+                break
+            boot = str(page.get("boot", ""))
+            if boot != cursor["boot"]:
+                if restarted:
+                    break       # Log restarted again mid-reconciliation; totals cover the rest
+                if cursor["boot"]:
+                    print(f"{prefix} Pour log restarted on the Pico — replaying its whole buffer.")
+                cursor, restarted = {"boot": boot, "seq": 0}, True
                 continue
+            if page.get("oldest", 0) > cursor["seq"] + 1 and not booked:
+                print(f"{prefix} Pour log overflowed: pours {cursor['seq'] + 1}–"
+                      f"{page['oldest'] - 1} lost, their volume is booked as one amount.")
+            for pour in page["pours"]:
+                poured = self._book_logged_pour(pour, restarted, offset, taps)
+                if poured > 0:
+                    booked += 1
+                    liters += poured
+            cursor["seq"] = int(page.get("next", cursor["seq"]))
+            # Durable before the cursor moves, so a crash cannot book a page twice
+            self.settings_manager.save_all_keg_dispensed_volumes()
+            save_cursor(cursor)
+            if not page.get("more"):
+                break
+        if booked:
+            self.settings_manager.save_last_pour_volumes(self.last_pour_volumes)
+            print(f"{prefix} Replayed {booked} pour(s) from the Pico's pour log ({liters:.3f} L).")
 
-            for i in range(displayed):
-                tap           = taps[i]
-                pico_dispensed = float(tap.get("dispensed_liters", 0.0))
-                pouring        = bool(tap.get("pouring", False))
-                flow_rate      = float(tap.get("flow_rate_lpm", 0.0))
-
-                # First poll: check for volume dispensed while app was offline
-                if self._last_dispensed[i] is None:
-                    saved = self._saved_pico_dispensed[i] if i < len(self._saved_pico_dispensed) else 0.0
-                    offline_delta = max(0.0, pico_dispensed - saved)
-                    if offline_delta > 0.001:
-                        print(f"[PicoSensor] Tap {i+1}: {offline_delta:.3f} L poured while app was offline — applying.")
-                        keg_id = self.keg_ids_assigned[i]
-                        if keg_id:
-                            new_total = self.keg_dispensed_liters[i] + offline_delta
-                            self.keg_dispensed_liters[i] = new_total
-                            self.settings_manager.update_keg_dispensed_volume(
-                                keg_id, new_total, pulses=0
-                            )
-                        self.last_known_remaining_liters[i] -= offline_delta
-                    self._last_dispensed[i] = pico_dispensed
-                    self._update_ui(i, 0.0,
-                                    self.last_known_remaining_liters[i],
-                                    "Idle",
-                                    self.last_pour_volumes[i])
-                    continue
+    def _book_logged_pour(self, pour, log_restarted, offset, taps):
+        """Books one pour log entry (tap relative to offset). Returns the liters booked."""
+        try:
+            local  = int(pour["tap"])
+            liters = float(pour["liters"])
+        except (KeyError, TypeError, ValueError):
+            return 0
+        i = offset + local
+        if not 0 <= local < taps or i >= self.num_sensors or liters <= 0:
+            return 0
+        if not log_restarted and "end_total" in pour and i < len(self._saved_pico_dispensed):
+            # A pour still running at the last save was partly booked live
+            liters = min(liters, max(0.0, float(pour["end_total"]) - self._saved_pico_dispensed[i]))
+            if liters <= 0:
+                return 0
+        ended_at = pour.get("ended_at")
+        timestamp = float(ended_at) if isinstance(ended_at, (int, float)) and ended_at > 1.5e9 else None
+
+        keg_id = self.keg_ids_assigned[i]
+        if keg_id:
+            self.keg_dispensed_liters[i] += liters
+            self.settings_manager.update_keg_dispensed_volume(
+                keg_id, self.keg_dispensed_liters[i], pulses=0, timestamp=timestamp
+            )
+        self.last_known_remaining_liters[i] -= liters
+        self.last_pour_volumes[i]   = liters
+        self._pour_replayed[i]     += liters
+        return liters
 
-                # If Pico dispensed went backwards (reset / keg change), re-baseline
-                if pico_dispensed < self._last_dispensed[i]:
-                    print(f"[PicoSensor] Tap {i+1}: Pico dispensed reset detected — re-baselining.")
-                    self._last_dispensed[i] = pico_dispensed
-
-                delta = max(0.0, pico_dispensed - self._last_dispensed[i])
-                self._last_dispensed[i] = pico_dispensed
-
-                if delta > 0:
-                    keg_id = self.keg_ids_assigned[i]
-                    if keg_id:
-                        new_total = self.keg_dispensed_liters[i] + delta
-                        self.keg_dispensed_liters[i] = new_total
-                        self.settings_manager.update_keg_dispensed_volume(
-                            keg_id, new_total, pulses=0
-                        )
-                    self.last_known_remaining_liters[i] -= delta
-                    self.current_pour_volume[i]         += delta
-
-                if pouring:
-                    self.tap_is_active[i] = True
-                    self._update_ui(i, flow_rate,
-                                    self.last_known_remaining_liters[i],
-                                    "Pouring",
-                                    self.current_pour_volume[i])
-                elif self.tap_is_active[i]:
-                    # Pour just stopped
-                    self.tap_is_active[i]     = False
-                    self.last_pour_volumes[i]  = self.current_pour_volume[i]
-                    self.current_pour_volume[i] = 0.0
-                    self.settings_manager.save_last_pour_volumes(self.last_pour_volumes)
-                    self.settings_manager.save_all_keg_dispensed_volumes()
-                    self._update_ui(i, 0.0,
-                                    self.last_known_remaining_liters[i],
-                                    "Idle",
-                                    self.last_pour_volumes[i])
-                else:
-                    self._update_ui(i, 0.0,
-                                    self.last_known_remaining_liters[i],
-                                    "Idle",
-                                    self.last_pour_volumes[i])
-
-            # Use fast poll rate while any tap is actively pouring,
-            # normal rate otherwise.
-            if any(self.tap_is_active):
-                time.sleep(POUR_POLL_INTERVAL_S)
-            else:
-                time.sleep(POLL_INTERVAL_S)
+    # ------------------------------------------------------------------
+    # Push event stream (Server-Sent Events on EVENT_STREAM_PATH)
+    # ------------------------------------------------------------------
+    #
+    #   event: state        data: full /api/state document (sent on connect)
+    #   event: pour_start   data: {"tap": 0, "dispensed_liters": .., "flow_rate_lpm": ..}
+    #   event: pour_delta   data: same as pour_start
+    #   event: pour_end     data: same as pour_start
+    #   event: temperature  data: the "temperature" object of /api/state
+    #
+    # Lines starting with ":" are keep-alive comments. Firmware without the
+    # endpoint answers 404 and the loop keeps polling, retrying the stream
+    # every STREAM_RETRY_S.
+
+    def _run_event_stream(self):
+        """
+        Consumes the event stream until it ends. Returns False if it could not
+        be opened (caller falls back to polling), True once it was live.
+        """
+        conn = http.client.HTTPConnection(self.host, timeout=STREAM_IDLE_TIMEOUT_S)
+        self._stream_conn = conn
+        try:
+            conn.request("GET", EVENT_STREAM_PATH, headers={"Accept": "text/event-stream",
+                                                            "Cache-Control": "no-cache"})
+            resp = conn.getresponse()
+            if resp.status != 200 or "text/event-stream" not in (resp.getheader("Content-Type") or ""):
+                resp.read()
+                return False
+
+            print(f"[PicoSensor] Event stream open at {self.host}")
+            self._mark_online()
+            self._stream_connects += 1
+            gens = list(self._reset_gen)
+            event, data = "message", []
+            while self._running and not self.is_paused and not self._auto_cal_mode:
+                line = resp.readline()
+                if not line:
+                    break                               # Pico closed the stream
+                if gens != self._reset_gen:
+                    break       # A tap was reset: events already queued may predate it
+                line = line.decode("utf-8", "replace").rstrip("\r\n")
+                if not line:
+                    if data:
+                        self._handle_stream_event(event, "\n".join(data), gens)
+                        self.ui_updates.flush()
+                    event, data = "message", []
+                elif line.startswith(":"):
+                    continue
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+            return True
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            if self._stream_connects and self._running:
+                print(f"[PicoSensor] Event stream lost ({e.__class__.__name__}) — polling")
+            return False
+        finally:
+            self._stream_conn = None
+            conn.close()
+
+    def _handle_stream_event(self, event, data, gens):
+        try:
+            payload = json.loads(data)
+            self._stream_events += 1
+            self._dispatch_stream_event(event, payload, gens)
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"[PicoSensor] Ignoring malformed '{event}' event: {e}")
+
+    def _dispatch_stream_event(self, event, payload, gens):
+        if event == "state":
+            self._apply_state(payload, gens)
+        elif event in ("pour_start", "pour_delta", "pour_end"):
+            i = int(payload.get("tap", -1))
+            if 0 <= i < self._displayed_taps(self.num_sensors):
+                self._apply_tap(i,
+                                float(payload.get("dispensed_liters", 0.0)),
+                                event != "pour_end",
+                                float(payload.get("flow_rate_lpm", 0.0)),
+                                gens[i])
+        elif event == "temperature":
+            self._pico_temperature = payload
+
+    def get_stream_stats(self):
+        return {"stream_connects": self._stream_connects, "stream_events": self._stream_events,
+                "streaming": self._stream_conn is not None}
 
     # ------------------------------------------------------------------
     # Calibration (auto-detect mode matching SensorLogic interface)
     # ------------------------------------------------------------------
 
+    def _merge_cal_taps(self, state, offset, count):
+        """
+        Copies the taps of a state document into _cal_taps at offset. A delta
+        document lists only the changed taps, placed by their "tap" index.
+        """
+        if state.get("delta"):
+            entries = ((int(tap.get("tap", -1)), tap) for tap in state.get("taps", []))
+        else:
+            entries = enumerate(state.get("taps", []))
+        for local, tap in entries:
+            if 0 <= local < count:
+                self._cal_taps[offset + local] = tap
+
     def _process_calibration(self, taps, displayed):
         for i in range(displayed):
             tap       = taps[i]
@@ -374,11 +755,20 @@ class PicoSensorLogic:
         self._auto_cal_locked_tap     = -1
         self._auto_cal_session_pulses = 0
         self._cal_started_on_pico     = False
+        self._cal_taps                = [{} for _ in range(self.num_sensors)]
+        self._state_seq               = None    # Calibration starts from a full document
         print("[PicoSensor] Auto-Calibration Mode STARTED")
 
-    def stop_auto_calibration_mode(self):
+    def _end_pico_calibration(self):
+        """Queues the POST that ends the Pico's calibration session on the locked tap."""
         if self._auto_cal_locked_tap >= 0 and self._cal_started_on_pico:
-            self._post(f"/api/tap/{self._auto_cal_locked_tap}/calibrate")
+            path = f"/api/tap/{self._auto_cal_locked_tap}/calibrate"
+            # Not retried: the POST toggles calibration, so a lost reply plus a retry would restart it
+            self.commands.submit(f"End calibration on tap {self._auto_cal_locked_tap + 1}",
+                                 lambda: self._post(path), retry=False)
+
+    def stop_auto_calibration_mode(self):
+        self._end_pico_calibration()
         self._auto_cal_mode           = False
         self._auto_cal_locked_tap     = -1
         self._auto_cal_session_pulses = 0
@@ -386,8 +776,7 @@ class PicoSensorLogic:
         print("[PicoSensor] Auto-Calibration Mode STOPPED")
 
     def reset_auto_calibration_state(self):
-        if self._auto_cal_locked_tap >= 0 and self._cal_started_on_pico:
-            self._post(f"/api/tap/{self._auto_cal_locked_tap}/calibrate")
+        self._end_pico_calibration()
         self._auto_cal_locked_tap     = -1
         self._auto_cal_session_pulses = 0
         self._cal_started_on_pico     = False
@@ -415,6 +804,8 @@ class PicoSensorLogic:
 
     def force_recalculation(self):
         self._load_initial_volumes()
+        self.ui_updates.invalidate()
+        self._state_seq = None  # A 304 would leave the refreshed taps unsent
 
     # ------------------------------------------------------------------
     # Pico-specific helpers called from main_kivy.py
@@ -427,44 +818,76 @@ class PicoSensorLogic:
     def is_pico_online(self):
         return self._pico_online
 
-    def notify_keg_change(self, tap_index):
+    def notify_keg_change(self, tap_index, on_done=None):
         """
         Call when the user assigns a new keg to a tap.
-        Resets the Pico's dispensed accumulator for that tap so the new keg
-        starts at zero, and re-baselines the local tracking accordingly.
+        Queues a reset of the Pico's dispensed accumulator for that tap so the
+        new keg starts at zero; once the Pico confirms, the tap is re-baselined
+        at zero here too. on_done(reply or None) runs on the UI thread.
         """
-        result = self._post(f"/api/tap/{tap_index}/reset")
-        if result:
-            print(f"[PicoSensor] Tap {tap_index+1} reset on Pico.")
-        else:
-            print(f"[PicoSensor] Warning: could not reset tap {tap_index+1} on Pico.")
-        self._last_dispensed[tap_index] = 0.0
-
-    def push_k_factors_to_pico(self, k_factors):
-        """Push updated K-factors to the Pico after calibration."""
-        result = self._post("/api/config", {"k_factors": k_factors})
-        if result:
-            print(f"[PicoSensor] K-factors pushed to Pico: {k_factors}")
-        else:
-            print("[PicoSensor] Warning: could not push K-factors to Pico.")
+        def reset():
+            result = self._post(f"/api/tap/{tap_index}/reset")
+            if result:
+                self._rebaseline_tap(tap_index)
+                print(f"[PicoSensor] Tap {tap_index+1} reset on Pico.")
+            return result
+        self.commands.submit(f"Reset of tap {tap_index+1}", reset, on_done,
+                             coalesce_key=("reset", tap_index))
+
+    def push_k_factors_to_pico(self, k_factors, on_done=None):
+        """
+        Queues a push of updated K-factors to the Pico after calibration. A
+        push still waiting is replaced by the newer one. on_done(reply or
+        None) runs on the UI thread.
+        """
+        k_factors = list(k_factors)
+        def push():
+            result = self._post("/api/config", {"k_factors": k_factors})
+            if result:
+                print(f"[PicoSensor] K-factors pushed to Pico: {k_factors}")
+            return result
+        self.commands.submit("K-factor push", push, on_done, coalesce_key="k_factors")
+
+    def get_command_stats(self):
+        """Counters of the Pico write queue."""
+        return self.commands.stats()
 
     # ------------------------------------------------------------------
     # Compatibility stubs (match SensorLogic interface)
     # ------------------------------------------------------------------
 
+    def _rebaseline_tap(self, i):
+        """The Pico's total for tap i restarts at zero: book only what is poured from here on."""
+        with self._tap_lock:
+            self._reset_gen[i] += 1
+            self._last_dispensed[i] = 0.0
+            if i < len(self._saved_pico_dispensed):
+                self._saved_pico_dispensed[i] = 0.0
+        self._save_pico_baselines()
+
     def _save_pico_baselines(self):
         """Persist the Pico's current dispensed counters to settings so that
         volume poured while the app is closed is captured on next startup."""
+        # The baselines include every pour the current log position covers
+        self.settings_manager.save_pico_tap_last_dispensed(self._pico_baselines(),
+                                                           pour_log_cursor(self._pour_log_state))
+
+    def _pico_baselines(self):
         baselines = []
         for i in range(self.num_sensors):
             val = self._last_dispensed[i]
-            baselines.append(val if val is not None else 0.0)
-        self.settings_manager.save_pico_tap_last_dispensed(baselines)
+            if val is None:     # Not reported this session: keep the old baseline
+                val = self._saved_pico_dispensed[i] if i < len(self._saved_pico_dispensed) else 0.0
+            baselines.append(val)
+        return baselines
 
     def cleanup_gpio(self):
-        """Called by on_stop — save Pico baselines then halt the polling thread."""
+        """Called by on_stop — save Pico baselines, send queued writes, then halt the polling thread."""
         self._save_pico_baselines()
         self._running = False
+        self.commands.close()
+        if self._client is not None:
+            self._client.close()
         print("[PicoSensor] Monitoring stopped.")
 
     def simulate_pulse_increment(self, tap_index, pulse_amount):
@@ -479,9 +902,18 @@ class PicoSensorLogic:
     # ------------------------------------------------------------------
 
     def _update_ui(self, idx, rate, rem, status, pour_vol):
-        cb = self.ui_callbacks.get("update_sensor_data_cb")
-        if cb:
-            cb(idx, rate, rem, status, pour_vol)
+        # Staged; only taps whose displayed state changed are sent per poll
+        self.ui_updates.stage(idx, rate, rem, status, pour_vol)
+
+    def get_ui_update_stats(self):
+        return self.ui_updates.stats()
+
+
+def pour_log_cursor(log):
+    """The saved-cursor form of an /api/state "pour_log", or None if there is none."""
+    if isinstance(log, dict) and "seq" in log:
+        return {"boot": str(log.get("boot", "")), "seq": int(log["seq"])}
+    return None
 
 
 # ---------------------------------------------------------------------------
@@ -492,65 +924,20 @@ def get_local_subnet_prefix():
     """
     Return the first three octets of the machine's LAN IP as a string,
     e.g. '192.168.68'.  Returns None if the local IP cannot be determined.
+    Kept for callers of the old /24 scan; pico_scanner.local_networks()
+    covers every interface.
     """
-    import socket as _socket
-    try:
-        s = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ".".join(ip.split(".")[:3])
-    except Exception:
+    networks = local_networks()
+    if not networks:
         return None
+    return ".".join(str(networks[0].network_address).split(".")[:3])
 
 
-def scan_for_pico(subnet_prefix, timeout=0.5):
+def scan_for_pico(subnet_prefix=None, timeout=PROBE_TIMEOUT_S, preferred=()):
     """
-    Probe every host in <subnet_prefix>.1 – .254 for the Pico's /api/version
-    endpoint.  Returns the first IP that responds with a 'version' key, or None.
-
-    Concurrency is capped at MAX_CONCURRENT to avoid flooding the network stack
-    and starving the sensor polling thread.
+    Probe <subnet_prefix>.1 – .254 (every local network if subnet_prefix is
+    None) for the Pico's /api/version endpoint, preferred IPs first.
+    Returns the first IP that responds with a 'version' key, or None.
     """
-    if _urllib_request is None:
-        return None
-
-    MAX_CONCURRENT = 25
-    found = [None]
-    lock  = threading.Lock()
-    sem   = threading.Semaphore(MAX_CONCURRENT)
-
-    def _probe(ip):
-        with sem:
-            if found[0]:        # stop as soon as another thread succeeds
-                return
-            try:
-                req = _urllib_request.Request(
-                    f"http://{ip}/api/version",
-                    headers={"Accept": "application/json"}
-                )
-                with _urllib_request.urlopen(req, timeout=timeout) as resp:
-                    data = json.loads(resp.read().decode())
-                    if "version" in data:
-                        with lock:
-                            if not found[0]:
-                                found[0] = ip
-            except Exception:
-                pass
-
-    threads = [
-        threading.Thread(target=_probe, args=(f"{subnet_prefix}.{i}",), daemon=True)
-        for i in range(1, 255)
-    ]
-    for t in threads:
-        t.start()
-
-    # Join with a per-thread timeout; break early once the Pico is found
-    deadline = time.time() + timeout + 2.0
-    for t in threads:
-        remaining = deadline - time.time()
-        if remaining <= 0 or found[0]:
-            break
-        t.join(timeout=remaining)
-
-    return found[0]
+    networks = [ipaddress.IPv4Network(f"{subnet_prefix}.0/24")] if subnet_prefix else None
+    return find_pico(networks, preferred, timeout=timeout)["ip"]
@@ -0,0 +1,95 @@
+# poll_scheduler.py
+# Decides how long the Pico backends wait before their next /api/state poll.
+#
+#   * pouring: the fast rate, so the pour display and the end of the pour
+#     keep up
+#   * otherwise: the idle rate, which bounds how late a new pour shows up
+#     (lingering at the fast rate after a pour costs more polls than it saves)
+#   * idle for IDLE_STRETCH_AFTER_S: the idle interval grows by
+#     IDLE_STRETCH_FACTOR per poll up to idle_max_s, which is then the worst
+#     case for a pour showing up; the Pico keeps counting meanwhile, so only
+#     the display is late, never the booked volume. A pour, a failure or
+#     wake() drops straight back to the idle rate
+#   * never faster than RTT_FACTOR x the smoothed round-trip time, so a slow
+#     link is not sent back-to-back requests
+#   * failures: the idle rate until offline_after in a row, then exponential
+#     backoff with jitter up to max_backoff_s
+
+import random
+
+RTT_FACTOR       = 2.0
+RTT_SMOOTHING    = 0.2    # weight of a new sample in the RTT average
+MAX_BACKOFF_S    = 60.0
+MAX_DOUBLINGS    = 16     # far past any max_backoff_s / offline_s ratio
+IDLE_STRETCH_AFTER_S = 60.0
+IDLE_STRETCH_FACTOR  = 1.25
+
+
+class PollScheduler:
+    """Poll interval and backoff for one Pico."""
+
+    def __init__(self, fast_s, idle_s, offline_s, offline_after=3, max_backoff_s=MAX_BACKOFF_S, rng=None,
+                 idle_max_s=None):
+        self.fast_s        = fast_s
+        self.idle_s        = idle_s
+        self.idle_max_s    = idle_s if idle_max_s is None else max(idle_s, idle_max_s)
+        self.offline_s     = offline_s
+        self.offline_after = offline_after
+        self.max_backoff_s = max_backoff_s
+        self.rng           = rng or random.Random()
+
+        self.failures      = 0
+        self.rtt_s         = None     # smoothed round-trip time
+        self.last_delay_s  = 0.0
+        self._active       = False
+        self._idle_for_s   = 0.0      # time spent polling at the idle rate
+        self._idle_delay_s = idle_s
+
+    def record_success(self, rtt_s, active):
+        """A poll answered after rtt_s; active = a tap is pouring."""
+        self.failures = 0
+        if rtt_s is not None:
+            self.rtt_s = rtt_s if self.rtt_s is None else self.rtt_s + RTT_SMOOTHING * (rtt_s - self.rtt_s)
+        self._active = active
+        if active:
+            self.wake()
+        else:
+            self._idle_for_s += self.last_delay_s
+            if self._idle_for_s >= IDLE_STRETCH_AFTER_S:
+                self._idle_delay_s = min(self.idle_max_s, self._idle_delay_s * IDLE_STRETCH_FACTOR)
+
+    def record_failure(self):
+        """Returns the failure streak length."""
+        self.failures += 1
+        self.wake()
+        return self.failures
+
+    def wake(self):
+        """Back to the plain idle rate, e.g. while calibrating."""
+        self._idle_for_s   = 0.0
+        self._idle_delay_s = self.idle_s
+
+    @property
+    def offline(self):
+        return self.failures >= self.offline_after
+
+    def next_delay(self):
+        if self.failures >= self.offline_after:
+            # The exponent is capped too: 2 ** n for a days-long outage would overflow a float
+            doublings = min(self.failures - self.offline_after, MAX_DOUBLINGS)
+            backoff = min(self.max_backoff_s, self.offline_s * 2 ** doublings)
+            # Jitter keeps retries from lining up with the Pico's own restart cycle
+            delay = backoff * self.rng.uniform(0.5, 1.0)
+        elif self.failures:
+            delay = self.idle_s
+        else:
+            delay = self.fast_s if self._active else self._idle_delay_s
+            if self.rtt_s is not None:
+                delay = max(delay, RTT_FACTOR * self.rtt_s)
+        self.last_delay_s = delay
+        return delay
+
+    def stats(self):
+        return {"interval_s": round(self.last_delay_s, 3),
+                "rtt_ms": None if self.rtt_s is None else round(self.rtt_s * 1000.0, 2),
+                "failures": self.failures}
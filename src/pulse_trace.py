@@ -0,0 +1,174 @@
+# keglevel app
+#
+# pulse_trace.py
+#
+# Records the raw flow sensor edge stream to a compact binary file during
+# normal service and replays it later through the same entry points the
+# hardware uses (count_pulse / simulate_pulse_increment), at 1x-1000x speed.
+#
+# File layout (little-endian):
+#   header : magic b"KLPT", u16 version, u16 reserved, f64 wall-clock start
+#   records: u8 pin, u32 microseconds since the previous record
+# BCM pins are stored as-is; expander ("<driver>:<channel>") pins are stored as
+# VIRTUAL_PIN_FLAG | slot and resolved against the pin map when read.
+# A gap longer than a u32 of microseconds (~71 min) is written as one or more
+# GAP_PIN records that only advance the clock.
+import os
+import struct
+import time
+import threading
+from collections import deque
+
+TRACE_MAGIC = b"KLPT"
+TRACE_VERSION = 1
+TRACE_FILE_EXT = ".klpt"
+GAP_PIN = 0xFF
+VIRTUAL_PIN_FLAG = 0x80
+MAX_REPLAY_SPEED = 1000.0
+REPLAY_SLICE_S = 0.001   # Edges due within this window are sent together
+
+_HEADER = struct.Struct("<4sHHd")
+_RECORD = struct.Struct("<BI")
+_MAX_DELTA_US = 0xFFFFFFFF
+
+
+class PulseTraceRecorder:
+    """
+    Collects (pin, monotonic timestamp) edges and writes them out in
+    batches. record() is called from the pulse callback path and only
+    appends to a deque; flush() drains it with popleft(), so an edge that
+    lands mid-flush is written by the next flush instead of being lost, and
+    does the encoding and file I/O on the sensor loop thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.edges_written = 0
+        self._events = deque()
+        self._last_ts = None
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, 0, time.time()))
+
+    def record(self, pin, timestamp):
+        self._events.append((pin, timestamp))
+
+    def flush(self):
+        events = self._events
+        if not events: return
+        out = bytearray()
+        with self._lock:
+            if self._file is None: return
+            last = self._last_ts if self._last_ts is not None else events[0][1]
+            # Only what is queued now; edges recorded meanwhile wait for the next flush
+            written = len(events)
+            for _ in range(written):
+                pin, ts = events.popleft()
+                delta_us = max(0, int(round((ts - last) * 1e6)))
+                while delta_us > _MAX_DELTA_US:
+                    out += _RECORD.pack(GAP_PIN, _MAX_DELTA_US)
+                    delta_us -= _MAX_DELTA_US
+                out += _RECORD.pack(pin, delta_us)
+                last = ts
+            self._last_ts = last
+            self._file.write(out)
+            self.edges_written += written
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        print(f"PulseTrace: {self.edges_written} edges saved to {self.path}")
+
+
+def trace_code(pin, slot):
+    """The byte a pin is recorded as (see the file layout above)."""
+    if isinstance(pin, int) and 0 <= pin < VIRTUAL_PIN_FLAG: return pin
+    return VIRTUAL_PIN_FLAG | slot   # slot < 127, so never GAP_PIN
+
+
+def pin_for_code(code):
+    if not code & VIRTUAL_PIN_FLAG: return code
+    from sensor_logic import FLOW_SENSOR_PINS
+    slot = code & ~VIRTUAL_PIN_FLAG
+    return FLOW_SENSOR_PINS[slot] if slot < len(FLOW_SENSOR_PINS) else None
+
+
+def read_trace(path):
+    """Yields (pin, seconds_since_first_edge) for every edge in a trace."""
+    with open(path, 'rb') as f:
+        magic, version, _reserved, _start = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"{path} is not a version {TRACE_VERSION} pulse trace")
+        data = f.read()
+    usable = len(data) - (len(data) % _RECORD.size)   # Ignore a torn tail
+    t_us = 0
+    for pin, delta_us in _RECORD.iter_unpack(data[:usable]):
+        t_us += delta_us
+        if pin != GAP_PIN:
+            yield pin_for_code(pin), t_us / 1e6
+
+
+def summarize_trace(path):
+    """Edge counts per pin plus the trace length, for quick inspection."""
+    counts = {}
+    duration = 0.0
+    for pin, t in read_trace(path):
+        counts[pin] = counts.get(pin, 0) + 1
+        duration = t
+    return {"path": path, "duration_s": duration, "edges": sum(counts.values()), "edges_per_pin": counts}
+
+
+def replay_trace(path, speed=1.0, pulse_cb=None, sensor_logic=None, stop_event=None):
+    """
+    Plays a trace back in (scaled) real time. By default each edge goes
+    through sensor_logic.count_pulse(pin), the same path as a GPIO interrupt.
+    Passing a sensor backend instead routes edges, grouped per replay slice,
+    through its simulate_pulse_increment(tap_index, n). Returns the number
+    of edges sent.
+    """
+    import sensor_logic as _sensor_logic
+    if not (0 < speed <= MAX_REPLAY_SPEED):
+        raise ValueError(f"replay speed must be between 0 and {MAX_REPLAY_SPEED:g}x")
+    if pulse_cb is None and sensor_logic is None:
+        pulse_cb = _sensor_logic.count_pulse
+
+    sent = 0
+    pending = {}
+    start = time.monotonic()
+    for pin, t in read_trace(path):
+        due = start + t / speed
+        now = time.monotonic()
+        if due - now > REPLAY_SLICE_S:
+            sent += _send_pending(pending, sensor_logic)
+            if stop_event is not None and stop_event.is_set(): break
+            time.sleep(due - now)
+        if pulse_cb is not None:
+            pulse_cb(pin)
+            sent += 1
+        else:
+            pending[pin] = pending.get(pin, 0) + 1
+    sent += _send_pending(pending, sensor_logic)
+    return sent
+
+
+def _send_pending(pending, sensor_logic):
+    if not pending: return 0
+    from sensor_logic import PIN_TO_SLOT
+    sent = 0
+    for pin, n in pending.items():
+        slot = PIN_TO_SLOT.get(pin)
+        if slot is not None:
+            sensor_logic.simulate_pulse_increment(slot, n)
+            sent += n
+    pending.clear()
+    return sent
+
+
+def new_trace_path(data_dir):
+    """data_dir/pulse_traces/pulses-YYYYmmdd-HHMMSS.klpt (folder created)."""
+    trace_dir = os.path.join(data_dir, "pulse_traces")
+    os.makedirs(trace_dir, exist_ok=True)
+    return os.path.join(trace_dir, time.strftime("pulses-%Y%m%d-%H%M%S") + TRACE_FILE_EXT)
@@ -2,6 +2,11 @@
 # sensor_logic.py
 import time
 import threading
+from array import array
+
+from tap_update_batcher import TapUpdateBatcher
+from pulse_trace import PulseTraceRecorder, new_trace_path, trace_code
+from expander_pins import parse_pin, is_virtual_pin, start_expanders
 
 # --- HARDWARE IMPORT SAFETY ---
 try:
@@ -28,46 +33,178 @@ except (ImportError, RuntimeError):
 def is_raspberry_pi(): return IS_RASPBERRY_PI_MODE
 
 # --- PINS & CONSTANTS ---
-FLOW_SENSOR_PINS = [5, 6, 12, 13, 16] 
+DEFAULT_FLOW_SENSOR_PINS = [5, 6, 12, 13, 16]
+FLOW_SENSOR_PINS = list(DEFAULT_FLOW_SENSOR_PINS) # Active pin map, see configure_flow_sensor_pins()
 READING_INTERVAL_SECONDS = 0.5 
+FAST_TICK_SECONDS = 0.05      # Loop cadence while any tap has flow
 FLOW_DEBOUNCE_MS = 5
 FLOW_PULSES_FOR_ACTIVITY = 10
-FLOW_PULSES_FOR_STOPPED = 3
+FLOW_STOP_GAP_SECONDS = 0.5   # No edge for this long = pour stopped
 DEFAULT_K_FACTOR = 5100.0
+MAX_FLOW_SENSORS = 127       # Pin map size limit (pulse traces index slots in 7 bits)
 GPIO_LIB = GPIO 
 
+# --- PULSE RING BUFFERS ---
+# Each pin keeps the monotonic timestamp of its last PULSE_RING_SIZE edges.
+# global_pulse_counts[slot] is the running edge count and doubles as the ring
+# write cursor, so (count - 1) & PULSE_RING_MASK is always the newest edge.
+PULSE_RING_SIZE = 1024   # Must be a power of two
+PULSE_RING_MASK = PULSE_RING_SIZE - 1
+PIN_TO_SLOT = {pin: slot for slot, pin in enumerate(FLOW_SENSOR_PINS)}
+
 # Global counter (must be global for interrupt)
-global_pulse_counts = [0] * len(FLOW_SENSOR_PINS)
+global_pulse_counts = array('q', bytes(8 * len(FLOW_SENSOR_PINS)))
+pulse_timestamps = [array('d', bytes(8 * PULSE_RING_SIZE)) for _ in FLOW_SENSOR_PINS]
 last_check_time = [0.0] * len(FLOW_SENSOR_PINS) 
 
+# Slots that received edges since the sensor loop last looked. Marked after
+# the count is published, so popping a slot always sees its new edges.
+pulse_dirty = set()
+
+# Set by the pulse callbacks to wake an idle sensor loop
+pulse_event = threading.Event()
+
+# Active PulseTraceRecorder while a trace is being captured, else None
+trace_recorder = None
+slot_trace_codes = [trace_code(pin, slot) for slot, pin in enumerate(FLOW_SENSOR_PINS)]
+
+def configure_flow_sensor_pins(pins):
+    """
+    Installs a pin map (BCM ints and/or "<driver>:<channel>" expander pins).
+    Everything is resized in place, so modules that imported FLOW_SENSOR_PINS
+    or PIN_TO_SLOT see the change; a pin that is kept keeps its count and
+    edge history even if it moves to another slot. Call only while no
+    sensor loop is running.
+    """
+    pins = [parse_pin(p) for p in pins]
+    if len(set(pins)) != len(pins): raise ValueError("flow sensor pin map has duplicates")
+    if not pins: raise ValueError("flow sensor pin map is empty")
+    if len(pins) > MAX_FLOW_SENSORS: raise ValueError(f"at most {MAX_FLOW_SENSORS} flow sensor pins")
+    if pins == FLOW_SENSOR_PINS: return
+
+    old = {pin: (global_pulse_counts[s], pulse_timestamps[s], last_check_time[s])
+           for s, pin in enumerate(FLOW_SENSOR_PINS)}
+    fresh = lambda: (0, array('d', bytes(8 * PULSE_RING_SIZE)), 0.0)
+    state = [old.get(pin) or fresh() for pin in pins]
+
+    FLOW_SENSOR_PINS[:] = pins
+    PIN_TO_SLOT.clear()
+    PIN_TO_SLOT.update((pin, slot) for slot, pin in enumerate(pins))
+    global_pulse_counts[:] = array('q', [st[0] for st in state])
+    pulse_timestamps[:] = [st[1] for st in state]
+    last_check_time[:] = [st[2] for st in state]
+    slot_trace_codes[:] = [trace_code(pin, slot) for slot, pin in enumerate(pins)]
+    pulse_dirty.clear()
+    print(f"SensorLogic: Flow sensor pin map set to {pins}")
+
 def count_pulse(channel):
-    try:
-        sensor_index = FLOW_SENSOR_PINS.index(channel)
-        global_pulse_counts[sensor_index] += 1
-    except ValueError: pass
+    slot = PIN_TO_SLOT.get(channel)
+    if slot is None: return
+    n = global_pulse_counts[slot]
+    now = time.monotonic()
+    # Write the timestamp before publishing the new count so readers never
+    # see a count whose newest edge has not been stamped yet.
+    pulse_timestamps[slot][n & PULSE_RING_MASK] = now
+    global_pulse_counts[slot] = n + 1
+    pulse_dirty.add(slot)
+    recorder = trace_recorder
+    if recorder is not None: recorder.record(slot_trace_codes[slot], now)
+    if not pulse_event.is_set(): pulse_event.set()
+
+def record_pulses(slot, pulse_amount, timestamp=None):
+    """Adds a burst of edges to a slot, stamping each with the same time."""
+    if pulse_amount <= 0: return
+    if timestamp is None: timestamp = time.monotonic()
+    ring = pulse_timestamps[slot]
+    n = global_pulse_counts[slot]
+    for i in range(n + max(0, pulse_amount - PULSE_RING_SIZE), n + pulse_amount):
+        ring[i & PULSE_RING_MASK] = timestamp
+    global_pulse_counts[slot] = n + pulse_amount
+    pulse_dirty.add(slot)
+    recorder = trace_recorder
+    if recorder is not None:
+        code = slot_trace_codes[slot]
+        for _ in range(pulse_amount): recorder.record(code, timestamp)
+    pulse_event.set()
+
+def record_edges(slot, timestamps):
+    """Adds edges that carry their own (e.g. kernel) timestamps, oldest first."""
+    ring = pulse_timestamps[slot]
+    n = global_pulse_counts[slot]
+    for ts in timestamps:
+        ring[n & PULSE_RING_MASK] = ts
+        n += 1
+    global_pulse_counts[slot] = n
+    pulse_dirty.add(slot)
+    recorder = trace_recorder
+    if recorder is not None:
+        code = slot_trace_codes[slot]
+        for ts in timestamps: recorder.record(code, ts)
+    pulse_event.set()
+
+def record_expander_edges(pin, count, timestamp):
+    """on_edges callback handed to expander drivers (see expander_pins.py)."""
+    slot = PIN_TO_SLOT.get(pin)
+    if slot is not None: record_pulses(slot, count, timestamp)
+
+def last_pulse_time(slot):
+    """Monotonic timestamp of the newest edge on a slot (0.0 if none yet)."""
+    n = global_pulse_counts[slot]
+    if n == 0: return 0.0
+    return pulse_timestamps[slot][(n - 1) & PULSE_RING_MASK]
+
+def recent_pulses(slot, count, pulses, since):
+    """How many of the `pulses` edges before count are stamped at or after since."""
+    start = max(count - pulses, count - PULSE_RING_SIZE)
+    ring = pulse_timestamps[slot]
+    while start < count and ring[start & PULSE_RING_MASK] < since: start += 1
+    return count - start
+
+def pulse_rate_hz(slot, start_count, end_count):
+    """
+    Pulses per second measured from the real inter-pulse intervals of the
+    edges numbered start_count .. end_count-1. Returns 0.0 when fewer than two
+    edges are available or they all share one timestamp (simulated bursts).
+    """
+    start_count = max(start_count, end_count - PULSE_RING_SIZE)
+    edges = end_count - start_count
+    if edges < 2: return 0.0
+    ring = pulse_timestamps[slot]
+    span = ring[(end_count - 1) & PULSE_RING_MASK] - ring[start_count & PULSE_RING_MASK]
+    if span <= 0: return 0.0
+    return (edges - 1) / span
 
 class SensorLogic:
     def __init__(self, num_sensors_from_config, ui_callbacks, settings_manager):
+        configure_flow_sensor_pins(settings_manager.get_flow_sensor_pins())
         # Enforce hardware limit
         self.num_sensors = min(num_sensors_from_config, len(FLOW_SENSOR_PINS))
         self.sensor_pins = FLOW_SENSOR_PINS[:self.num_sensors]
+        self.gpio_pins = [p for p in self.sensor_pins if not is_virtual_pin(p)]
+        self.expanders = {}
         self.ui_callbacks = ui_callbacks
+        self.ui_updates = TapUpdateBatcher(self.num_sensors, ui_callbacks)
         self.settings_manager = settings_manager
 
-        # State
+        # State (per-tap numbers live in flat arrays indexed by tap)
         self.keg_ids_assigned = [None] * self.num_sensors 
-        self.keg_dispensed_liters = [0.0] * self.num_sensors 
-        self.tap_is_active = [False] * self.num_sensors
-        self.active_sensor_index = -1 
+        self.keg_dispensed_liters = array('d', bytes(8 * self.num_sensors))
+        self.tap_is_active = [False] * self.num_sensors # Per-tap pour state (Idle/Pouring)
         
         # --- FIX: Sync with global hardware counts instead of resetting to 0 ---
         # This prevents phantom pours when the settings are saved/reloaded.
-        self.last_pulse_count = list(global_pulse_counts[:self.num_sensors])
+        self.last_pulse_count = global_pulse_counts[:self.num_sensors]
+
+        # Taps the next tick must look at even without new edges: pours in
+        # progress and idle taps holding pulses below the activity threshold.
+        # Everything else is only visited when pulse_dirty says it has edges.
+        self._live_taps = set()
+        self._visit_all = True  # First tick (and refreshes) cover every tap
         
-        self.last_known_remaining_liters = [0.0] * self.num_sensors
+        self.last_known_remaining_liters = array('d', bytes(8 * self.num_sensors))
         
         # Current/Last Pour State
-        self.current_pour_volume = [0.0] * self.num_sensors
+        self.current_pour_volume = array('d', bytes(8 * self.num_sensors))
         self.last_pour_volumes = self.settings_manager.get_last_pour_volumes()[:self.num_sensors]
         self.last_pour_averages = self.settings_manager.get_last_pour_averages()[:self.num_sensors]
         
@@ -86,6 +223,9 @@ class SensorLogic:
         self._auto_cal_locked_tap = -1
         self._auto_cal_session_pulses = 0
 
+        # Settings read by the loop; swapped only when the version changes
+        self._config = self.settings_manager.get_config_snapshot()
+
         self._load_initial_volumes()
 
     def _load_initial_volumes(self):
@@ -108,6 +248,8 @@ class SensorLogic:
 
     def start_monitoring(self):
         self._setup_gpios()
+        if self.settings_manager.get_record_pulse_traces() and trace_recorder is None:
+            self.start_pulse_trace()
         self._running = True
         if self.sensor_thread is None or not self.sensor_thread.is_alive():
             self.sensor_thread = threading.Thread(target=self._sensor_loop, daemon=True)
@@ -116,16 +258,48 @@ class SensorLogic:
     def stop_monitoring(self):
         """Stops the monitoring loop gracefully."""
         self._running = False
+        pulse_event.set()
         if self.sensor_thread:
             self.sensor_thread.join(timeout=1.0)
+        self.stop_pulse_trace()
+
+    # --- Pulse Trace Capture ---
+    def start_pulse_trace(self, path=None):
+        """
+        Starts writing every flow sensor edge to a trace file (default:
+        data_dir/pulse_traces/pulses-<timestamp>.klpt). Returns the path.
+        """
+        global trace_recorder
+        if trace_recorder is not None: return trace_recorder.path
+        if path is None: path = new_trace_path(self.settings_manager.get_data_dir())
+        trace_recorder = PulseTraceRecorder(path)
+        print(f"SensorLogic: Recording pulse trace to {path}")
+        return path
+
+    def stop_pulse_trace(self):
+        global trace_recorder
+        recorder, trace_recorder = trace_recorder, None
+        if recorder is not None: recorder.close()
 
     def _setup_gpios(self):
         try: GPIO_LIB.cleanup()
         except: pass
         GPIO_LIB.setmode(GPIO_LIB.BCM)
-        for pin in self.sensor_pins:
+        for pin in self.gpio_pins:
             GPIO_LIB.setup(pin, GPIO_LIB.IN, pull_up_down=GPIO_LIB.PUD_DOWN) 
             GPIO_LIB.add_event_detect(pin, GPIO_LIB.RISING, callback=count_pulse, bouncetime=FLOW_DEBOUNCE_MS)
+        self._setup_expanders()
+
+    def _setup_expanders(self):
+        """Starts the drivers behind any "<driver>:<channel>" pins."""
+        if self.expanders: return
+        self.expanders = start_expanders(self.sensor_pins, record_expander_edges)
+
+    def _stop_expanders(self):
+        for driver in self.expanders.values():
+            try: driver.stop()
+            except Exception as e: print(f"SensorLogic: Error stopping expander driver: {e}")
+        self.expanders = {}
 
     # --- NEW: Auto-Calibration Control Methods ---
     def start_auto_calibration_mode(self):
@@ -140,6 +314,7 @@ class SensorLogic:
         self._auto_cal_mode = False
         self._auto_cal_locked_tap = -1
         self._auto_cal_session_pulses = 0
+        self._visit_all = True
         print("SensorLogic: Auto-Calibration Mode STOPPED")
 
     def reset_auto_calibration_state(self):
@@ -155,26 +330,29 @@ class SensorLogic:
         global global_pulse_counts
         # Initialize timing
         if all(t == 0.0 for t in last_check_time):
-             now = time.time()
+             now = time.monotonic()
              for i in range(len(FLOW_SENSOR_PINS)): last_check_time[i] = now
 
         while self._running:
             if self.is_paused:
                 time.sleep(0.5); continue
                 
-            current_time = time.time()
-            displayed_taps = self.settings_manager.get_displayed_taps()
+            current_time = time.monotonic()
+            if self._config.version != self.settings_manager.config_version:
+                self._config = self.settings_manager.get_config_snapshot()
+                self._visit_all = True
             # Safety clamp for loop
-            displayed_taps = min(displayed_taps, self.num_sensors)
+            displayed_taps = min(self._config.displayed_taps, self.num_sensors)
             
-            k_factors = self.settings_manager.get_flow_calibration_factors()
+            k_factors = self._config.k_factors
             
             # --- NEW: AUTO-CALIBRATION LOGIC BRANCH ---
             if self._auto_cal_mode:
                 for i in range(displayed_taps):
                     # Calculate raw delta pulses since last loop
-                    delta_p = global_pulse_counts[i] - self.last_pulse_count[i]
-                    self.last_pulse_count[i] = global_pulse_counts[i]
+                    count = global_pulse_counts[i]
+                    delta_p = count - self.last_pulse_count[i]
+                    self.last_pulse_count[i] = count
                     last_check_time[i] = current_time
 
                     # State 1: NO TAP LOCKED - Listen for activity
@@ -194,83 +372,150 @@ class SensorLogic:
                             if self.ui_callbacks.get("auto_cal_pulse_cb"):
                                 self.ui_callbacks["auto_cal_pulse_cb"](i, self._auto_cal_session_pulses)
                 
-                # Sleep and continue (Skip normal pouring logic)
-                time.sleep(READING_INTERVAL_SECONDS)
+                # Wait and continue (Skip normal pouring logic)
+                self._wait_for_pulses(any(current_time - last_pulse_time(i) < FLOW_STOP_GAP_SECONDS
+                                          for i in range(displayed_taps)))
                 continue
             # ------------------------------------------
 
-            # 1. Detect Activity
-            if not self._is_calibrating and self.active_sensor_index == -1:
-                for i in range(displayed_taps):
-                    delta_p = global_pulse_counts[i] - self.last_pulse_count[i]
-                    if delta_p >= FLOW_PULSES_FOR_ACTIVITY:
-                        self.active_sensor_index = i
-                        break
-            
-            # 2. Process Taps
-            for i in range(displayed_taps):
+            busy = self._is_calibrating
+            visit = self._taps_to_visit(displayed_taps)
+            live = self._live_taps
+            live.clear()
+
+            # Every tap runs its own Idle -> Pouring -> Idle state machine, so
+            # simultaneous pours are all counted. Only taps with new edges or
+            # an open pour are visited, so idle taps cost nothing per tick.
+            for i in visit:
+                count = global_pulse_counts[i]
                 time_interval = current_time - last_check_time[i]
-                pulses = global_pulse_counts[i] - self.last_pulse_count[i]
-                is_active_target = (i == self.active_sensor_index)
+                pulses = count - self.last_pulse_count[i]
                 
                 # --- CALIBRATION MODE (OLD MANUAL - Keeping for legacy safety if needed) ---
                 if self._is_calibrating and self._cal_target_tap == i:
                     if pulses > 0 and time_interval > 0:
-                        lpm = (pulses / k_factors[i]) / (time_interval / 60.0)
+                        lpm = self._flow_rate_lpm(i, count, pulses, time_interval, k_factors[i])
                         liters = pulses / k_factors[i]
                         self._cal_current_session_liters += liters
                         if self.ui_callbacks.get("update_cal_data_cb"):
                             self.ui_callbacks.get("update_cal_data_cb")(lpm, self._cal_current_session_liters)
 
-                # --- NORMAL POURING MODE ---
-                elif is_active_target:
+                # --- POURING: accumulate until the flow goes quiet ---
+                elif self.tap_is_active[i]:
                     if pulses > 0 and time_interval > 0:
-                        self.tap_is_active[i] = True
-                        lpm = (pulses / k_factors[i]) / (time_interval / 60.0)
-                        liters = pulses / k_factors[i]
-                        
-                        self.keg_dispensed_liters[i] += liters
-                        self.current_pour_volume[i] += liters  # Track current pour
-                        
-                        # Persist to Memory/Disk
-                        keg_id = self.keg_ids_assigned[i]
-                        if keg_id:
-                            self.settings_manager.update_keg_dispensed_volume(keg_id, self.keg_dispensed_liters[i], pulses=pulses)
-                            
-                        # Update UI
-                        remaining = self.last_known_remaining_liters[i] - liters
-                        
-                        # CHANGED: Allow negative values (Removed max(0.0, ...))
-                        self.last_known_remaining_liters[i] = remaining
-                        
-                        self._update_ui(i, lpm, self.last_known_remaining_liters[i], "Pouring", self.current_pour_volume[i])
-                        
-                    elif self.tap_is_active[i] and pulses <= FLOW_PULSES_FOR_STOPPED:
-                        # Pour Stopped
-                        self.settings_manager.save_all_keg_dispensed_volumes()
-                        
-                        # Save Last Pour Stats
-                        self.last_pour_volumes[i] = self.current_pour_volume[i]
-                        self.settings_manager.save_last_pour_volumes(self.last_pour_volumes)
-                        self.current_pour_volume[i] = 0.0 # Reset for next
-                        
+                        self._record_pour_pulses(i, count, pulses, time_interval, k_factors[i])
+                    elif current_time - last_pulse_time(i) >= FLOW_STOP_GAP_SECONDS:
+                        # Pour Stopped (measured from the last real edge, not the tick)
+                        self._end_pour(i)
+
+                # --- IDLE: start a pour once enough pulses arrive within one reading ---
+                # Edges on an idle tap are held across ticks, so detection does not
+                # depend on the tick, but only for READING_INTERVAL_SECONDS: a pour
+                # still takes FLOW_PULSES_FOR_ACTIVITY edges within one 0.5 s window,
+                # and a slow drip or line vibration never adds up to one.
+                elif not self._is_calibrating and pulses > 0:
+                    pulses = recent_pulses(i, count, pulses, current_time - READING_INTERVAL_SECONDS)
+                    if pulses >= FLOW_PULSES_FOR_ACTIVITY and time_interval > 0:
+                        self._record_pour_pulses(i, count, pulses, time_interval, k_factors[i])
+                    else:
                         self._update_ui(i, 0.0, self.last_known_remaining_liters[i], "Idle", self.last_pour_volumes[i])
-                        self.tap_is_active[i] = False
-                        self.active_sensor_index = -1
+                        if pulses > 0:
+                            # Hold the window's edges for the next tick; older ones are dropped
+                            self.last_pulse_count[i] = count - pulses
+                            live.add(i)
+                            continue
 
                 # --- IDLE UPDATES ---
                 else:
                     self._update_ui(i, 0.0, self.last_known_remaining_liters[i], "Idle", self.last_pour_volumes[i])
 
-                self.last_pulse_count[i] = global_pulse_counts[i]
+                if self.tap_is_active[i]: live.add(i)
+                self.last_pulse_count[i] = count
                 last_check_time[i] = current_time
 
-            time.sleep(READING_INTERVAL_SECONDS)
+            self._wait_for_pulses(busy or bool(live))
+
+    def _taps_to_visit(self, displayed_taps):
+        """Live taps plus every tap with unseen edges, in tap order."""
+        if self._visit_all:
+            self._visit_all = False
+            pulse_dirty.clear()
+            return range(displayed_taps)
+        visit = set(self._live_taps)
+        while pulse_dirty:
+            try: slot = pulse_dirty.pop()
+            except KeyError: break
+            if slot < displayed_taps: visit.add(slot)
+        return sorted(visit)
+
+    def _wait_for_pulses(self, busy):
+        """
+        Paces the loop: fast ticks while any tap has flow, otherwise block
+        until a pulse callback (or stop/refresh request) sets pulse_event.
+        """
+        self.ui_updates.flush() # One batched UI callback per tick
+        recorder = trace_recorder
+        if recorder is not None: recorder.flush()
+        if busy:
+            time.sleep(FAST_TICK_SECONDS)
+        else:
+            pulse_event.wait()
+        # Cleared before the next tick reads the counters, so a pulse that
+        # lands after this point still wakes the following wait.
+        pulse_event.clear()
+
+    def _record_pour_pulses(self, i, count, pulses, time_interval, k_factor):
+        """Books one tick of flow on a tap, starting its pour if needed."""
+        lpm = self._flow_rate_lpm(i, count, pulses, time_interval, k_factor)
+        self.tap_is_active[i] = True
+        liters = pulses / k_factor
+        
+        self.keg_dispensed_liters[i] += liters
+        self.current_pour_volume[i] += liters  # Track current pour
+        
+        # Persist to Memory/Disk
+        keg_id = self.keg_ids_assigned[i]
+        if keg_id:
+            self.settings_manager.update_keg_dispensed_volume(keg_id, self.keg_dispensed_liters[i], pulses=pulses)
+            
+        # Update UI
+        remaining = self.last_known_remaining_liters[i] - liters
+        
+        # CHANGED: Allow negative values (Removed max(0.0, ...))
+        self.last_known_remaining_liters[i] = remaining
+        
+        self._update_ui(i, lpm, self.last_known_remaining_liters[i], "Pouring", self.current_pour_volume[i])
+
+    def _end_pour(self, i):
+        """Closes the pour on a tap and persists its totals."""
+        self.settings_manager.save_all_keg_dispensed_volumes()
+        
+        # Save Last Pour Stats
+        self.last_pour_volumes[i] = self.current_pour_volume[i]
+        self.settings_manager.save_last_pour_volumes(self.last_pour_volumes)
+        self.current_pour_volume[i] = 0.0 # Reset for next
+        
+        self._update_ui(i, 0.0, self.last_known_remaining_liters[i], "Idle", self.last_pour_volumes[i])
+        self.tap_is_active[i] = False
+
+    def _flow_rate_lpm(self, idx, count, pulses, time_interval, k_factor):
+        """
+        Flow rate from the edge timestamps. While a pour is running the last
+        edge of the previous tick is included so every interval is measured.
+        Falls back to the tick bucket when the edges carry no usable timing.
+        """
+        start = count - pulses
+        if self.tap_is_active[idx] and start > 0: start -= 1
+        hz = pulse_rate_hz(idx, start, count)
+        if hz > 0: return (hz * 60.0) / k_factor
+        return (pulses / k_factor) / (time_interval / 60.0)
 
     def _update_ui(self, idx, rate, rem, status, pour_vol):
-        # (Simplified UI Update wrapper)
-        if self.ui_callbacks.get("update_sensor_data_cb"):
-            self.ui_callbacks["update_sensor_data_cb"](idx, rate, rem, status, pour_vol)
+        # Staged; only taps whose displayed state changed are sent at tick end
+        self.ui_updates.stage(idx, rate, rem, status, pour_vol)
+
+    def get_ui_update_stats(self):
+        return self.ui_updates.stats()
 
     # --- Calibration Helpers ---
     def start_flow_calibration(self, tap_index, target_vol):
@@ -297,15 +542,19 @@ class SensorLogic:
 
     def cleanup_gpio(self):
         self._running = False
+        self.stop_pulse_trace()
+        self._stop_expanders()
         try: GPIO_LIB.cleanup()
         except: pass
         print("GPIO Cleaned up.")
 
     def force_recalculation(self):
         self._load_initial_volumes()
+        self.ui_updates.invalidate()
+        self._visit_all = True
+        pulse_event.set() # Wake an idle loop so the UI picks up the new volumes
 
     def simulate_pulse_increment(self, tap_index, pulse_amount):
         """Manually increments the global pulse counter for simulation."""
-        global global_pulse_counts
         if 0 <= tap_index < len(global_pulse_counts):
-            global_pulse_counts[tap_index] += pulse_amount
+            record_pulses(tap_index, pulse_amount)
@@ -0,0 +1,77 @@
+# keglevel app
+#
+# settings_events.py
+"""
+Change events raised by SettingsManager.
+
+Consumers subscribe to the kinds they care about instead of re-reading
+settings on a timer or being refreshed by hand after every edit:
+
+    settings_manager.subscribe(callback, kinds=(ASSIGNMENT_CHANGED,), run_on_ui=None)
+
+callback(event) gets a SettingsEvent once the change is in SettingsManager's
+memory (the file write may still be pending). Without run_on_ui it runs on
+the thread that made the change; with it, the call is handed to run_on_ui
+(e.g. a Clock.schedule_once wrapper) so Kivy subscribers can touch widgets.
+
+Pour ticks are not published: the sensor callbacks already carry volumes,
+and the hot loops follow config_version (see get_config_snapshot()).
+"""
+import threading
+from collections import namedtuple
+
+# Event kinds and their fields
+KEG_UPDATED = "keg_updated"                     # value: keg id, or None when the keg list was replaced
+BEVERAGES_CHANGED = "beverages_changed"         # the beverage library was replaced
+ASSIGNMENT_CHANGED = "assignment_changed"       # tap (None = every tap); value: ("keg" | "beverage" | "label", new value)
+K_FACTORS_CHANGED = "k_factors_changed"         # value: tuple of K-factors, one per tap
+UNITS_CHANGED = "units_changed"                 # value: "metric" or "imperial"
+NOTIFICATIONS_CHANGED = "notifications_changed" # value: "push", "conditional" or "status_request"
+
+ALL_KINDS = (KEG_UPDATED, BEVERAGES_CHANGED, ASSIGNMENT_CHANGED, K_FACTORS_CHANGED,
+             UNITS_CHANGED, NOTIFICATIONS_CHANGED)
+
+SettingsEvent = namedtuple('SettingsEvent', ['kind', 'tap', 'value'])
+
+
+class ChangeBus:
+    """Thread-safe list of subscribers, each with the event kinds it wants."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []      # (callback, kinds or None, run_on_ui)
+
+    def subscribe(self, callback, kinds=None, run_on_ui=None):
+        """Registers callback for kinds (all if None). Returns a function that unsubscribes it."""
+        entry = (callback, frozenset(kinds) if kinds is not None else None, run_on_ui)
+        with self._lock:
+            self._subscribers.append(entry)
+        return lambda: self._remove(entry)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] is not callback]
+
+    def _remove(self, entry):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not entry]
+
+    def publish(self, kind, tap=None, value=None):
+        event = SettingsEvent(kind, tap, value)
+        # Delivered outside the lock: a subscriber may save settings (and publish) itself
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, kinds, run_on_ui in subscribers:
+            if kinds is not None and kind not in kinds: continue
+            if run_on_ui:
+                run_on_ui(lambda cb=callback: self._call(cb, event))
+            else:
+                self._call(cb=callback, event=event)
+        return event
+
+    @staticmethod
+    def _call(cb, event):
+        try:
+            cb(event)
+        except Exception as e:
+            print(f"SettingsManager: Error in {event.kind} subscriber: {e}")
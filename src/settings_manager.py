@@ -4,10 +4,12 @@
 import json
 import os
 import time
+import threading
 import uuid
 import sys 
 import hmac
 import hashlib
+from collections import namedtuple
 from datetime import datetime, timedelta
 # Import pathlib for safe path expansion
 from pathlib import Path
@@ -17,6 +19,7 @@ BEVERAGES_FILE = "beverages_library.json"
 PROCESS_FLOW_FILE = "process_flow.json" 
 BJCP_2021_FILE = "bjcp_2021_library.json" 
 KEG_LIBRARY_FILE = "keg_library.json" 
+DISPENSE_JOURNAL_FILE = "dispense_journal.log"
 # OBSOLETE LOCAL TRIAL FILE
 TRIAL_RECORD_FILE = "trial_record.dat" 
 
@@ -26,9 +29,39 @@ UNASSIGNED_KEG_ID = "unassigned_keg_id"
 UNASSIGNED_BEVERAGE_ID = "unassigned_beverage_id"
 
 # --- Import Flow Constants for initial defaults ---
-from sensor_logic import FLOW_SENSOR_PINS, DEFAULT_K_FACTOR
+from sensor_logic import DEFAULT_FLOW_SENSOR_PINS, DEFAULT_K_FACTOR, MAX_FLOW_SENSORS
+from expander_pins import parse_pin
+from dispense_journal import DispenseJournal
+from settings_store import open_store
+from settings_events import (ChangeBus, KEG_UPDATED, BEVERAGES_CHANGED, ASSIGNMENT_CHANGED,
+                             K_FACTORS_CHANGED, UNITS_CHANGED, NOTIFICATIONS_CHANGED)
+
+# Fold the dispense journal into keg_library.json at a pour end once it holds
+# this many records or this much time has passed since the last compaction.
+JOURNAL_COMPACT_RECORDS = 2000
+JOURNAL_COMPACT_INTERVAL_S = 3600
+
+# Each data file carries the schema version it was written in. Files from
+# before the stamp count as version 0. A file behind the newest step of its
+# chain in SettingsManager._MIGRATIONS is brought forward once, step by step,
+# and saved; an up-to-date file is loaded as is.
+SCHEMA_VERSION_KEY = "schema_version"
+
+# Immutable view of the settings the sensor loops read on every tick.
+# A new snapshot (with a higher version) is published after each save that
+# changes one of them, the pin map, or the keg library.
+ConfigSnapshot = namedtuple('ConfigSnapshot', [
+    'version', 'displayed_taps', 'k_factors', 'keg_assignments', 'display_units'
+])
 
 class SettingsManager:
+
+    # Ordered migration steps per data file: (schema version it produces, method)
+    _MIGRATIONS = {
+        KEG_LIBRARY_FILE: ((1, '_migrate_keg_library_v1'),),
+        BEVERAGES_FILE: ((1, '_migrate_beverage_library_v1'),),
+        SETTINGS_FILE: ((1, '_migrate_settings_v1'),),
+    }
     
     def _get_default_sensor_labels(self):
         return [f"Tap {i+1}" for i in range(self.num_sensors)]
@@ -126,8 +159,22 @@ class SettingsManager:
             # --- Sensor Backend ---
             "sensor_backend": "gpio",
             "pico_w_host": "",
+            # --- Where a Pico last answered; probed first by the next scan ---
+            "pico_last_known_ip": "",
+            # --- Several Picos as one tap space: [{"host": ..., "taps": N}, ...] in tap order ---
+            "pico_nodes": [dict(n) for n in self.pico_nodes],
+            # --- GPIO edge source: "" = RPi.GPIO callbacks, else e.g. "/dev/gpiochip0" ---
+            "gpiochip_device": "",
+            # --- Flow sensor pin map: BCM pins and/or "<driver>:<channel>" expander pins ---
+            "flow_sensor_pins": list(self.flow_sensor_pins),
+            # --- Record raw flow sensor edges to data_dir/pulse_traces for replay ---
+            "record_pulse_traces": False,
             # --- Pico dispensed-liter baselines (saved on app close / pour end) ---
-            "pico_tap_last_dispensed": [0.0, 0.0, 0.0, 0.0, 0.0]
+            "pico_tap_last_dispensed": [0.0, 0.0, 0.0, 0.0, 0.0],
+            # --- Position in the Pico's pour log that the baselines above cover ---
+            "pico_pour_cursor": {"boot": "", "seq": 0},
+            # --- The same per host when several Picos are federated ---
+            "pico_node_pour_cursors": {}
         }
     
     # --- NEW METHODS for App Window Persistence ---
@@ -297,13 +344,14 @@ class SettingsManager:
         liquid_weight_kg = volume_liters * density
         return empty_weight_kg + liquid_weight_kg
     
-    def __init__(self, num_sensors_expected):
+    def __init__(self, num_sensors_expected, data_dir=None):
         base_dir = os.path.dirname(os.path.abspath(__file__))
         print(f"SettingsManager: Using script path: {base_dir}")
         self.base_dir = base_dir 
         
         # --- PATH CHANGE FOR LITE VERSION ---
-        self.data_dir = os.path.abspath(os.path.join(self.base_dir, "..", "..", "keglevel_lite-data"))
+        # (data_dir overrides it for tools that must not touch the real data)
+        self.data_dir = data_dir or os.path.abspath(os.path.join(self.base_dir, "..", "..", "keglevel_lite-data"))
         print(f"SettingsManager: Using data path: {self.data_dir}")
         
         if not os.path.exists(self.data_dir):
@@ -319,131 +367,250 @@ class SettingsManager:
         self.keg_library_file_path = os.path.join(self.data_dir, KEG_LIBRARY_FILE)
         self.trial_record_file_path = os.path.join(self.data_dir, TRIAL_RECORD_FILE)
         self.bjcp_2021_file_path = os.path.join(self.data_dir, BJCP_2021_FILE)
-
-        self.num_sensors = num_sensors_expected
+        self.dispense_journal = DispenseJournal(os.path.join(self.data_dir, DISPENSE_JOURNAL_FILE))
+        self._last_journal_compaction = time.monotonic()
+        # Held by a pour tick (keg change + its journal record) and by a compaction
+        # (journal_seq snapshot + serialization), so neither sees half of the other
+        self._dispense_lock = threading.RLock()
+
+        # JSON files, or keglevel.db once settings_store.import_json_files() has created it
+        self._store = open_store(self.data_dir)
+        print(f"SettingsManager: Using {self._store.engine} storage.")
+
+        # settings.json is parsed once: the pin map and node list are read
+        # from it ahead of the full load because they size num_sensors
+        raw_settings = self._read_raw_settings()
+
+        # A saved pin map (extra taps, expander pins) decides the tap count
+        saved_pins = self._read_flow_sensor_pins(raw_settings)
+        self.flow_sensor_pins = saved_pins or list(DEFAULT_FLOW_SENSOR_PINS[:num_sensors_expected])
+        self.num_sensors = len(saved_pins) if saved_pins else num_sensors_expected
+        # A federated Pico setup can span more taps than the pin map
+        self.pico_nodes = self._read_pico_nodes(raw_settings)
+        if self.pico_nodes:
+            self.num_sensors = max(self.num_sensors, sum(n['taps'] for n in self.pico_nodes))
+        
+        # Bumped by saves that change what the sensor loops read; see get_config_snapshot()
+        self.config_version = 0
+        self._config_snapshot = None
+        self._sensor_config_key = None
+        # Typed change events for the UI and background consumers; see settings_events.py
+        self.changes = ChangeBus()
         
         self.beverage_library = self._load_beverage_library()
         self.keg_library, self.keg_map = self._load_keg_library()
-        self.settings = self._load_settings()
+        self._replay_dispense_journal()
+        self.settings = self._load_settings(raw=raw_settings)
+        self._sensor_config_key = self._sensor_config()
 
     def get_base_dir(self):
         return self.base_dir
+
+    def subscribe(self, callback, kinds=None, run_on_ui=None):
+        """callback(SettingsEvent) after each change of the given kinds. Returns an unsubscribe function."""
+        return self.changes.subscribe(callback, kinds, run_on_ui)
+
+    def unsubscribe(self, callback):
+        self.changes.unsubscribe(callback)
+
+    @staticmethod
+    def _validate_flow_sensor_pins(pins):
+        """Returns the normalised pin map, or raises ValueError."""
+        if not isinstance(pins, list) or not pins: raise ValueError("pin map must be a non-empty list")
+        pins = [parse_pin(p) for p in pins]
+        if len(set(pins)) != len(pins): raise ValueError("pin map has duplicates")
+        if len(pins) > MAX_FLOW_SENSORS: raise ValueError(f"at most {MAX_FLOW_SENSORS} pins")
+        return pins
+
+    def _read_raw_settings(self):
+        """The settings document as stored, or None (missing or unreadable; _load_settings() reports which)."""
+        try:
+            raw = self._store.load(SETTINGS_FILE)
+        except Exception:
+            return None
+        return raw if isinstance(raw, dict) else None
+
+    def _read_flow_sensor_pins(self, raw):
+        """
+        Reads the pin map straight from the raw settings document, before the
+        rest of the settings are loaded, because it sets num_sensors. None = default.
+        """
+        try:
+            if raw is None: return None
+            pins = raw.get('system_settings', {}).get('flow_sensor_pins')
+            if pins is None: return None
+            return self._validate_flow_sensor_pins(pins)
+        except Exception as e:
+            print(f"SettingsManager: Ignoring saved flow sensor pin map: {e}")
+            return None
     
+    @staticmethod
+    def _validate_pico_nodes(nodes):
+        """Returns the normalised node list, or raises ValueError."""
+        if not isinstance(nodes, list): raise ValueError("node list must be a list")
+        clean = []
+        for node in nodes:
+            host = str(node.get('host', '')).strip() if isinstance(node, dict) else ''
+            if not host: raise ValueError(f"invalid Pico node {node!r}")
+            try: taps = int(node.get('taps', 0))
+            except (TypeError, ValueError): raise ValueError(f"invalid tap count for {host}")
+            if taps < 1: raise ValueError(f"invalid tap count for {host}")
+            clean.append({'host': host, 'taps': taps})
+        if len({n['host'] for n in clean}) != len(clean): raise ValueError("node list has duplicates")
+        if sum(n['taps'] for n in clean) > MAX_FLOW_SENSORS: raise ValueError(f"at most {MAX_FLOW_SENSORS} taps")
+        return clean
+
+    def _read_pico_nodes(self, raw):
+        """
+        Like _read_flow_sensor_pins(): the node list is read before the load
+        because, with the Pico W backend selected, it can raise num_sensors.
+        """
+        try:
+            if raw is None: return []
+            system = raw.get('system_settings', {})
+            nodes = self._validate_pico_nodes(system.get('pico_nodes') or [])
+            return nodes if system.get('sensor_backend') == 'pico_w' else []
+        except Exception as e:
+            print(f"SettingsManager: Ignoring saved Pico node list: {e}")
+            return []
+
     def get_data_dir(self):
         return self.data_dir
 
     def _load_keg_library(self):
         defaults = self._get_default_keg_definitions()
-        if os.path.exists(self.keg_library_file_path):
+        if self._store.exists(KEG_LIBRARY_FILE):
             try:
-                with open(self.keg_library_file_path, 'r') as f: 
-                    library = json.load(f) 
-                    if not isinstance(library.get('kegs'), list) or not library.get('kegs'): 
-                         print(f"Keg Library: Contents corrupted or empty. Using default.") 
-                         library = {"kegs": defaults}
-                    
-                    keg_list = library.get('kegs', [])
-                    
-                    migrated_list = []
-                    default_keg_profile = self._get_default_keg_definitions()[0]
-                    library_was_modified = False 
-                    
-                    # Load RAW settings to avoid circular dependency for migration check
-                    raw_settings = {}
-                    if os.path.exists(self.settings_file_path):
-                        try:
-                            with open(self.settings_file_path, 'r') as sf:
-                                raw_settings = json.load(sf)
-                        except Exception: pass
-                    
-                    current_keg_assignments = raw_settings.get('sensor_keg_assignments', [])
-                    current_bev_assignments = raw_settings.get('sensor_beverage_assignments', [])
-                    
-                    while len(current_keg_assignments) < self.num_sensors: current_keg_assignments.append(UNASSIGNED_KEG_ID)
-                    while len(current_bev_assignments) < self.num_sensors: current_bev_assignments.append(UNASSIGNED_BEVERAGE_ID)
-
-                    active_map = {}
-                    for i, k_id in enumerate(current_keg_assignments):
-                        if k_id != UNASSIGNED_KEG_ID and i < len(current_bev_assignments):
-                            active_map[k_id] = current_bev_assignments[i]
-
-                    for k in keg_list:
-                        if 'empty_weight_kg' in k:
-                            k['tare_weight_kg'] = k.pop('empty_weight_kg')
-                            library_was_modified = True
-                        if 'starting_volume_liters' in k:
-                            k['calculated_starting_volume_liters'] = k.pop('starting_volume_liters')
-                            library_was_modified = True
-                        if 'maximum_full_volume_liters' not in k:
-                             k['maximum_full_volume_liters'] = default_keg_profile['maximum_full_volume_liters']
-                             library_was_modified = True
-                        if 'tare_weight_kg' not in k: k['tare_weight_kg'] = default_keg_profile['tare_weight_kg']; library_was_modified = True
-                        if 'starting_total_weight_kg' not in k: k['starting_total_weight_kg'] = default_keg_profile['starting_total_weight_kg']; library_was_modified = True
-                        if 'calculated_starting_volume_liters' not in k: k['calculated_starting_volume_liters'] = default_keg_profile['calculated_starting_volume_liters']; library_was_modified = True
-                        if 'current_dispensed_liters' not in k: k['current_dispensed_liters'] = default_keg_profile['current_dispensed_liters']; library_was_modified = True
-                        
-                        existing_liters = k.get('current_dispensed_liters', 0.0)
-                        current_pulses = k.get('total_dispensed_pulses', 0)
-                        if 'total_dispensed_pulses' not in k:
-                            k['total_dispensed_pulses'] = int(existing_liters * DEFAULT_K_FACTOR)
-                            library_was_modified = True
-                        elif current_pulses == 0 and existing_liters > 0.01:
-                            k['total_dispensed_pulses'] = int(existing_liters * DEFAULT_K_FACTOR)
-                            library_was_modified = True
-                            
-                        if 'beverage_id' not in k:
-                            k_id = k.get('id')
-                            if k_id in active_map:
-                                k['beverage_id'] = active_map[k_id]
-                                k['fill_date'] = datetime.now().strftime("%Y-%m-%d")
-                            else:
-                                k['beverage_id'] = UNASSIGNED_BEVERAGE_ID
-                                k['fill_date'] = ""
-                            library_was_modified = True
-                            
-                        if 'fill_date' not in k:
-                            k['fill_date'] = ""
-                            library_was_modified = True
-
-                        migrated_list.append(k)
-
-                    library['kegs'] = migrated_list
-                    
-                    if library_was_modified:
-                        print("SettingsManager: Keg library migration detected. Updating file on disk.")
-                        self._save_keg_library(library)
+                library = self._store.load(KEG_LIBRARY_FILE)
+                if not isinstance(library.get('kegs'), list) or not library.get('kegs'): 
+                     print(f"Keg Library: Contents corrupted or empty. Using default.") 
+                     library = {"kegs": defaults}
 
-                    keg_map = {k['id']: k for k in migrated_list if 'id' in k}
-                    return library, keg_map
+                if self._migrate(KEG_LIBRARY_FILE, library):
+                    print("SettingsManager: Keg library migration detected. Updating file on disk.")
+                    self._save_keg_library(library)
+
+                return library, self._index_kegs(library['kegs'])
             except Exception as e:
                 print(f"Keg Library: Error loading or decoding JSON: {e}. Using default.") 
-                return {"kegs": defaults}, {k['id']: k for k in defaults}
+                return {"kegs": defaults}, self._index_kegs(defaults)
         else:
             print(f"{KEG_LIBRARY_FILE} not found. Creating with defaults.") 
             library = {"kegs": defaults}
             self._save_keg_library(library) 
-            return library, {k['id']: k for k in defaults}
+            return library, self._index_kegs(defaults)
+
+    def _migrate_keg_library_v1(self, library):
+        """Legacy field names, and the volume, pulse, beverage and fill date fields of older kegs."""
+        default_keg_profile = self._get_default_keg_definitions()[0]
+        active_map = None
+        for k in library['kegs']:
+            if 'empty_weight_kg' in k:
+                k['tare_weight_kg'] = k.pop('empty_weight_kg')
+            if 'starting_volume_liters' in k:
+                k['calculated_starting_volume_liters'] = k.pop('starting_volume_liters')
+            for field in ('maximum_full_volume_liters', 'tare_weight_kg', 'starting_total_weight_kg',
+                          'calculated_starting_volume_liters', 'current_dispensed_liters'):
+                if field not in k: k[field] = default_keg_profile[field]
+
+            existing_liters = k.get('current_dispensed_liters', 0.0)
+            if 'total_dispensed_pulses' not in k or (k['total_dispensed_pulses'] == 0 and existing_liters > 0.01):
+                k['total_dispensed_pulses'] = int(existing_liters * DEFAULT_K_FACTOR)
+
+            if 'beverage_id' not in k:
+                # Kegs from before beverages moved onto the keg take the beverage of their tap
+                if active_map is None: active_map = self._legacy_tap_beverages()
+                k_id = k.get('id')
+                if k_id in active_map:
+                    k['beverage_id'] = active_map[k_id]
+                    k['fill_date'] = datetime.now().strftime("%Y-%m-%d")
+                else:
+                    k['beverage_id'] = UNASSIGNED_BEVERAGE_ID
+                    k['fill_date'] = ""
+
+            if 'fill_date' not in k:
+                k['fill_date'] = ""
+
+    def _legacy_tap_beverages(self):
+        """keg id → beverage id of the tap it is on, read from the raw settings file."""
+        raw_settings = {}
+        try:
+            raw_settings = self._store.load(SETTINGS_FILE) or {}
+        except Exception: pass
 
-    def _save_keg_library(self, library):
+        current_keg_assignments = raw_settings.get('sensor_keg_assignments', [])
+        current_bev_assignments = raw_settings.get('sensor_beverage_assignments', [])
+
+        active_map = {}
+        for i, k_id in enumerate(current_keg_assignments):
+            if k_id != UNASSIGNED_KEG_ID and i < len(current_bev_assignments):
+                active_map[k_id] = current_bev_assignments[i]
+        return active_map
+
+    @staticmethod
+    def _index_kegs(kegs):
+        """
+        keg id → keg record, holding the very dicts of the keg list: an update
+        through keg_map is already in keg_library['kegs'] (and the next save).
+        Rebuild it whenever keg_library['kegs'] is replaced.
+        """
+        keg_map = {}
+        for k in kegs:
+            if 'id' in k: keg_map.setdefault(k['id'], k)
+        return keg_map
+
+    def _save_keg_library(self, library, on_written=None):
         try:
-            with open(self.keg_library_file_path, 'w', encoding='utf-8') as f: 
-                json.dump(library, f, indent=4) 
-            print(f"Keg Library saved to {self.keg_library_file_path}.") 
+            self._stamp_schema(KEG_LIBRARY_FILE, library)
+            self._store.save(KEG_LIBRARY_FILE, library, on_written=on_written)
+            print(f"Keg Library saved to {self._store.where(KEG_LIBRARY_FILE)}.") 
         except Exception as e:
             print(f"Error saving keg library: {e}")
 
+    def _replay_dispense_journal(self):
+        """Applies journaled pours that never made it into keg_library.json."""
+        applied_seq = self.keg_library.get('journal_seq', 0)
+        records = self.dispense_journal.replay()
+        self.dispense_journal.last_seq = max(self.dispense_journal.last_seq, applied_seq)
+        if not records: return
+        
+        replayed = 0
+        for seq, _ts, keg_id, delta_liters, pulses in records:
+            if seq <= applied_seq: continue
+            keg = self.keg_map.get(keg_id)
+            if keg:
+                keg['current_dispensed_liters'] = keg.get('current_dispensed_liters', 0.0) + delta_liters
+                keg['total_dispensed_pulses'] = keg.get('total_dispensed_pulses', 0) + pulses
+                replayed += 1
+        print(f"SettingsManager: Replayed {replayed} dispense journal record(s).")
+        self._compact_dispense_journal()
+
+    def _compact_dispense_journal(self):
+        """Writes the in-memory keg library (which already includes every
+        journaled pour) and drops the journal records it now covers."""
+        with self._dispense_lock:
+            seq = self.dispense_journal.last_seq
+            self.keg_library['journal_seq'] = seq
+            # The records can go only once the library holding them is on disk
+            self._save_keg_library(self.keg_library, on_written=lambda: self.dispense_journal.reset(seq))
+            self._last_journal_compaction = time.monotonic()
+
     def get_keg_definitions(self):
-        self.keg_library, self.keg_map = self._load_keg_library()
-        return self.keg_library.get('kegs', [])
+        # The in-memory library is current (journaled pours included), so no
+        # disk round trip; copies, because callers edit them before saving
+        return [dict(keg) for keg in self.keg_library.get('kegs', [])]
     
     def save_keg_definitions(self, definitions_list):
         if not definitions_list:
             definitions_list = self._get_default_keg_definitions()
         
-        self.keg_library['kegs'] = definitions_list
-        self.keg_map = {k['id']: k for k in definitions_list}
-        self._save_keg_library(self.keg_library)
+        with self._dispense_lock:
+            self.keg_library['kegs'] = definitions_list
+            self.keg_map = self._index_kegs(definitions_list)
+            self.config_version += 1 # Assignments are validated against keg_map
+            self._compact_dispense_journal()
         print("Keg definitions saved.") 
+        self.changes.publish(KEG_UPDATED)
         
     def delete_keg_definition(self, keg_id_to_delete):
         keg_list = self.get_keg_definitions()
@@ -470,22 +637,27 @@ class SettingsManager:
         
         return True, "Keg deleted and assignments updated."
         
-    def update_keg_dispensed_volume(self, keg_id, dispensed_liters, pulses=0):
-        if keg_id in self.keg_map:
-            self.keg_map[keg_id]['current_dispensed_liters'] = dispensed_liters
-            current_pulses = self.keg_map[keg_id].get('total_dispensed_pulses', 0)
-            self.keg_map[keg_id]['total_dispensed_pulses'] = current_pulses + pulses
-
-            for keg in self.keg_library['kegs']:
-                if keg.get('id') == keg_id:
-                    keg['current_dispensed_liters'] = dispensed_liters
-                    keg['total_dispensed_pulses'] = self.keg_map[keg_id]['total_dispensed_pulses']
-                    break
+    def update_keg_dispensed_volume(self, keg_id, dispensed_liters, pulses=0, timestamp=None):
+        # keg_map shares its records with keg_library['kegs'], so this is the only copy to update
+        with self._dispense_lock:
+            keg = self.keg_map.get(keg_id)
+            if keg is None: return False
+            delta_liters = dispensed_liters - keg.get('current_dispensed_liters', 0.0)
+            keg['current_dispensed_liters'] = dispensed_liters
+            keg['total_dispensed_pulses'] = keg.get('total_dispensed_pulses', 0) + pulses
+
+            # The database engine writes the keg's row; the JSON files rely on the journal
+            if (delta_liters or pulses) and not self._store.update_keg_volume(keg):
+                self.dispense_journal.append(keg_id, delta_liters, pulses, timestamp)
             return True
-        return False
 
     def save_all_keg_dispensed_volumes(self):
-        self._save_keg_library(self.keg_library)
+        """Called at pour end: makes the journal durable and compacts it
+        into keg_library.json only when it has grown or aged enough."""
+        self.dispense_journal.sync()
+        if (self.dispense_journal.record_count >= JOURNAL_COMPACT_RECORDS or
+                time.monotonic() - self._last_journal_compaction >= JOURNAL_COMPACT_INTERVAL_S):
+            self._compact_dispense_journal()
         
     def get_keg_by_id(self, keg_id):
         if keg_id == UNASSIGNED_KEG_ID:
@@ -493,29 +665,18 @@ class SettingsManager:
         return self.keg_map.get(keg_id)
         
     def _load_beverage_library(self):
-        if os.path.exists(self.beverages_file_path):
+        if self._store.exists(BEVERAGES_FILE):
             try:
-                with open(self.beverages_file_path, 'r') as f: 
-                    library = json.load(f) 
-                    if not isinstance(library.get('beverages'), list):
-                         print(f"Beverage Library: Error loading library. Contents corrupted. Using default.") 
-                         library = {"beverages": self._get_default_beverage_library().get('beverages', [])}
+                library = self._store.load(BEVERAGES_FILE)
+                if not isinstance(library.get('beverages'), list):
+                     print(f"Beverage Library: Error loading library. Contents corrupted. Using default.") 
+                     library = {"beverages": self._get_default_beverage_library().get('beverages', [])}
                     
-                    beverages = library.get('beverages', [])
-                    modified = False
-                    for b in beverages:
-                        if 'srm' not in b:
-                            b['srm'] = None
-                            modified = True
-                        elif isinstance(b['srm'], float):
-                            b['srm'] = int(b['srm'])
-                            modified = True
-                    
-                    if modified:
-                        print("SettingsManager: Migrated beverage library to ensure SRM is present and integer.")
-                        self._save_beverage_library(library)
+                if self._migrate(BEVERAGES_FILE, library):
+                    print("SettingsManager: Migrated beverage library to ensure SRM is present and integer.")
+                    self._save_beverage_library(library)
 
-                    return library
+                return library
             except Exception as e:
                 print(f"Beverage Library: Error loading or decoding JSON: {e}. Using default.") 
                 return {"beverages": self._get_default_beverage_library().get('beverages', [])}
@@ -525,11 +686,19 @@ class SettingsManager:
             self._save_beverage_library(default_library) 
             return default_library
             
+    def _migrate_beverage_library_v1(self, library):
+        """SRM present on every beverage, and an integer."""
+        for b in library['beverages']:
+            if 'srm' not in b:
+                b['srm'] = None
+            elif isinstance(b['srm'], float):
+                b['srm'] = int(b['srm'])
+
     def _save_beverage_library(self, library):
         try:
-            with open(self.beverages_file_path, 'w', encoding='utf-8') as f: 
-                json.dump(library, f, indent=4) 
-            print(f"Beverage Library saved to {self.beverages_file_path}.") 
+            self._stamp_schema(BEVERAGES_FILE, library)
+            self._store.save(BEVERAGES_FILE, library)
+            print(f"Beverage Library saved to {self._store.where(BEVERAGES_FILE)}.") 
         except Exception as e:
             print(f"Error saving beverage library: {e}")
 
@@ -539,6 +708,7 @@ class SettingsManager:
     def save_beverage_library(self, new_library_list):
         self.beverage_library['beverages'] = new_library_list
         self._save_beverage_library(self.beverage_library)
+        self.changes.publish(BEVERAGES_CHANGED)
 
     def load_bjcp_styles(self):
         """Loads the strict BJCP styles from the central JSON file."""
@@ -553,7 +723,8 @@ class SettingsManager:
 
     # --- Load/Reset Settings ---
 
-    def _load_settings(self, force_defaults=False):
+    def _load_settings(self, force_defaults=False, raw=None):
+        """raw: the settings document if the caller has already read it."""
         settings = {}
 
         default_sensor_labels = self._get_default_sensor_labels()
@@ -564,20 +735,21 @@ class SettingsManager:
         default_status_request_settings_val = self._get_default_status_request_settings()
         default_conditional_notification_settings_val = self._get_default_conditional_notification_settings() 
 
-        if not force_defaults and os.path.exists(self.settings_file_path):
+        settings_exist = self._store.exists(SETTINGS_FILE)
+        if not force_defaults and settings_exist:
             try:
-                with open(self.settings_file_path, 'r') as f: 
-                    settings = json.load(f) 
-                print(f"Settings loaded from {self.settings_file_path}") 
+                settings = raw if raw is not None else (self._store.load(SETTINGS_FILE) or {})
+                print(f"Settings loaded from {self._store.where(SETTINGS_FILE)}") 
             except Exception as e:
-                print(f"Error loading or decoding JSON from {self.settings_file_path}: {e}. Using all defaults.") 
+                print(f"Error loading or decoding JSON from {self._store.where(SETTINGS_FILE)}: {e}. Using all defaults.") 
                 settings = {}
         else:
             if force_defaults: print("Forcing reset to default settings.")
-            else: print(f"{self.settings_file_path} not found. Creating with defaults.")
+            else: print(f"{self._store.where(SETTINGS_FILE)} not found. Creating with defaults.")
             settings = {}
 
-        is_new_file_or_major_corruption = not os.path.exists(self.settings_file_path) or not settings
+        is_new_file_or_major_corruption = not settings_exist or not settings
+        migrated = not is_new_file_or_major_corruption and self._migrate(SETTINGS_FILE, settings)
         
         if 'sensor_labels' not in settings or not isinstance(settings.get('sensor_labels',[]), list) or len(settings.get('sensor_labels',[])) != self.num_sensors: 
             settings['sensor_labels'] = default_sensor_labels 
@@ -594,9 +766,6 @@ class SettingsManager:
                     assignments[i] = default_sensor_beverage_assignments[i] 
             settings['sensor_beverage_assignments'] = assignments 
             
-        if 'keg_definitions' in settings:
-             del settings['keg_definitions']
-        
         default_keg_assignment_id = UNASSIGNED_KEG_ID
         
         if 'sensor_keg_assignments' not in settings or not isinstance(settings.get('sensor_keg_assignments', []), list) or len(settings.get('sensor_keg_assignments', [])) != self.num_sensors: 
@@ -622,22 +791,8 @@ class SettingsManager:
             sys_set = default_system_settings_val.copy() 
             sys_set.update(settings['system_settings']) 
             
-            if 'velocity_mode' in sys_set: del sys_set['velocity_mode']
-            if 'user_temp_input_c' in sys_set: del sys_set['user_temp_input_c']
-            
             settings['system_settings'] = sys_set 
             
-            # --- MIGRATION: UI MODE (Full/Lite -> Detailed/Basic) ---
-            current_mode = settings['system_settings'].get('ui_mode')
-            if current_mode == 'full':
-                settings['system_settings']['ui_mode'] = 'detailed'
-                print("Settings: Migrated UI Mode 'full' -> 'detailed'")
-            elif current_mode == 'lite':
-                settings['system_settings']['ui_mode'] = 'basic'
-                print("Settings: Migrated UI Mode 'lite' -> 'basic'")
-            elif current_mode not in ["detailed", "basic"]:
-                 settings['system_settings']['ui_mode'] = default_system_settings_val['ui_mode']
-            
             # --- MIGRATION: DETECT LEGACY INSTALL ---
             if needs_migration_check:
                 # Heuristic: If we have valid keg assignments (not default unassigned)
@@ -679,6 +834,11 @@ class SettingsManager:
                  except (ValueError, TypeError):
                       settings['system_settings']['flow_calibration_factors'] = default_system_settings_val['flow_calibration_factors']
 
+            # Validated (and used to size num_sensors) before the load
+            settings['system_settings']['flow_sensor_pins'] = list(self.flow_sensor_pins)
+            try: settings['system_settings']['pico_nodes'] = self._validate_pico_nodes(settings['system_settings'].get('pico_nodes') or [])
+            except ValueError: settings['system_settings']['pico_nodes'] = []
+
             if 'metric_pour_ml' not in settings['system_settings']:
                 settings['system_settings']['metric_pour_ml'] = default_system_settings_val['metric_pour_ml']
             else:
@@ -719,12 +879,7 @@ class SettingsManager:
             if 'setup_complete' not in settings['system_settings']:
                 settings['system_settings']['setup_complete'] = default_system_settings_val['setup_complete']
 
-        loaded_notif_settings = {}
-        if 'notification_settings' in settings: 
-            print("Settings: Migrating old 'notification_settings' to 'push_notification_settings'.") 
-            loaded_notif_settings = settings.pop('notification_settings') 
-        elif 'push_notification_settings' in settings:
-            loaded_notif_settings = settings.pop('push_notification_settings') 
+        loaded_notif_settings = settings.pop('push_notification_settings', {}) 
         
         notif_set = default_push_notification_settings_val.copy() 
         notif_set.update(loaded_notif_settings) 
@@ -790,9 +945,55 @@ class SettingsManager:
             settings['conditional_notification_settings']['low_temp_f'] = default_conditional_notification_settings_val['low_temp_f'] 
             settings['conditional_notification_settings']['high_temp_f'] = default_conditional_notification_settings_val['high_temp_f'] 
 
-        if force_defaults or is_new_file_or_major_corruption:
+        if force_defaults or is_new_file_or_major_corruption or migrated:
              self._save_all_settings(current_settings=settings)
         return settings
+
+    def _migrate_settings_v1(self, settings):
+        """Renamed and retired keys of earlier releases."""
+        settings.pop('keg_definitions', None)       # Kegs live in keg_library.json
+        if 'notification_settings' in settings:
+            print("Settings: Migrating old 'notification_settings' to 'push_notification_settings'.") 
+            settings['push_notification_settings'] = settings.pop('notification_settings')
+        system = settings.get('system_settings')
+        if isinstance(system, dict):
+            system.pop('velocity_mode', None)
+            system.pop('user_temp_input_c', None)
+            # UI modes were renamed Full/Lite -> Detailed/Basic
+            if system.get('ui_mode') == 'full':
+                system['ui_mode'] = 'detailed'
+                print("Settings: Migrated UI Mode 'full' -> 'detailed'")
+            elif system.get('ui_mode') == 'lite':
+                system['ui_mode'] = 'basic'
+                print("Settings: Migrated UI Mode 'lite' -> 'basic'")
+
+    def _migrate(self, name, doc):
+        """
+        Runs, in order, the migration steps of a data file above the schema
+        version doc carries, stamping each step's version. Returns True if
+        any ran (the caller saves the file).
+        """
+        steps = self._MIGRATIONS[name]
+        try: version = int(doc.get(SCHEMA_VERSION_KEY, 0))
+        except (TypeError, ValueError): version = 0
+        latest = steps[-1][0]
+        if version > latest:
+            print(f"SettingsManager: {name} is schema version {version}, newer than this app knows ({latest}). Loading it as is.")
+            return False
+        if version == latest: return False
+        for step_version, method in steps:
+            if step_version > version:
+                getattr(self, method)(doc)
+                doc[SCHEMA_VERSION_KEY] = step_version
+        print(f"SettingsManager: Migrated {name} from schema version {version} to {latest}.")
+        return True
+
+    def _stamp_schema(self, name, doc):
+        """Everything this app writes is in its current schema (a newer stamp is kept)."""
+        latest = self._MIGRATIONS[name][-1][0]
+        try: current = int(doc.get(SCHEMA_VERSION_KEY, 0))
+        except (TypeError, ValueError): current = 0
+        doc[SCHEMA_VERSION_KEY] = max(current, latest)
         
     def reset_all_settings_to_defaults(self):
         print("SettingsManager: Resetting all settings to their default values.") 
@@ -801,8 +1002,8 @@ class SettingsManager:
         self._save_beverage_library(self.beverage_library) 
         
         self.keg_library = {"kegs": self._get_default_keg_definitions()}
-        self.keg_map = {k['id']: k for k in self.keg_library['kegs']}
-        self._save_keg_library(self.keg_library)
+        self.keg_map = self._index_kegs(self.keg_library['kegs'])
+        self._compact_dispense_journal()
         
         self.settings = {
             'sensor_labels': self._get_default_sensor_labels(), 
@@ -815,6 +1016,13 @@ class SettingsManager:
         }
         self._save_all_settings() 
         print("SettingsManager: All settings have been reset to defaults and saved.")
+        self.changes.publish(KEG_UPDATED)
+        self.changes.publish(BEVERAGES_CHANGED)
+        self.changes.publish(ASSIGNMENT_CHANGED)
+        self.changes.publish(K_FACTORS_CHANGED, value=tuple(self.get_flow_calibration_factors()))
+        self.changes.publish(UNITS_CHANGED, value=self.get_display_units())
+        for part in ("push", "conditional", "status_request"):
+            self.changes.publish(NOTIFICATIONS_CHANGED, value=part)
         
     # --- NEW HELPER: Load workflow data from disk directly ---
     def _get_workflow_data_from_disk(self):
@@ -865,6 +1073,7 @@ class SettingsManager:
             self.settings.setdefault('system_settings', self._get_default_system_settings())['flow_calibration_factors'] = factors_list
             self._save_all_settings()
             print(f"SettingsManager: Flow calibration factors saved.")
+            self.changes.publish(K_FACTORS_CHANGED, value=tuple(factors_list))
 
     def get_flow_calibration_settings(self):
         defaults = self._get_default_system_settings()
@@ -928,6 +1137,7 @@ class SettingsManager:
         self.settings['sensor_beverage_assignments'][sensor_index] = beverage_id 
         self._save_all_settings() 
         print(f"Beverage assignment for Tap {sensor_index+1} saved: {beverage_id}.") 
+        self.changes.publish(ASSIGNMENT_CHANGED, tap=sensor_index, value=("beverage", beverage_id))
     
     def get_sensor_labels(self):
         assignments = self.get_sensor_beverage_assignments() 
@@ -949,6 +1159,7 @@ class SettingsManager:
         if len(sensor_labels_list) == self.num_sensors: 
             self.settings['sensor_labels'] = sensor_labels_list 
             self._save_all_settings() 
+            self.changes.publish(ASSIGNMENT_CHANGED, value=("label", tuple(sensor_labels_list)))
 
     def get_conditional_notification_settings(self):
         defaults = self._get_default_conditional_notification_settings() 
@@ -985,6 +1196,7 @@ class SettingsManager:
         self.settings['conditional_notification_settings'] = new_settings 
         self._save_all_settings() 
         print("SettingsManager: Conditional notification settings saved.") 
+        self.changes.publish(NOTIFICATIONS_CHANGED, value="conditional")
     
     def update_conditional_sent_status(self, tap_index, status):
         cond_notif_settings = self.settings.get('conditional_notification_settings', {}).copy() 
@@ -1047,11 +1259,14 @@ class SettingsManager:
         self.settings['sensor_keg_assignments'][sensor_index] = keg_id
         self._save_all_settings(); 
         print(f"Keg assignment for Tap {sensor_index+1} saved to Keg ID: {keg_id}.") 
+        self.changes.publish(ASSIGNMENT_CHANGED, tap=sensor_index, value=("keg", keg_id))
 
     def get_display_units(self): return self.settings.get('system_settings', {}).get('display_units', self._get_default_system_settings()['display_units']) 
     def save_display_units(self, unit_system):
+        previous = self.get_display_units()
         if unit_system in ["imperial", "metric"]: self.settings.setdefault('system_settings', self._get_default_system_settings())['display_units'] = unit_system; 
         self._save_all_settings() 
+        if self.get_display_units() != previous: self.changes.publish(UNITS_CHANGED, value=self.get_display_units())
     def get_displayed_taps(self):
         system_settings = self.settings.get('system_settings', {}) 
         default_taps = self._get_default_system_settings()['displayed_taps'] 
@@ -1076,6 +1291,51 @@ class SettingsManager:
         self._save_all_settings()
         print(f"SettingsManager: Sensor backend saved: {backend}, host: '{pico_host.strip()or 'keglevel-pico.local'}'.")
 
+    def get_pico_last_known_ip(self):
+        return self.settings.get('system_settings', {}).get('pico_last_known_ip', '')
+
+    def save_pico_last_known_ip(self, ip):
+        sys_settings = self.settings.setdefault('system_settings', self._get_default_system_settings())
+        if sys_settings.get('pico_last_known_ip') == ip: return
+        sys_settings['pico_last_known_ip'] = ip
+        self._save_all_settings()
+
+    def get_pico_nodes(self):
+        """[{"host", "taps"}, ...] of a multi-Pico setup, or [] for a single Pico."""
+        return [dict(n) for n in self.pico_nodes]
+
+    def save_pico_nodes(self, nodes):
+        """Saves the Pico node list. The tap count follows it after a restart."""
+        try: nodes = self._validate_pico_nodes(list(nodes))
+        except ValueError as e:
+            print(f"SettingsManager: Pico node list not saved: {e}")
+            return False
+        self.settings.setdefault('system_settings', self._get_default_system_settings())['pico_nodes'] = nodes
+        self._save_all_settings()
+        print(f"SettingsManager: Pico node list saved: {[n['host'] for n in nodes]} (applies on restart).")
+        return True
+
+    def get_gpiochip_device(self):
+        """Return the gpiochip device for batched edge events, or '' to use RPi.GPIO callbacks."""
+        return self.settings.get('system_settings', {}).get('gpiochip_device', '').strip()
+
+    def get_flow_sensor_pins(self):
+        return list(self.flow_sensor_pins)
+
+    def save_flow_sensor_pins(self, pins):
+        """Saves a new pin map. The tap count follows it after a restart."""
+        try: pins = self._validate_flow_sensor_pins(list(pins))
+        except ValueError as e:
+            print(f"SettingsManager: Flow sensor pin map not saved: {e}")
+            return False
+        self.settings.setdefault('system_settings', self._get_default_system_settings())['flow_sensor_pins'] = pins
+        self._save_all_settings()
+        print(f"SettingsManager: Flow sensor pin map saved: {pins} (applies on restart).")
+        return True
+
+    def get_record_pulse_traces(self):
+        return self.settings.get('system_settings', {}).get('record_pulse_traces', False)
+
     def get_pico_tap_last_dispensed(self):
         """Return the saved Pico dispensed-liter values from the last session."""
         vals = self.settings.get('system_settings', {}).get(
@@ -1085,14 +1345,51 @@ class SettingsManager:
             vals.append(0.0)
         return vals[:self.num_sensors]
 
-    def save_pico_tap_last_dispensed(self, dispensed_list):
+    def save_pico_tap_last_dispensed(self, dispensed_list, pour_cursor=None, node_pour_cursors=None):
         """Persist the Pico's current dispensed-liter counters so offline pours
-        can be captured on next app startup."""
+        can be captured on next app startup. pour_cursor is the pour log
+        position the counters were read at; node_pour_cursors the same per
+        host for federated Picos."""
         sys_settings = self.settings.get('system_settings', {})
         sys_settings['pico_tap_last_dispensed'] = list(dispensed_list)
+        if pour_cursor is not None:
+            sys_settings['pico_pour_cursor'] = dict(pour_cursor)
+        if node_pour_cursors:
+            cursors = sys_settings.get('pico_node_pour_cursors')
+            if not isinstance(cursors, dict): cursors = {}
+            cursors.update({host: dict(c) for host, c in node_pour_cursors.items()})
+            sys_settings['pico_node_pour_cursors'] = cursors
         self.settings['system_settings'] = sys_settings
         self._save_all_settings()
 
+    def get_pico_pour_cursor(self):
+        """{"boot": pour log id, "seq": last pour id already booked}."""
+        cursor = self.settings.get('system_settings', {}).get('pico_pour_cursor')
+        if not isinstance(cursor, dict): return {"boot": "", "seq": 0}
+        try: return {"boot": str(cursor.get('boot', '')), "seq": int(cursor.get('seq', 0))}
+        except (TypeError, ValueError): return {"boot": "", "seq": 0}
+
+    def save_pico_pour_cursor(self, pour_cursor):
+        self.settings.setdefault('system_settings', self._get_default_system_settings())['pico_pour_cursor'] = dict(pour_cursor)
+        self._save_all_settings()
+
+    def get_pico_node_pour_cursors(self):
+        """{host: pour log cursor} for federated Picos; a host without one has never been saved."""
+        cursors = self.settings.get('system_settings', {}).get('pico_node_pour_cursors')
+        result = {}
+        if isinstance(cursors, dict):
+            for host, cursor in cursors.items():
+                try: result[str(host)] = {"boot": str(cursor.get('boot', '')), "seq": int(cursor.get('seq', 0))}
+                except (AttributeError, TypeError, ValueError): pass
+        return result
+
+    def save_pico_node_pour_cursor(self, host, pour_cursor):
+        sys_settings = self.settings.setdefault('system_settings', self._get_default_system_settings())
+        cursors = sys_settings.get('pico_node_pour_cursors')
+        if not isinstance(cursors, dict): cursors = sys_settings['pico_node_pour_cursors'] = {}
+        cursors[host] = dict(pour_cursor)
+        self._save_all_settings()
+
     def save_displayed_taps(self, number_of_taps):
         if isinstance(number_of_taps, int) and 1 <= number_of_taps <= self.num_sensors: 
             self.settings.setdefault('system_settings', self._get_default_system_settings())['displayed_taps'] = number_of_taps; self._save_all_settings() 
@@ -1133,6 +1430,7 @@ class SettingsManager:
         self.settings['push_notification_settings'] = new_notif_settings 
         self._save_all_settings(); 
         print("Push Notification settings saved.") 
+        self.changes.publish(NOTIFICATIONS_CHANGED, value="push")
 
     def get_status_request_settings(self):
         current_status_req_settings = self.settings.get('status_request_settings', {}).copy()
@@ -1169,6 +1467,7 @@ class SettingsManager:
         self.settings['status_request_settings'] = new_status_req_settings
         self._save_all_settings()
         print("Status Request settings saved.") 
+        self.changes.publish(NOTIFICATIONS_CHANGED, value="status_request")
     
     def _get_desktop_shortcut_path(self):
         return os.path.expanduser("~/.local/share/applications/keglevel.desktop")
@@ -1240,12 +1539,53 @@ class SettingsManager:
             'ambient': system_settings.get('ds18b20_ambient_sensor', 'unassigned') 
         }
 
+    def get_config_snapshot(self):
+        """
+        Returns the current ConfigSnapshot, rebuilding it only when
+        config_version has moved on. Hot loops should keep the returned object
+        and compare its version to config_version before asking again.
+        """
+        snapshot = self._config_snapshot
+        version = self.config_version
+        if snapshot is None or snapshot.version != version:
+            snapshot = ConfigSnapshot(
+                version=version,
+                displayed_taps=self.get_displayed_taps(),
+                k_factors=tuple(self.get_flow_calibration_factors()),
+                keg_assignments=tuple(self.get_sensor_keg_assignments()),
+                display_units=self.get_display_units()
+            )
+            self._config_snapshot = snapshot
+        return snapshot
+
+    def flush(self):
+        """Writes out every pending save and syncs the dispense journal (call at shutdown)."""
+        self.dispense_journal.sync()
+        if not self._store.flush():
+            print("SettingsManager: Warning: some settings could not be written.")
+
+    def _sensor_config(self):
+        """The stored settings the sensor loops depend on, as a comparable value."""
+        system = self.settings.get('system_settings', {})
+        values = (self.settings.get('sensor_keg_assignments'), system.get('flow_calibration_factors'),
+                  system.get('flow_sensor_pins'), system.get('displayed_taps'), system.get('display_units'))
+        return tuple(tuple(v) if isinstance(v, list) else v for v in values)
+
     def _save_all_settings(self, current_settings=None):
         settings_to_save = current_settings if current_settings is not None else self.settings
+        # Pour-end saves (last pour volumes, notification state) leave the loops' view alone
+        if current_settings is not None:
+            self.config_version += 1
+        else:
+            key = self._sensor_config()
+            if key != self._sensor_config_key:
+                self._sensor_config_key = key
+                self.config_version += 1
         try:
-            with open(self.settings_file_path, 'w', encoding='utf-8') as f: json.dump(settings_to_save, f, indent=4) 
-            print(f"Settings saved to {self.settings_file_path}.") 
-        except Exception as e: print(f"Error saving all settings to {self.settings_file_path}: {e}")
+            self._stamp_schema(SETTINGS_FILE, settings_to_save)
+            self._store.save(SETTINGS_FILE, settings_to_save)
+            print(f"Settings saved to {self._store.where(SETTINGS_FILE)}.") 
+        except Exception as e: print(f"Error saving all settings to {self._store.where(SETTINGS_FILE)}: {e}")
 
     # --- NEW: Helper for logical naming (Moved from UI) ---
     def generate_next_keg_title(self):
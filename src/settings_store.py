@@ -0,0 +1,464 @@
+# keglevel app
+#
+# settings_store.py
+"""
+Storage engines behind SettingsManager.
+
+SettingsManager works on three documents -- settings.json, keg_library.json
+and beverages_library.json -- and hands each one to its store to load and
+save. Two engines implement the same small interface:
+
+    JsonStore    one JSON file per document, rewritten in full on save
+                 (the default, and the original format). Saves are
+                 coalesced and written atomically on a background thread.
+    SqliteStore  one SQLite database (keglevel.db, WAL mode) with a row per
+                 keg, beverage, tap assignment and system setting. save()
+                 writes only the rows that changed since the last save, and
+                 update_keg_volume() is a single-row UPDATE, so a pour tick
+                 no longer needs the dispense journal.
+
+The database engine is used when keglevel.db exists in the data directory;
+import_json_files() creates it once from the JSON documents.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+try:
+    import sqlite3
+except ImportError:     # Python built without sqlite3: JSON files only
+    sqlite3 = None
+
+SQLITE_FILE = "keglevel.db"
+
+# Document names, as SettingsManager knows them (their JSON file names)
+SETTINGS_DOC = "settings.json"
+KEGS_DOC = "keg_library.json"
+BEVERAGES_DOC = "beverages_library.json"
+
+# JSON engine write-behind: a document is written once it has been quiet for
+# WRITE_DELAY_S, or WRITE_MAX_DELAY_S after its first unsaved change
+WRITE_DELAY_S = 0.5
+WRITE_MAX_DELAY_S = 2.0
+WRITE_RETRY_S = 5.0         # after a failed write (SD card full, read-only, ...)
+
+# Per-tap lists of the settings document, stored as columns of one row per tap
+_TAP_COLUMNS = (("sensor_keg_assignments", "keg_id"),
+                ("sensor_beverage_assignments", "beverage_id"),
+                ("sensor_labels", "label"))
+# Keg fields kept in their own columns so a pour tick updates only those
+_KEG_VOLUME_FIELDS = ("current_dispensed_liters", "total_dispensed_pulses")
+
+
+def open_store(data_dir):
+    """SqliteStore if the data directory holds a database, else JsonStore."""
+    if sqlite3 is not None and os.path.exists(os.path.join(data_dir, SQLITE_FILE)):
+        return SqliteStore(os.path.join(data_dir, SQLITE_FILE))
+    return JsonStore(data_dir)
+
+
+class JsonStore:
+    """
+    One indented JSON file per document, written behind the caller's back.
+
+    save() serializes the document on the calling thread (so later edits to
+    the live dicts cannot tear it) and hands the bytes to a writer thread.
+    Saves of the same document within WRITE_DELAY_S of each other collapse
+    into one write; a document is never held back longer than
+    WRITE_MAX_DELAY_S. Each write goes to a temp file that is fsynced and
+    renamed over the old one, so a power cut leaves either the old or the
+    new file, never half of one. load() of a document with a pending write
+    flushes it first.
+    """
+
+    engine = "json"
+
+    def __init__(self, data_dir, delay_s=WRITE_DELAY_S, max_delay_s=WRITE_MAX_DELAY_S):
+        self.data_dir = data_dir
+        self.delay_s = delay_s
+        self.max_delay_s = max_delay_s
+
+        self._cond = threading.Condition()
+        self._pending = {}          # name → _PendingWrite
+        self._writing = set()       # names being written by someone right now
+        self._closing = False
+        self._thread = None
+        self._atexit_registered = False
+        self._stats = {"saves": 0, "writes": 0, "coalesced": 0, "errors": 0}
+
+    def where(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def exists(self, name):
+        with self._cond:
+            if name in self._pending: return True
+        return os.path.exists(self.where(name))
+
+    def load(self, name):
+        """The parsed document, or None if its file does not exist. Raises on a corrupt file."""
+        self.flush(name)
+        if not os.path.exists(self.where(name)): return None
+        with open(self.where(name), 'r') as f:
+            return json.load(f)
+
+    def save(self, name, doc, on_written=None):
+        """
+        Queues doc for writing. on_written() runs (on the writer thread) once
+        this version, or a newer one, is safely on disk.
+        """
+        data = json.dumps(doc, indent=4).encode('utf-8')
+        now = time.monotonic()
+        with self._cond:
+            self._stats["saves"] += 1
+            pending = self._pending.get(name)
+            if pending is None:
+                pending = self._pending[name] = _PendingWrite(now)
+            else:
+                self._stats["coalesced"] += 1
+            pending.data = data
+            pending.due = min(now + self.delay_s, pending.first + self.max_delay_s)
+            if on_written: pending.callbacks.append(on_written)
+            if self._thread is None or not self._thread.is_alive():
+                self._closing = False
+                self._thread = threading.Thread(target=self._writer, daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.flush)     # A daemon thread dies with the process
+                    self._atexit_registered = True
+            self._cond.notify_all()
+
+    def flush(self, name=None):
+        """Writes pending documents (all, or just name) now. Returns False if a write failed."""
+        ok = True
+        with self._cond:
+            names = [name] if name is not None else list(self._pending)
+        for n in names:
+            ok = self._write_pending(n, wait=True) and ok
+        return ok
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending) + len(self._writing)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending) + len(self._writing))
+
+    def update_keg_volume(self, keg):
+        """Not supported: SettingsManager journals the pour instead."""
+        return False
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._closing:
+                    now = time.monotonic()
+                    due = [n for n, p in self._pending.items() if p.due <= now and n not in self._writing]
+                    if due: break
+                    waits = [p.due - now for n, p in self._pending.items() if n not in self._writing]
+                    self._cond.wait(min(waits) if waits else None)
+                if self._closing:
+                    return
+            for name in due:
+                self._write_pending(name, wait=False)
+
+    def _write_pending(self, name, wait):
+        """Takes name's pending version and writes it. With wait, first waits out a write already in progress."""
+        with self._cond:
+            while name in self._writing:
+                if not wait: return True
+                self._cond.wait()
+            pending = self._pending.pop(name, None)
+            if pending is None: return True
+            self._writing.add(name)
+        try:
+            _write_atomic(self.where(name), pending.data)
+        except Exception as e:
+            print(f"SettingsStore: Error writing {self.where(name)}: {e}")
+            with self._cond:
+                self._stats["errors"] += 1
+                self._writing.discard(name)
+                # Keep it for the next attempt, unless a newer version is already queued
+                newer = self._pending.get(name)
+                if newer is None:
+                    pending.due = time.monotonic() + WRITE_RETRY_S
+                    pending.first = pending.due
+                    self._pending[name] = pending
+                else:
+                    newer.callbacks[:0] = pending.callbacks
+                self._cond.notify_all()
+            return False
+        with self._cond:
+            self._stats["writes"] += 1
+            self._writing.discard(name)
+            self._cond.notify_all()
+        for cb in pending.callbacks:
+            try:
+                cb()
+            except Exception as e:
+                print(f"SettingsStore: Error after writing {name}: {e}")
+        return True
+
+
+class _PendingWrite:
+    def __init__(self, first):
+        self.first = first          # When the document first went dirty
+        self.due = first
+        self.data = b""
+        self.callbacks = []
+
+
+def _write_atomic(path, data):
+    """Replaces path with data: temp file in the same directory, fsync, rename, fsync the directory."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, "O_DIRECTORY"):     # Make the rename itself durable (POSIX only)
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class SqliteStore:
+    """The three documents as rows of one SQLite database (WAL journal)."""
+
+    engine = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kegs (
+            key TEXT PRIMARY KEY, position INTEGER NOT NULL,
+            current_dispensed_liters REAL, total_dispensed_pulses INTEGER, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS beverages (
+            key TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS assignments (
+            tap INTEGER PRIMARY KEY, keg_id TEXT, beverage_id TEXT, label TEXT);
+        CREATE TABLE IF NOT EXISTS system_settings (
+            key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        -- Remaining top-level keys of each document ("<doc>/<key>")
+        CREATE TABLE IF NOT EXISTS documents (
+            name TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")    # WAL stays consistent; fsync at checkpoints
+        self._conn.executescript(self._SCHEMA)
+        # Last row values written, per table, for the diff in save()
+        self._rows = {}
+
+    def where(self, name):
+        return f"{self.path} ({name})"
+
+    def exists(self, name):
+        with self._lock:
+            if name == SETTINGS_DOC:
+                tables = ("assignments", "system_settings")
+            elif name == KEGS_DOC:
+                tables = ("kegs",)
+            else:
+                tables = ("beverages",)
+            for table in tables:
+                if self._conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                    return True
+            return self._conn.execute("SELECT 1 FROM documents WHERE name LIKE ? LIMIT 1",
+                                      (name + "/%",)).fetchone() is not None
+
+    # ------------------------------------------------------------------
+    # Document <-> rows
+    # ------------------------------------------------------------------
+
+    def load(self, name):
+        if not self.exists(name): return None
+        with self._lock:
+            doc = {}
+            for key, value in self._conn.execute("SELECT name, value FROM documents WHERE name LIKE ?",
+                                                 (name + "/%",)):
+                doc[key.split("/", 1)[1]] = json.loads(value)
+            if name == SETTINGS_DOC:
+                self._load_settings_rows(doc)
+            elif name == KEGS_DOC:
+                kegs = []
+                for _key, liters, pulses, data in self._conn.execute(
+                        "SELECT key, current_dispensed_liters, total_dispensed_pulses, data FROM kegs ORDER BY position"):
+                    keg = json.loads(data)
+                    if liters is not None: keg['current_dispensed_liters'] = liters
+                    if pulses is not None: keg['total_dispensed_pulses'] = pulses
+                    kegs.append(keg)
+                doc['kegs'] = kegs
+            else:
+                doc['beverages'] = [json.loads(data) for (data,) in
+                                    self._conn.execute("SELECT data FROM beverages ORDER BY position")]
+            # What is on disk now is what the next save() diffs against
+            self._rows.update(self._doc_rows(name, doc))
+            return doc
+
+    def _load_settings_rows(self, doc):
+        system = {key: json.loads(value) for key, value in
+                  self._conn.execute("SELECT key, value FROM system_settings")}
+        if system: doc['system_settings'] = system
+        rows = self._conn.execute("SELECT tap, keg_id, beverage_id, label FROM assignments ORDER BY tap").fetchall()
+        for col, (list_key, _column) in enumerate(_TAP_COLUMNS, start=1):
+            values = [row[col] for row in rows]
+            while values and values[-1] is None: values.pop()
+            if values: doc[list_key] = values
+
+    def _doc_rows(self, name, doc):
+        """{table: {key: row tuple}} for a document, documents table included."""
+        extra = {f"{name}/{k}": (json.dumps(v, sort_keys=True),) for k, v in doc.items()}
+        if name == SETTINGS_DOC:
+            for key in ('system_settings',) + tuple(k for k, _c in _TAP_COLUMNS):
+                extra.pop(f"{name}/{key}", None)
+            system = {k: (json.dumps(v, sort_keys=True),) for k, v in (doc.get('system_settings') or {}).items()}
+            lists = [doc.get(k) if isinstance(doc.get(k), list) else [] for k, _c in _TAP_COLUMNS]
+            taps = {}
+            for tap in range(max(len(l) for l in lists)):
+                taps[tap] = tuple(l[tap] if tap < len(l) else None for l in lists)
+            return {f"documents/{name}": extra, "system_settings": system, "assignments": taps}
+        if name == KEGS_DOC:
+            extra.pop(f"{name}/kegs", None)
+            kegs = {}
+            for position, keg in enumerate(doc.get('kegs') or []):
+                data = {k: v for k, v in keg.items() if k not in _KEG_VOLUME_FIELDS}
+                kegs[keg.get('id') or f"#{position}"] = (position, keg.get('current_dispensed_liters'),
+                                                         keg.get('total_dispensed_pulses'),
+                                                         json.dumps(data, sort_keys=True))
+            return {f"documents/{name}": extra, "kegs": kegs}
+        extra.pop(f"{name}/beverages", None)
+        beverages = {}
+        for position, bev in enumerate(doc.get('beverages') or []):
+            beverages[bev.get('id') or f"#{position}"] = (position, json.dumps(bev, sort_keys=True))
+        return {f"documents/{name}": extra, "beverages": beverages}
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    _UPSERT = {
+        "kegs": "INSERT OR REPLACE INTO kegs (key, position, current_dispensed_liters, total_dispensed_pulses, data) VALUES (?, ?, ?, ?, ?)",
+        "beverages": "INSERT OR REPLACE INTO beverages (key, position, data) VALUES (?, ?, ?)",
+        "assignments": "INSERT OR REPLACE INTO assignments (tap, keg_id, beverage_id, label) VALUES (?, ?, ?, ?)",
+        "system_settings": "INSERT OR REPLACE INTO system_settings (key, value) VALUES (?, ?)",
+        "documents": "INSERT OR REPLACE INTO documents (name, value) VALUES (?, ?)",
+    }
+    _DELETE = {
+        "kegs": "DELETE FROM kegs WHERE key = ?",
+        "beverages": "DELETE FROM beverages WHERE key = ?",
+        "assignments": "DELETE FROM assignments WHERE tap = ?",
+        "system_settings": "DELETE FROM system_settings WHERE key = ?",
+        "documents": "DELETE FROM documents WHERE name = ?",
+    }
+
+    def save(self, name, doc, on_written=None):
+        """Writes the rows of doc that differ from the last load/save, in one transaction. Returns the row count."""
+        new = self._doc_rows(name, doc)
+        with self._lock:
+            changes = []
+            for table, rows in new.items():
+                old = self._rows.get(table, {})
+                sql_table = table.split("/", 1)[0]
+                for key, row in rows.items():
+                    if old.get(key) != row:
+                        changes.append((self._UPSERT[sql_table], (key,) + row))
+                for key in old.keys() - rows.keys():
+                    changes.append((self._DELETE[sql_table], (key,)))
+            if changes:
+                self._conn.execute("BEGIN")
+                try:
+                    for sql, params in changes:
+                        self._conn.execute(sql, params)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            self._rows.update(new)
+        if on_written: on_written()
+        return len(changes)
+
+    def flush(self, name=None):
+        """Nothing to do: save() commits before it returns."""
+        return True
+
+    def update_keg_volume(self, keg):
+        """One-row UPDATE of a keg's dispensed liters and pulses. Returns False if it has no row yet."""
+        key = keg.get('id')
+        liters, pulses = keg.get('current_dispensed_liters'), keg.get('total_dispensed_pulses')
+        with self._lock:
+            kegs = self._rows.get("kegs", {})
+            row = kegs.get(key)
+            if row is None: return False
+            self._conn.execute("UPDATE kegs SET current_dispensed_liters = ?, total_dispensed_pulses = ? WHERE key = ?",
+                               (liters, pulses, key))
+            kegs[key] = (row[0], liters, pulses, row[3])
+            return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def import_json_files(data_dir, overwrite=False):
+    """
+    One-shot import of settings.json, keg_library.json and
+    beverages_library.json into a new keglevel.db; SettingsManager uses the
+    database from its next start. The JSON files are left in place as a
+    backup. Returns {document: imported?}; raises FileExistsError if the
+    database exists and overwrite is False.
+    """
+    if sqlite3 is None:
+        raise RuntimeError("this Python has no sqlite3 module")
+    final_path = os.path.join(data_dir, SQLITE_FILE)
+    if os.path.exists(final_path) and not overwrite:
+        raise FileExistsError(final_path)
+    tmp_path = final_path + ".importing"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(tmp_path + suffix): os.remove(tmp_path + suffix)
+
+    source = JsonStore(data_dir)
+    store = SqliteStore(tmp_path)
+    imported = {}
+    try:
+        for name in (SETTINGS_DOC, KEGS_DOC, BEVERAGES_DOC):
+            doc = source.load(name)
+            imported[name] = doc is not None
+            if doc is not None:
+                store.save(name, doc)
+        store._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        store._conn.execute("PRAGMA journal_mode=DELETE")    # One self-contained file to rename
+    finally:
+        store.close()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(final_path + suffix): os.remove(final_path + suffix)
+    os.replace(tmp_path, final_path)
+    print(f"SettingsStore: Imported {', '.join(n for n, ok in imported.items() if ok) or 'nothing'} into {final_path}.")
+    return imported
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Import the JSON settings files into keglevel.db.")
+    parser.add_argument("--data-dir", default=os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                         "..", "..", "keglevel_lite-data")))
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing keglevel.db")
+    args = parser.parse_args()
+    try:
+        import_json_files(args.data_dir, overwrite=args.overwrite)
+    except FileExistsError as e:
+        raise SystemExit(f"{e} already exists; use --overwrite to import again.")
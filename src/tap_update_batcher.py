@@ -0,0 +1,58 @@
+# keglevel app
+#
+# tap_update_batcher.py
+
+
+class TapUpdateBatcher:
+    """
+    Sits between a sensor backend and its UI callbacks.
+
+    The backend stages an update for every tap it visits during a tick; only
+    taps whose rendered state (status, pouring or not, remaining volume to
+    the 0.01 L shown on screen) changed since the last emit are kept. flush()
+    then hands all dirty taps to the UI in one "update_sensor_batch_cb" call,
+    or one "update_sensor_data_cb" call per tap if no batch callback is set.
+    """
+
+    def __init__(self, num_taps, ui_callbacks):
+        self.ui_callbacks = ui_callbacks
+        self._last_sent = [None] * num_taps
+        self._dirty = {}
+        self.updates_sent = 0
+        self.updates_suppressed = 0
+        self.batches_sent = 0
+
+    def stage(self, idx, rate, rem, status, pour_vol):
+        rendered = (status, rate > 0, round(rem, 2))
+        if rendered == self._last_sent[idx]:
+            self.updates_suppressed += 1
+            return
+        self._last_sent[idx] = rendered
+        self._dirty[idx] = (idx, rate, rem, status, pour_vol)
+
+    def flush(self):
+        """Emits every dirty tap staged since the last flush."""
+        if not self._dirty: return
+        batch = list(self._dirty.values())
+        self._dirty.clear()
+        self.updates_sent += len(batch)
+        self.batches_sent += 1
+
+        batch_cb = self.ui_callbacks.get("update_sensor_batch_cb")
+        if batch_cb:
+            batch_cb(batch)
+            return
+        cb = self.ui_callbacks.get("update_sensor_data_cb")
+        if cb:
+            for update in batch: cb(*update)
+
+    def invalidate(self):
+        """Forgets what was last shown so the next tick re-sends every tap."""
+        self._last_sent = [None] * len(self._last_sent)
+
+    def stats(self):
+        return {
+            "updates_sent": self.updates_sent,
+            "updates_suppressed": self.updates_suppressed,
+            "batches_sent": self.batches_sent,
+        }
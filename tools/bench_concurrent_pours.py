@@ -0,0 +1,108 @@
+# keglevel app
+#
+# tools/bench_concurrent_pours.py
+"""
+Pours on every tap at once at full flow rate and checks that SensorLogic
+books the exact number of pulses on each keg.
+
+Each tap gets its own pulse thread calling count_pulse() for its GPIO pin,
+the same path a hardware interrupt takes. Pours are staggered so they start
+and stop at different times while overlapping.
+
+    python tools/bench_concurrent_pours.py [--taps 5] [--lpm 4.0] [--seconds 5]
+
+Prints a JSON report and exits non-zero if any tap's total is off.
+"""
+import argparse
+import json
+import threading
+import time
+
+import bench_support
+import sensor_logic
+from sensor_logic import SensorLogic, FLOW_SENSOR_PINS
+
+
+def _pour(pin, rate_hz, duration_s, sent, idx):
+    """Emits pulses on one pin at rate_hz, paced against the clock."""
+    start = time.monotonic()
+    emitted = 0
+    while True:
+        elapsed = time.monotonic() - start
+        if elapsed >= duration_s: break
+        due = int(elapsed * rate_hz)
+        while emitted < due:
+            sensor_logic.count_pulse(pin)
+            emitted += 1
+        time.sleep(0.001)
+    sent[idx] = emitted
+
+
+def run(taps, lpm, seconds):
+    settings = bench_support.BenchSettingsManager(taps)
+    k_factor = settings.k_factors[0]
+    rate_hz = k_factor * lpm / 60.0
+    pours_seen = [0] * taps
+    pouring = [False] * taps
+
+    def on_update(idx, rate, rem, status, pour_vol):
+        # Count Pouring -> Idle transitions; idle refreshes repeat every tick
+        if status == "Pouring":
+            pouring[idx] = True
+        elif pouring[idx]:
+            pouring[idx] = False
+            pours_seen[idx] += 1
+
+    logic = SensorLogic(taps, {"update_sensor_data_cb": on_update}, settings)
+    logic.start_monitoring()
+
+    sent = [0] * taps
+    threads = []
+    for i in range(taps):
+        # Stagger starts by 100 ms and lengths by 10% so pours overlap unevenly
+        t = threading.Thread(target=_pour, args=(FLOW_SENSOR_PINS[i], rate_hz, seconds * (1.0 + 0.1 * i), sent, i))
+        threads.append(t)
+        t.start()
+        time.sleep(0.1)
+    for t in threads: t.join()
+
+    # Let every pour reach its stop gap
+    time.sleep(sensor_logic.FLOW_STOP_GAP_SECONDS + 0.5)
+    logic.stop_monitoring()
+
+    booked = settings.dispensed_pulses()
+    results = []
+    for i in range(taps):
+        results.append({
+            "tap": i + 1,
+            "pulses_sent": sent[i],
+            "pulses_booked": booked[i],
+            "liters_expected": round(sent[i] / k_factor, 4),
+            "liters_booked": round(logic.keg_dispensed_liters[i], 4),
+            "last_pour_liters": round(logic.last_pour_volumes[i], 4),
+            "pours_closed": pours_seen[i],
+        })
+    ok = all(r["pulses_sent"] == r["pulses_booked"] and r["pours_closed"] == 1 for r in results)
+    return {
+        "taps": taps,
+        "flow_lpm": lpm,
+        "pulse_rate_hz_per_tap": round(rate_hz, 1),
+        "ok": ok,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--taps", type=int, default=len(FLOW_SENSOR_PINS))
+    parser.add_argument("--lpm", type=float, default=4.0, help="flow rate per tap in L/min")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of the shortest pour")
+    args = parser.parse_args()
+
+    report = run(min(args.taps, len(FLOW_SENSOR_PINS)), args.lpm, args.seconds)
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
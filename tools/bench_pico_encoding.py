@@ -0,0 +1,78 @@
+# keglevel app
+#
+# tools/bench_pico_encoding.py
+"""
+Compares JSON and MessagePack bodies of /api/state: payload size and
+host-side decode time, for the full document and a typical delta, at 5, 8
+and 16 taps.
+
+Documents come from tools/fake_pico.py after an hour of simulated pours,
+so totals, flow rates and the pour log look like a working bar. JSON is
+encoded as the Pico sends it (compact separators) and decoded with
+json.loads; MessagePack is packed with float32 floats, as MicroPython does,
+and decoded with src/pico_codec.py's pure-Python decoder (plus the msgpack
+package's C decoder when it is installed).
+
+    python tools/bench_pico_encoding.py [--taps 5 8 16] [--output report.json]
+"""
+import argparse
+import json
+import timeit
+
+import bench_support  # noqa: F401  (puts src/ on sys.path)
+import pico_codec
+from fake_pico import FakePico, VirtualClock
+
+
+def _decode_us(fn, body):
+    """Best-of-five mean decode time of body, in microseconds."""
+    timer = timeit.Timer(lambda: fn(body))
+    number, _ = timer.autorange()
+    return round(min(timer.repeat(5, number)) / number * 1e6, 2)
+
+
+def measure(doc):
+    as_json = json.dumps(doc, separators=(",", ":")).encode()
+    as_msgpack = pico_codec.packb(doc, single_float=True)
+    c_decoder, pico_codec._msgpack = pico_codec._msgpack, None
+    try:
+        result = {
+            "json_bytes": len(as_json),
+            "msgpack_bytes": len(as_msgpack),
+            "size_ratio": round(len(as_msgpack) / len(as_json), 3),
+            "json_decode_us": _decode_us(lambda b: json.loads(b.decode()), as_json),
+            "msgpack_decode_us": _decode_us(pico_codec.unpackb, as_msgpack),
+        }
+    finally:
+        pico_codec._msgpack = c_decoder
+    if c_decoder is not None:
+        result["msgpack_c_decode_us"] = _decode_us(pico_codec.unpackb, as_msgpack)
+    return result
+
+
+def run(taps):
+    pico = FakePico(taps=taps, busy=0.3, seed=1, clock=VirtualClock())
+    pico.server.server_close()          # Only the documents are needed
+    pico.advance(3600.0)
+    _status, full, _etag = pico.state_document()
+    _status, delta, _etag = pico.state_document(since=pico.seq - 1)
+    return {"taps": taps,
+            "full": measure(full),
+            "delta": dict(measure(delta), taps_in_delta=len(delta["taps"]))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--taps", type=int, nargs="+", default=[5, 8, 16])
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"c_decoder": pico_codec._msgpack is not None, "results": [run(n) for n in args.taps]}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
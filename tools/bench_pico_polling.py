@@ -0,0 +1,64 @@
+# keglevel app
+#
+# tools/bench_pico_polling.py
+"""
+Measures what /api/state polling costs per hour, full-document (legacy
+firmware) versus conditional/delta polling, for an idle and a busy bar.
+
+Each scenario runs PicoSensorLogic against an in-process fake Pico
+(tools/fake_pico.py) for --seconds and scales the result to one hour:
+bytes the Pico sent (headers included), requests, and host-side body decode
+time.
+
+    python tools/bench_pico_polling.py [--seconds 30] [--busy 0.3] [--output report.json]
+"""
+import argparse
+import json
+import time
+
+import bench_support
+from fake_pico import FakePico
+from pico_sensor_logic import PicoSensorLogic
+
+
+def run_scenario(taps, busy, legacy, seconds):
+    pico = FakePico(taps=taps, busy=busy, legacy=legacy, seed=1).start()
+    settings = bench_support.BenchSettingsManager(taps)
+    settings.pico_host = pico.address
+    logic = PicoSensorLogic(taps, {}, settings)
+    logic.start_monitoring()
+    time.sleep(seconds)
+    logic.stop_monitoring()
+    logic.cleanup_gpio()
+    pico.stop()
+
+    polls = logic.get_poll_stats()
+    scale = 3600.0 / seconds
+    return {
+        "firmware": "legacy" if legacy else "conditional",
+        "busy": busy,
+        "requests_per_hour": round(pico.requests * scale),
+        "kib_per_hour": round(pico.bytes_sent * scale / 1024.0, 1),
+        "parse_ms_per_hour": round(polls["parse_s"] * scale * 1000.0, 1),
+        "replies": {k: polls[k] for k in ("full", "delta", "not_modified")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--taps", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=30.0, help="run length per scenario")
+    parser.add_argument("--busy", type=float, default=0.3, help="pour duty cycle of the busy scenario")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = [run_scenario(args.taps, busy, legacy, args.seconds)
+               for busy in (0.0, args.busy) for legacy in (True, False)]
+    text = json.dumps({"taps": args.taps, "seconds_per_scenario": args.seconds, "results": results}, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
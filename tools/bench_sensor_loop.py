@@ -0,0 +1,233 @@
+# keglevel app
+#
+# tools/bench_sensor_loop.py
+"""
+Benchmarks the SensorLogic loop on MockGPIO at a chosen pulse rate.
+
+One driver thread per tap injects pulses (through simulate_pulse_increment,
+or count_pulse per edge with --mode interrupt) in pour/pause cycles for the
+length of the run. The report covers:
+
+  * CPU time the loop thread spends per tick (work + UI flush)
+  * pulse-to-UI-callback latency percentiles: time from a pulse being
+    injected to the first UI update that includes it (updates the display
+    would not show differently are suppressed, which is part of the latency
+    a user sees)
+  * dropped pulses (sent but never booked) and misattributed pulses
+    (booked beyond what was sent on that tap)
+  * memory growth: process RSS, plus Python heap growth and the top
+    allocation sites with --tracemalloc (which slows the run down)
+
+    python tools/bench_sensor_loop.py [--taps 5] [--rate-hz 800] [--seconds 60]
+                                      [--mode simulate|interrupt] [--output report.json]
+
+The JSON report goes to stdout and, with --output, to a file so results can
+be kept and compared between releases.
+"""
+import argparse
+import bisect
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+import bench_support
+import sensor_logic
+from sensor_logic import SensorLogic, FLOW_SENSOR_PINS, MAX_FLOW_SENSORS
+from version import APP_VERSION
+
+DRIVER_STEP_S = 0.001
+
+
+class InstrumentedSensorLogic(SensorLogic):
+    """SensorLogic that records the thread CPU time of every loop tick."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tick_cpu_s = []
+        self._tick_start = None
+
+    def _wait_for_pulses(self, busy):
+        self.ui_updates.flush() # Counted as part of the tick
+        if self._tick_start is not None:
+            self.tick_cpu_s.append(time.thread_time() - self._tick_start)
+        super()._wait_for_pulses(busy)
+        self._tick_start = time.thread_time()
+
+
+class PulseDriver(threading.Thread):
+    """Injects pulses on one tap at rate_hz during pours, idle during pauses."""
+
+    def __init__(self, logic, tap, rate_hz, mode, pour_s, pause_s, stop_event):
+        super().__init__(daemon=True)
+        self.logic = logic
+        self.tap = tap
+        self.pin = FLOW_SENSOR_PINS[tap]
+        self.rate_hz = rate_hz
+        self.mode = mode
+        self.pour_s = pour_s
+        self.pause_s = pause_s
+        self.stop_event = stop_event
+        self.sent = 0
+        # Parallel lists: cumulative pulses sent after each injection, and when
+        self.sent_marks = []
+        self.sent_times = []
+        self._lock = threading.Lock()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            start = time.monotonic()
+            emitted = 0
+            while not self.stop_event.is_set():
+                elapsed = time.monotonic() - start
+                if elapsed >= self.pour_s: break
+                due = int(elapsed * self.rate_hz) - emitted
+                if due > 0:
+                    if self.mode == "interrupt":
+                        for _ in range(due): sensor_logic.count_pulse(self.pin)
+                    else:
+                        self.logic.simulate_pulse_increment(self.tap, due)
+                    emitted += due
+                    with self._lock:
+                        self.sent += due
+                        self.sent_marks.append(self.sent)
+                        self.sent_times.append(time.monotonic())
+                time.sleep(DRIVER_STEP_S)
+            self.stop_event.wait(self.pause_s)
+
+    def injected_at(self, booked):
+        """Injection times of every batch now fully covered by booked pulses."""
+        with self._lock:
+            n = bisect.bisect_right(self.sent_marks, booked)
+            times = self.sent_times[:n]
+            del self.sent_marks[:n]
+            del self.sent_times[:n]
+        return times
+
+
+def _rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _percentiles(values, points=(50, 90, 99, 99.9)):
+    if not values: return {}
+    values = sorted(values)
+    out = {f"p{p:g}": values[min(len(values) - 1, int(len(values) * p / 100.0))] for p in points}
+    out["max"] = values[-1]
+    out["mean"] = sum(values) / len(values)
+    return out
+
+
+def _ms(stats):
+    return {k: round(v * 1000.0, 3) for k, v in stats.items()}
+
+
+def run(taps, rate_hz, seconds, mode, pour_s, pause_s, use_tracemalloc):
+    settings = bench_support.BenchSettingsManager(taps, keg_volume_liters=1000.0)
+    latencies = []
+    drivers = []
+
+    def on_batch(batch):
+        now = time.monotonic()
+        booked = settings.dispensed_pulses()
+        for idx, _rate, _rem, _status, _pour_vol in batch:
+            for t in drivers[idx].injected_at(booked[idx]):
+                latencies.append(now - t)
+
+    logic = InstrumentedSensorLogic(taps, {"update_sensor_batch_cb": on_batch}, settings)
+    stop_event = threading.Event()
+    drivers.extend(PulseDriver(logic, i, rate_hz, mode, pour_s, pause_s, stop_event) for i in range(taps))
+
+    if use_tracemalloc: tracemalloc.start()
+    logic.start_monitoring()
+    time.sleep(0.2)
+    rss_start = _rss_kb()
+    heap_start = tracemalloc.take_snapshot() if use_tracemalloc else None
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+
+    for d in drivers: d.start()
+    stop_event.wait(seconds)
+    stop_event.set()
+    for d in drivers: d.join()
+    # Let the last pours reach their stop gap so every pulse is booked
+    time.sleep(sensor_logic.FLOW_STOP_GAP_SECONDS + 0.5)
+
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+    rss_end = _rss_kb()
+    memory = {"rss_start_kb": rss_start, "rss_end_kb": rss_end,
+              "rss_growth_kb": None if rss_start is None or rss_end is None else rss_end - rss_start}
+    if use_tracemalloc:
+        # The harness's own bookkeeping (latency samples) is left out
+        own = [tracemalloc.Filter(False, __file__)]
+        heap_end = tracemalloc.take_snapshot()
+        diff = heap_end.filter_traces(own).compare_to(heap_start.filter_traces(own), "lineno")
+        memory["python_heap_growth_kb"] = round(sum(d.size_diff for d in diff) / 1024.0, 1)
+        memory["top_growth"] = [{"site": str(d.traceback), "kb": round(d.size_diff / 1024.0, 1)} for d in diff[:5]]
+        tracemalloc.stop()
+    logic.stop_monitoring()
+
+    booked = settings.dispensed_pulses()
+    sent = [d.sent for d in drivers]
+    per_tap = [{"tap": i + 1, "pulses_sent": sent[i], "pulses_booked": booked[i]} for i in range(taps)]
+    dropped = sum(max(0, s - b) for s, b in zip(sent, booked))
+    misattributed = sum(max(0, b - s) for s, b in zip(sent, booked))
+    tick_cpu = logic.tick_cpu_s
+
+    return {
+        "app_version": APP_VERSION,
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "config": {"taps": taps, "rate_hz_per_tap": rate_hz, "aggregate_hz": rate_hz * taps,
+                   "seconds": seconds, "mode": mode, "pour_s": pour_s, "pause_s": pause_s,
+                   "tracemalloc": use_tracemalloc},
+        "ticks": len(tick_cpu),
+        "tick_cpu_ms": _ms(_percentiles(tick_cpu)),
+        "latency_ms": _ms(_percentiles(latencies)),
+        "latency_samples": len(latencies),
+        "process_cpu_percent": round(100.0 * cpu / wall, 1) if wall > 0 else None,
+        "pulses_sent": sum(sent),
+        "pulses_booked": sum(booked),
+        "dropped_pulses": dropped,
+        "misattributed_pulses": misattributed,
+        "per_tap": per_tap,
+        "ui_updates": logic.get_ui_update_stats(),
+        "memory": memory,
+        "ok": dropped == 0 and misattributed == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--taps", type=int, default=len(FLOW_SENSOR_PINS),
+                        help="taps past the 5 GPIO pins use mock expander pins")
+    parser.add_argument("--rate-hz", type=float, default=800.0, help="pulse rate per tap while pouring")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--mode", choices=("simulate", "interrupt"), default="simulate")
+    parser.add_argument("--pour-seconds", type=float, default=4.0)
+    parser.add_argument("--pause-seconds", type=float, default=1.0)
+    parser.add_argument("--tracemalloc", action="store_true", help="track Python heap growth (slower)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    taps = max(1, min(args.taps, MAX_FLOW_SENSORS))
+    report = run(taps, args.rate_hz, args.seconds, args.mode,
+                 args.pour_seconds, args.pause_seconds, args.tracemalloc)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+    raise SystemExit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
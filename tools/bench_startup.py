@@ -0,0 +1,131 @@
+# keglevel app
+#
+# tools/bench_startup.py
+"""
+SettingsManager startup time over a large keg library.
+
+Builds a scratch data folder holding a keg library of --kegs kegs in the
+pre-schema_version format (legacy field names, missing fields), then starts
+SettingsManager on it: once to migrate, then --runs more times in steady
+state. Reports the wall time of each kind of start and how often each data
+file was parsed per start.
+
+    python tools/bench_startup.py [--kegs 1000] [--runs 10] [--engine json|sqlite] [--output report.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+
+import bench_support  # noqa: F401  (puts src/ on sys.path)
+import settings_store
+from settings_manager import SettingsManager, KEG_LIBRARY_FILE, SETTINGS_FILE, BEVERAGES_FILE
+
+NUM_TAPS = 5
+
+
+def legacy_keg_library(count):
+    """Kegs as an older release wrote them: no stamp, old field names, no pulses or beverage."""
+    kegs = []
+    for i in range(count):
+        kegs.append({
+            "id": str(uuid.uuid4()),
+            "title": f"Keg {i+1:02}",
+            "empty_weight_kg": 4.5,
+            "starting_total_weight_kg": 23.7,
+            "starting_volume_liters": 18.9,
+            "maximum_full_volume_liters": 18.93,
+            "current_dispensed_liters": round(i % 19 * 0.75, 2),
+        })
+    return {"kegs": kegs}
+
+
+class _LoadCounter:
+    """Counts store loads per document while installed."""
+
+    def __init__(self):
+        self.counts = {}
+        self._original = {}
+
+    def __enter__(self):
+        for cls in (settings_store.JsonStore, settings_store.SqliteStore):
+            original = self._original[cls] = cls.load
+            def load(store, name, _original=original):
+                self.counts[name] = self.counts.get(name, 0) + 1
+                return _original(store, name)
+            cls.load = load
+        return self
+
+    def __exit__(self, *exc):
+        for cls, original in self._original.items():
+            cls.load = original
+
+
+def start(data_dir):
+    """One SettingsManager start: (seconds, {document: loads})."""
+    with _LoadCounter() as counter, contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        sm = SettingsManager(NUM_TAPS, data_dir=data_dir)
+        elapsed = time.perf_counter() - t0
+        sm.flush()      # Let migration saves land before the next start
+        sm._store.close()
+    return elapsed, counter.counts
+
+
+def run(kegs, runs, engine):
+    data_dir = tempfile.mkdtemp(prefix="keglevel-startup-")
+    try:
+        # Settings and beverages as a first start creates them, then the legacy kegs
+        start(data_dir)
+        with open(os.path.join(data_dir, KEG_LIBRARY_FILE), "w") as f:
+            json.dump(legacy_keg_library(kegs), f, indent=4)
+        for name in (SETTINGS_FILE, BEVERAGES_FILE):
+            path = os.path.join(data_dir, name)
+            with open(path) as f: doc = json.load(f)
+            doc.pop("schema_version", None)
+            with open(path, "w") as f: json.dump(doc, f, indent=4)
+        if engine == "sqlite":
+            with contextlib.redirect_stdout(io.StringIO()):
+                settings_store.import_json_files(data_dir)
+
+        migrate_s, migrate_loads = start(data_dir)
+        steady = [start(data_dir) for _ in range(runs)]
+        with open(os.path.join(data_dir, KEG_LIBRARY_FILE)) as f:
+            stamped = json.load(f).get("schema_version")
+        return {
+            "kegs": kegs,
+            "engine": engine,
+            "migrating_start_ms": round(migrate_s * 1000, 2),
+            "migrating_loads": migrate_loads,
+            "steady_start_ms": round(statistics.median(s for s, _ in steady) * 1000, 2),
+            "steady_start_min_ms": round(min(s for s, _ in steady) * 1000, 2),
+            "steady_loads": steady[-1][1],
+            "keg_library_schema_version": stamped if engine == "json" else None,
+        }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kegs", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--engine", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args.kegs, args.runs, args.engine)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
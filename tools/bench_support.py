@@ -0,0 +1,112 @@
+# keglevel app
+#
+# tools/bench_support.py
+"""
+Shared helpers for the benchmark scripts in this folder.
+
+The scripts run SensorLogic straight from src/ on any machine (MockGPIO is
+used automatically when RPi.GPIO is missing). BenchSettingsManager stands in
+for SettingsManager so a benchmark never touches the real keglevel_lite-data
+folder.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from settings_manager import ConfigSnapshot  # noqa: E402
+from sensor_logic import DEFAULT_K_FACTOR, DEFAULT_FLOW_SENSOR_PINS  # noqa: E402
+
+
+def bench_pin_map(num_sensors):
+    """The stock GPIO pins, then "mock:<n>" expander pins for any extra taps."""
+    pins = list(DEFAULT_FLOW_SENSOR_PINS[:num_sensors])
+    pins += [f"mock:{n}" for n in range(num_sensors - len(pins))]
+    return pins
+
+
+class BenchSettingsManager:
+    """In-memory subset of SettingsManager used by the sensor backends."""
+
+    def __init__(self, num_sensors, k_factor=DEFAULT_K_FACTOR, keg_volume_liters=19.0, data_dir=None):
+        self.num_sensors = num_sensors
+        self.data_dir = data_dir or tempfile.gettempdir()
+        self.flow_sensor_pins = bench_pin_map(num_sensors)
+        self.config_version = 1
+        self.k_factors = [float(k_factor)] * num_sensors
+        self.keg_map = {}
+        self.assignments = []
+        for i in range(num_sensors):
+            keg_id = str(uuid.uuid4())
+            self.keg_map[keg_id] = {
+                "id": keg_id,
+                "title": f"Keg {i+1:02}",
+                "calculated_starting_volume_liters": keg_volume_liters,
+                "current_dispensed_liters": 0.0,
+                "total_dispensed_pulses": 0,
+            }
+            self.assignments.append(keg_id)
+        self.last_pour_volumes = [0.0] * num_sensors
+        self.keg_saves = 0
+        self.pico_node_pour_cursors = {}
+
+    def get_config_snapshot(self):
+        return ConfigSnapshot(
+            version=self.config_version,
+            displayed_taps=self.num_sensors,
+            k_factors=tuple(self.k_factors),
+            keg_assignments=tuple(self.assignments),
+            display_units="metric",
+        )
+
+    def get_displayed_taps(self): return self.num_sensors
+    def get_flow_calibration_factors(self): return list(self.k_factors)
+    def get_sensor_keg_assignments(self): return list(self.assignments)
+    def get_keg_by_id(self, keg_id): return self.keg_map.get(keg_id)
+    def get_last_pour_volumes(self): return list(self.last_pour_volumes)
+    def get_last_pour_averages(self): return [0.0] * self.num_sensors
+    def get_data_dir(self): return self.data_dir
+    def get_flow_sensor_pins(self): return list(self.flow_sensor_pins)
+    def get_record_pulse_traces(self): return False
+
+    # Pico W backend
+    pico_host = ""
+    def get_pico_w_host(self): return self.pico_host
+    def get_pico_last_known_ip(self): return ""
+    def save_pico_last_known_ip(self, ip): pass
+    pico_nodes = []
+    def get_pico_nodes(self): return [dict(n) for n in self.pico_nodes]
+    # Kept in memory so a backend restarted on the same instance reconciles
+    pico_last_dispensed = None
+    pico_pour_cursor = None
+    def get_pico_tap_last_dispensed(self): return list(self.pico_last_dispensed or [0.0] * self.num_sensors)
+    def get_pico_pour_cursor(self): return dict(self.pico_pour_cursor or {"boot": "", "seq": 0})
+    def save_pico_pour_cursor(self, pour_cursor): self.pico_pour_cursor = dict(pour_cursor)
+    def get_pico_node_pour_cursors(self): return {h: dict(c) for h, c in self.pico_node_pour_cursors.items()}
+    def save_pico_node_pour_cursor(self, host, pour_cursor): self.pico_node_pour_cursors[host] = dict(pour_cursor)
+
+    def save_pico_tap_last_dispensed(self, dispensed_list, pour_cursor=None, node_pour_cursors=None):
+        self.pico_last_dispensed = list(dispensed_list)
+        if pour_cursor is not None: self.pico_pour_cursor = dict(pour_cursor)
+        for host, cursor in (node_pour_cursors or {}).items(): self.pico_node_pour_cursors[host] = dict(cursor)
+
+    def update_keg_dispensed_volume(self, keg_id, dispensed_liters, pulses=0, timestamp=None):
+        keg = self.keg_map.get(keg_id)
+        if not keg: return False
+        keg["current_dispensed_liters"] = dispensed_liters
+        keg["total_dispensed_pulses"] += pulses
+        return True
+
+    def save_all_keg_dispensed_volumes(self):
+        self.keg_saves += 1
+
+    def save_last_pour_volumes(self, volumes_list):
+        self.last_pour_volumes = list(volumes_list)
+
+    def dispensed_pulses(self):
+        """Per-tap pulse totals booked against the assigned kegs."""
+        return [self.keg_map[k]["total_dispensed_pulses"] for k in self.assignments]
@@ -0,0 +1,600 @@
+# keglevel app
+#
+# tools/fake_pico.py
+"""
+A stand-in for the Pico W flow controller, for benchmarks, soak tests and
+desk testing of PicoSensorLogic without hardware.
+
+Serves the REST API the app uses over HTTP/1.1 keep-alive:
+
+    GET  /api/version
+    GET  /api/state[?since=SEQ]      (also honours If-None-Match: "SEQ")
+    GET  /api/pours?after=ID&limit=N (ring buffer of finished pours)
+    GET  /api/tap/<i>/calibrate      POST /api/tap/<i>/calibrate
+    POST /api/tap/<i>/reset          POST /api/config
+    GET  /api/events                 (--stream only)
+
+Replies are MessagePack when the request's Accept header prefers it
+(floats packed as float32, as MicroPython does), JSON otherwise; --legacy
+and --no-msgpack serve JSON only.
+
+Every change to a tap or the temperature bumps a sequence number. A
+conditional /api/state request whose SEQ is current gets 304 Not Modified;
+an older SEQ gets only the taps that changed since ("delta": true). With
+--legacy the server always returns the full document and has no pour log,
+like older firmware.
+
+Pours are random (--busy is the fraction of time each tap pours) and/or
+scripted (--script, a JSON list of {"at": s, "tap": i, "liters": x,
+"lpm": r}). Faults: --latency-ms/--jitter-ms delay every reply, --loss drops
+that fraction of requests (the connection closes with no reply), and
+--reboot-every takes the Pico off the network for --reboot-s. A reboot
+ends running pours and restarts the state sequence; dispensed totals and
+the pour log survive it, as they are kept in flash. --beacon broadcasts the
+UDP discovery packet on DISCOVERY_PORT.
+
+With --stream, /api/events is a Server-Sent Events stream: a "state"
+event with the full document, then pour_start / pour_delta / pour_end and
+temperature events as taps change, and a keep-alive comment when idle.
+A reboot ends it. kill_streams() drops every open stream mid-flight (and
+can refuse new ones for a while), as a Wi-Fi dropout would.
+
+    python tools/fake_pico.py [--port 8080] [--taps 5] [--busy 0.2] [--legacy] [--stream]
+                              [--loss 0.05] [--latency-ms 40] [--reboot-every 600] [--beacon]
+
+In-process, FakePico(clock=VirtualClock()) runs on virtual time: nothing
+moves until the clock is advanced, so soak tests can cover days of pours
+in minutes (see tools/soak_pico.py).
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import pico_codec  # noqa: E402
+
+SIM_STEP_S = 0.1
+DEFAULT_K_FACTOR = 5100.0
+FIRMWARE_VERSION = "fake-1.0"
+POUR_LOG_SIZE = 256
+POUR_LOG_MAX_LIMIT = 100
+CLIENT_TIMEOUT_S = 2.0      # replies later than this are dropped (the client gave up)
+DISCOVERY_PORT = 5005
+DISCOVERY_DEVICE = "keglevel-pico"
+BEACON_INTERVAL_S = 2.0
+STREAM_TICK_S = SIM_STEP_S  # how often an open event stream looks for changes
+STREAM_KEEPALIVE_S = 5.0    # keep-alive comment after this long without events
+
+
+class RealClock:
+    """Wall-clock time; the simulation runs on its own thread."""
+
+    virtual = False
+    monotonic = staticmethod(time.monotonic)
+    perf_counter = staticmethod(time.perf_counter)
+    sleep = staticmethod(time.sleep)
+    time = staticmethod(time.time)      # Last: the name shadows the module below it
+
+
+class VirtualClock:
+    """
+    Simulated time. sleep() and advance() move it forward instantly and
+    step every attached FakePico; time() starts at the real wall clock.
+    Has the time-module functions PicoSensorLogic uses, so it can stand in
+    for that module's `time`.
+    """
+
+    virtual = True
+
+    def __init__(self, start=None):
+        self._epoch = time.time() if start is None else start
+        self.now = 0.0
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def attach(self, callback):
+        """callback(dt) runs on every advance."""
+        self._listeners.append(callback)
+
+    def advance(self, dt):
+        with self._lock:
+            if dt <= 0: return
+            self.now += dt
+            for callback in self._listeners: callback(dt)
+
+    def sleep(self, dt):
+        self.advance(dt)
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def time(self):
+        return self._epoch + self.now
+
+
+class FakePico:
+    """Tap simulation plus the HTTP server in front of it."""
+
+    def __init__(self, taps=5, busy=0.0, legacy=False, host="127.0.0.1", port=0, seed=None,
+                 latency_s=0.0, jitter_s=0.0, loss=0.0, script=None,
+                 reboot_every_s=None, reboot_s=5.0, clock=None, msgpack=True, stream=False):
+        self.num_taps = taps
+        self.busy = busy
+        self.legacy = legacy
+        self.msgpack = msgpack and not legacy
+        self.stream = stream and not legacy
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.loss = loss
+        self.reboot_every_s = reboot_every_s
+        self.reboot_s = reboot_s
+        self.clock = clock or RealClock()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.seq = 1
+        self.taps = [{"dispensed_liters": 0.0, "pouring": False, "flow_rate_lpm": 0.0,
+                      "pulses": 0, "k_factor": DEFAULT_K_FACTOR} for _ in range(taps)]
+        self.tap_seq = [self.seq] * taps
+        self.temperature = {"ambient_c": 20.0, "keg_c": 3.5}
+        self.temperature_seq = self.seq
+        self.cal_pulses = [None] * taps
+        self._pour_left_s = [0.0] * taps
+        self._pour_start = [0.0] * taps
+        self._pulse_frac = [0.0] * taps
+        self._temp_next = 0.0
+        self.pour_log = deque(maxlen=POUR_LOG_SIZE)
+        self.pour_boot = "%08x" % self.rng.getrandbits(32)
+        self.pour_seq = 0
+        self.pour_log_state_seq = self.seq
+
+        self.elapsed = 0.0          # Simulated seconds since start
+        self.started_at = self.clock.time()
+        self.script = sorted(script or [], key=lambda p: p["at"])
+        self._script_next = 0
+        self._down_until = 0.0
+        self._next_reboot = reboot_every_s
+        self._stream_epoch = 0      # bumped by kill_streams(); older streams end
+        self._stream_down_until = 0.0
+
+        self.requests = 0
+        self.dropped = 0
+        self.reboots = 0
+        self.pours = 0
+        self.streams = 0
+        self.stream_kills = 0
+        self.bytes_sent = 0         # Everything written to clients, headers included
+
+        pico = self
+
+        class Handler(_Handler):
+            fake = pico
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = "%s:%d" % self.server.server_address[:2]
+        self._running = False
+        self._beacon = None
+
+    # --- lifecycle ---
+
+    def start(self, beacon_to=None):
+        """Starts serving; beacon_to ("255.255.255.255" etc.) also starts the UDP beacon."""
+        self._running = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.clock.virtual:
+            self.clock.attach(self.advance)
+        else:
+            threading.Thread(target=self._sim_loop, daemon=True).start()
+        if beacon_to:
+            self._beacon = threading.Thread(target=self._beacon_loop, args=(beacon_to,), daemon=True)
+            self._beacon.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- simulation ---
+
+    def _sim_loop(self):
+        while self._running:
+            self.advance(SIM_STEP_S)
+            time.sleep(SIM_STEP_S)
+
+    def advance(self, dt):
+        """Runs the simulation forward by dt seconds, in SIM_STEP_S slices."""
+        while dt > 1e-9:
+            step = min(dt, SIM_STEP_S)
+            self.step(step)
+            dt -= step
+
+    def step(self, dt):
+        """Advances every tap by dt seconds."""
+        with self.lock:
+            self.elapsed += dt
+            if self._next_reboot is not None and self.elapsed >= self._next_reboot:
+                self._next_reboot += self.reboot_every_s
+                self._reboot_locked(self.reboot_s)
+            while self._script_next < len(self.script) and self.script[self._script_next]["at"] <= self.elapsed:
+                self._start_scripted_pour(self.script[self._script_next])
+                self._script_next += 1
+            for i, tap in enumerate(self.taps):
+                if self._pour_left_s[i] <= 0 and self.busy > 0:
+                    # Start pours so each tap pours `busy` of the time on average
+                    mean_pour_s = 5.0
+                    if self.rng.random() < dt * self.busy / (mean_pour_s * max(0.01, 1.0 - self.busy)):
+                        self._start_pour(i, self.rng.uniform(3.0, 8.0), round(self.rng.uniform(2.0, 4.0), 2))
+                if self._pour_left_s[i] > 0:
+                    pour_dt = min(dt, self._pour_left_s[i])
+                    self._pour_left_s[i] -= dt
+                    # Carry the fraction so a scripted volume comes out exact
+                    exact = tap["flow_rate_lpm"] / 60.0 * pour_dt * tap["k_factor"] + self._pulse_frac[i]
+                    pulses = int(exact)
+                    self._pulse_frac[i] = exact - pulses
+                    self._add_pulses(i, pulses)
+                    if self._pour_left_s[i] <= 0:
+                        self._end_pour(i)
+                    else:
+                        tap["pouring"] = True
+                        self._touch(i)
+            self._temp_next -= dt
+            if self._temp_next <= 0:
+                self._temp_next = 30.0
+                self.temperature["keg_c"] = round(self.temperature["keg_c"] + self.rng.choice((-0.1, 0.1)), 1)
+                self.seq += 1
+                self.temperature_seq = self.seq
+
+    def _start_pour(self, i, seconds, lpm):
+        self._pour_left_s[i] = seconds
+        self._pour_start[i] = self.taps[i]["dispensed_liters"]
+        self.taps[i]["flow_rate_lpm"] = lpm
+
+    def _start_scripted_pour(self, entry):
+        i = int(entry["tap"])
+        if not 0 <= i < self.num_taps or self._pour_left_s[i] > 0: return
+        lpm = float(entry.get("lpm", 3.0))
+        self._start_pour(i, float(entry["liters"]) / lpm * 60.0, lpm)
+
+    def _end_pour(self, i):
+        tap = self.taps[i]
+        self._pour_left_s[i] = 0.0
+        tap["pouring"] = False
+        tap["flow_rate_lpm"] = 0.0
+        self._touch(i)
+        self._log_pour(i)
+
+    def _add_pulses(self, i, pulses):
+        tap = self.taps[i]
+        tap["pulses"] += pulses
+        tap["dispensed_liters"] = round(tap["pulses"] / tap["k_factor"], 4)
+        if self.cal_pulses[i] is not None: self.cal_pulses[i] += pulses
+
+    def _touch(self, i):
+        self.seq += 1
+        self.tap_seq[i] = self.seq
+
+    def _log_pour(self, i):
+        total = self.taps[i]["dispensed_liters"]
+        self.pour_seq += 1
+        self.pours += 1
+        self.pour_log.append({"id": self.pour_seq, "tap": i,
+                              "liters": round(total - self._pour_start[i], 4),
+                              "end_total": total, "ended_at": round(self.started_at + self.elapsed, 3)})
+        self.pour_log_state_seq = self.seq
+
+    def reboot(self, down_s=None):
+        """Takes the Pico off the network for down_s seconds (default reboot_s)."""
+        with self.lock:
+            self._reboot_locked(self.reboot_s if down_s is None else down_s)
+
+    def _reboot_locked(self, down_s):
+        for i in range(self.num_taps):
+            if self._pour_left_s[i] > 0: self._end_pour(i)
+            self.cal_pulses[i] = None
+        # The state sequence lives in RAM; totals and the pour log are in flash
+        self.seq = 1
+        self.tap_seq = [self.seq] * self.num_taps
+        self.temperature_seq = self.pour_log_state_seq = self.seq
+        self._down_until = max(self._down_until, self.elapsed + down_s)    # A reboot never shortens an outage
+        self.reboots += 1
+
+    def is_down(self):
+        return self.elapsed < self._down_until
+
+    def request_fate(self):
+        """None to drop the request, else the reply delay in seconds."""
+        if self.is_down() or (self.loss and self.rng.random() < self.loss):
+            return None
+        delay = self.latency_s
+        if self.jitter_s: delay += self.rng.uniform(0.0, self.jitter_s)
+        if delay >= CLIENT_TIMEOUT_S:
+            return None
+        return delay
+
+    # --- API ---
+
+    def state_document(self, since=None):
+        """(status, body dict or None, etag) for GET /api/state."""
+        with self.lock:
+            etag = '"%d"' % self.seq
+            pour_log = {"boot": self.pour_boot, "seq": self.pour_seq}
+            if self.legacy:
+                return 200, {"seq": self.seq, "taps": [dict(t) for t in self.taps],
+                             "temperature": dict(self.temperature)}, etag
+            if since is None or since > self.seq:
+                return 200, {"seq": self.seq, "taps": [dict(t) for t in self.taps],
+                             "temperature": dict(self.temperature), "pour_log": pour_log}, etag
+            if since == self.seq:
+                return 304, None, etag
+            doc = {"seq": self.seq, "delta": True,
+                   "taps": [dict(t, tap=i) for i, t in enumerate(self.taps) if self.tap_seq[i] > since]}
+            if self.temperature_seq > since:
+                doc["temperature"] = dict(self.temperature)
+            if self.pour_log_state_seq > since:
+                doc["pour_log"] = pour_log
+            return 200, doc, etag
+
+    def pour_log_page(self, after, limit):
+        """Body of GET /api/pours: pours with id > after, oldest first."""
+        with self.lock:
+            pours = [dict(p) for p in self.pour_log if p["id"] > after]
+            page = pours[:max(1, min(limit, POUR_LOG_MAX_LIMIT))]
+            return {"boot": self.pour_boot,
+                    "oldest": self.pour_log[0]["id"] if self.pour_log else self.pour_seq + 1,
+                    "next": page[-1]["id"] if page else min(after, self.pour_seq),
+                    "more": len(pours) > len(page), "pours": page}
+
+    def handle(self, method, path, body=None, headers=None):
+        """Routes one request; returns (status, body dict or None, extra headers)."""
+        route, _, query = path.partition("?")
+        if method == "GET" and route == "/api/version":
+            return 200, {"version": FIRMWARE_VERSION}, {}
+        if method == "GET" and route == "/api/state":
+            since = _parse_since(query, headers)
+            status, doc, etag = self.state_document(since)
+            return status, doc, ({} if self.legacy else {"ETag": etag})
+        if method == "GET" and route == "/api/pours" and not self.legacy:
+            after = re.search(r"(?:^|&)after=(\d+)", query)
+            limit = re.search(r"(?:^|&)limit=(\d+)", query)
+            return 200, self.pour_log_page(int(after.group(1)) if after else 0,
+                                           int(limit.group(1)) if limit else POUR_LOG_MAX_LIMIT), {}
+        m = re.fullmatch(r"/api/tap/(\d+)/(calibrate|reset)", route)
+        if m and int(m.group(1)) < self.num_taps:
+            i = int(m.group(1))
+            with self.lock:
+                if m.group(2) == "reset" and method == "POST":
+                    self.taps[i].update(dispensed_liters=0.0, pulses=0)
+                    self._touch(i)
+                    return 200, {"ok": True}, {}
+                if m.group(2) == "calibrate" and method == "GET":
+                    if self.cal_pulses[i] is None: self.cal_pulses[i] = 0
+                    return 200, {"pulses": self.cal_pulses[i]}, {}
+                if m.group(2) == "calibrate" and method == "POST":
+                    pulses, self.cal_pulses[i] = self.cal_pulses[i] or 0, None
+                    return 200, {"pulses": pulses}, {}
+        if method == "POST" and route == "/api/config":
+            k_factors = (body or {}).get("k_factors") or []
+            with self.lock:
+                for i, k in enumerate(k_factors[:self.num_taps]):
+                    self.taps[i]["k_factor"] = float(k)
+                    self._touch(i)
+            return 200, {"ok": True}, {}
+        return 404, {"error": "not found"}, {}
+
+    # --- event stream ---
+
+    def serves_stream(self):
+        return self.stream and self.elapsed >= self._stream_down_until
+
+    def open_stream(self):
+        """(cursor, full state document) for a new GET /api/events."""
+        with self.lock:
+            self.streams += 1
+            cursor = {"epoch": self._stream_epoch, "taps": list(self.tap_seq),
+                      "pouring": [t["pouring"] for t in self.taps], "temperature": self.temperature_seq}
+        # Taken after the cursor: a change in between is sent again, which is harmless
+        return cursor, self.state_document()[1]
+
+    def stream_events(self, cursor):
+        """[(event, payload)] since cursor, which moves on; None once the stream must end."""
+        with self.lock:
+            if not self._running or self.is_down() or cursor["epoch"] != self._stream_epoch:
+                return None
+            events = []
+            for i, tap in enumerate(self.taps):
+                if self.tap_seq[i] <= cursor["taps"][i]: continue
+                if tap["pouring"]:
+                    event = "pour_delta" if cursor["pouring"][i] else "pour_start"
+                else:
+                    event = "pour_end"
+                cursor["taps"][i], cursor["pouring"][i] = self.tap_seq[i], tap["pouring"]
+                events.append((event, {"tap": i, "dispensed_liters": tap["dispensed_liters"],
+                                       "flow_rate_lpm": tap["flow_rate_lpm"]}))
+            if self.temperature_seq > cursor["temperature"]:
+                cursor["temperature"] = self.temperature_seq
+                events.append(("temperature", dict(self.temperature)))
+            return events
+
+    def wire_floats(self, doc):
+        """doc with the float32 values the MessagePack replies carry, so stream and poll agree."""
+        return pico_codec.unpackb(pico_codec.packb(doc, single_float=True)) if self.msgpack else doc
+
+    def kill_streams(self, refuse_s=0.0):
+        """Drops every open event stream; /api/events then answers 404 for refuse_s."""
+        with self.lock:
+            self._stream_epoch += 1
+            self.stream_kills += 1
+            self._stream_down_until = max(self._stream_down_until, self.elapsed + refuse_s)
+
+    # --- discovery ---
+
+    def beacon_payload(self):
+        return json.dumps({"device": DISCOVERY_DEVICE, "ip": self.server.server_address[0]}).encode()
+
+    def _beacon_loop(self, target):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        try:
+            while self._running:
+                if not self.is_down():
+                    try: sock.sendto(self.beacon_payload(), (target, DISCOVERY_PORT))
+                    except OSError: pass
+                time.sleep(BEACON_INTERVAL_S)
+        finally:
+            sock.close()
+
+
+def _parse_since(query, headers):
+    m = re.search(r"(?:^|&)since=(\d+)", query)
+    if m: return int(m.group(1))
+    inm = (headers or {}).get("If-None-Match") or ""
+    m = re.fullmatch(r'\s*(?:W/)?"(\d+)"\s*', inm)
+    return int(m.group(1)) if m else None
+
+
+class _CountingWriter:
+    def __init__(self, raw, fake):
+        self.raw = raw
+        self.fake = fake
+
+    def write(self, data):
+        self.fake.bytes_sent += len(data)
+        return self.raw.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.wfile = _CountingWriter(self.wfile, self.fake)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.partition("?")[0] == "/api/events" and self.fake.serves_stream():
+            self._event_stream()
+        else:
+            self._dispatch("GET", None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try: body = json.loads(raw.decode() or "{}")
+        except ValueError: body = {}
+        self._dispatch("POST", body)
+
+    def _dispatch(self, method, body):
+        fake = self.fake
+        delay = fake.request_fate()
+        if delay is None:
+            # Lost request, timeout or rebooting: hang up without a reply
+            fake.dropped += 1
+            self.close_connection = True
+            return
+        if delay: fake.clock.sleep(delay)
+        status, doc, extra = fake.handle(method, self.path, body, self.headers)
+        if fake.msgpack and pico_codec.prefers_msgpack(self.headers.get("Accept")):
+            ctype = pico_codec.MSGPACK_TYPE
+            payload = pico_codec.packb(doc, single_float=True) if doc is not None else b""
+        else:
+            ctype = pico_codec.JSON_TYPE
+            payload = json.dumps(doc, separators=(",", ":")).encode() if doc is not None else b""
+        self.send_response(status)
+        if payload: self.send_header("Content-Type", ctype)
+        for k, v in extra.items(): self.send_header(k, v)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if payload: self.wfile.write(payload)
+        fake.requests += 1
+
+    def _event_stream(self):
+        fake = self.fake
+        if fake.request_fate() is None:
+            fake.dropped += 1
+            self.close_connection = True
+            return
+        fake.requests += 1
+        cursor, state = fake.open_stream()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True        # No length: the stream ends with the connection
+        events, idle_s = [("state", state)], 0.0
+        try:
+            while events is not None:
+                if events:
+                    idle_s = 0.0
+                    self.wfile.write("".join("event: %s\ndata: %s\n\n" % (event, json.dumps(fake.wire_floats(data), separators=(",", ":")))
+                                             for event, data in events).encode())
+                elif idle_s >= STREAM_KEEPALIVE_S:
+                    idle_s = 0.0
+                    self.wfile.write(b": keep-alive\n\n")
+                # On a VirtualClock this moves simulated time, as a poll loop's sleep would
+                fake.clock.sleep(STREAM_TICK_S)
+                idle_s += STREAM_TICK_S
+                events = fake.stream_events(cursor)
+        except OSError:
+            pass    # The client hung up
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--taps", type=int, default=5)
+    parser.add_argument("--busy", type=float, default=0.0, help="fraction of time each tap pours")
+    parser.add_argument("--legacy", action="store_true", help="always send the full state document")
+    parser.add_argument("--no-msgpack", action="store_true", help="answer in JSON only")
+    parser.add_argument("--stream", action="store_true", help="serve the /api/events push stream")
+    parser.add_argument("--script", help="JSON file of scripted pours")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of requests dropped")
+    parser.add_argument("--reboot-every", type=float, help="seconds between reboots")
+    parser.add_argument("--reboot-s", type=float, default=5.0, help="time off the network per reboot")
+    parser.add_argument("--beacon", nargs="?", const="255.255.255.255",
+                        help="broadcast the discovery beacon (to this address)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f: script = json.load(f)
+    pico = FakePico(args.taps, args.busy, args.legacy, args.host, args.port, args.seed,
+                    latency_s=args.latency_ms / 1000.0, jitter_s=args.jitter_ms / 1000.0, loss=args.loss,
+                    script=script, reboot_every_s=args.reboot_every, reboot_s=args.reboot_s,
+                    msgpack=not args.no_msgpack, stream=args.stream)
+    pico.start(beacon_to=args.beacon)
+    print(f"Fake Pico listening on {pico.address} (taps={args.taps}, busy={args.busy}, legacy={args.legacy}, "
+          f"msgpack={pico.msgpack}, stream={pico.stream}, loss={args.loss}, latency={args.latency_ms}+{args.jitter_ms} ms)")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        pico.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# keglevel app
+#
+# tools/replay_pulse_trace.py
+"""
+Replays a recorded pulse trace (.klpt) through SensorLogic and reports what
+the loop made of it: pulses booked, liters and pours per tap.
+
+Traces are written by SensorLogic.start_pulse_trace(), or automatically when
+the "record_pulse_traces" system setting is on (data_dir/pulse_traces).
+Replaying one from the bar reproduces phantom-pour and missed-pulse reports
+on a desk, and gives loop changes real traffic to be measured against.
+
+    python tools/replay_pulse_trace.py TRACE [--speed 100] [--mode interrupt|simulate]
+
+--mode interrupt (default) sends every edge through count_pulse(pin), like a
+GPIO interrupt; --mode simulate groups edges through simulate_pulse_increment.
+Above 1x the loop's stop gap and flow rates scale with the speed, so pours
+close together may merge; replay at 1x to check pour boundaries.
+Nothing is written to the real keglevel_lite-data folder.
+"""
+import argparse
+import json
+import time
+
+import bench_support
+import sensor_logic
+import pulse_trace
+from sensor_logic import SensorLogic, FLOW_SENSOR_PINS, PIN_TO_SLOT
+
+
+def run(path, speed, mode):
+    summary = pulse_trace.summarize_trace(path)
+    taps = max([PIN_TO_SLOT[p] + 1 for p in summary["edges_per_pin"] if p in PIN_TO_SLOT] or [1])
+    settings = bench_support.BenchSettingsManager(taps)
+    k_factor = settings.k_factors[0]
+    pours = [[] for _ in range(taps)]
+
+    def on_update(idx, rate, rem, status, pour_vol):
+        if status == "Pouring" and (not pours[idx] or pours[idx][-1]["closed"]):
+            pours[idx].append({"closed": False, "peak_lpm": 0.0, "liters": 0.0})
+        if pours[idx] and not pours[idx][-1]["closed"]:
+            pour = pours[idx][-1]
+            pour["peak_lpm"] = max(pour["peak_lpm"], rate)
+            pour["liters"] = pour_vol
+            if status == "Idle": pour["closed"] = True
+
+    logic = SensorLogic(taps, {"update_sensor_data_cb": on_update}, settings)
+    logic.start_monitoring()
+
+    start = time.monotonic()
+    if mode == "simulate":
+        sent = pulse_trace.replay_trace(path, speed, sensor_logic=logic)
+    else:
+        sent = pulse_trace.replay_trace(path, speed)
+    wall = time.monotonic() - start
+
+    # Let the last pour reach its stop gap
+    time.sleep(sensor_logic.FLOW_STOP_GAP_SECONDS + 0.5)
+    logic.stop_monitoring()
+
+    booked = settings.dispensed_pulses()
+    results = []
+    for i in range(taps):
+        results.append({
+            "tap": i + 1,
+            "pin": FLOW_SENSOR_PINS[i],
+            "edges_in_trace": summary["edges_per_pin"].get(FLOW_SENSOR_PINS[i], 0),
+            "pulses_booked": booked[i],
+            "liters_booked": round(logic.keg_dispensed_liters[i], 4),
+            "pours": [{"liters": round(p["liters"], 4), "peak_lpm": round(p["peak_lpm"], 2)} for p in pours[i]],
+        })
+    return {
+        "trace": path,
+        "trace_seconds": round(summary["duration_s"], 3),
+        "speed": speed,
+        "mode": mode,
+        "replay_seconds": round(wall, 3),
+        "edges_sent": sent,
+        "k_factor": k_factor,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help=f"playback speed, up to {pulse_trace.MAX_REPLAY_SPEED:g}x")
+    parser.add_argument("--mode", choices=("interrupt", "simulate"), default="interrupt")
+    args = parser.parse_args()
+    print(json.dumps(run(args.trace, args.speed, args.mode), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# keglevel app
+#
+# tools/soak_pico.py
+"""
+Soak test of the Pico backend on virtual time.
+
+PicoSensorLogic's poll loop runs against tools/fake_pico.py with random
+pours, packet loss, latency and Pico reboots. Every few hours the host
+"restarts": its backend is shut down, the Pico keeps pouring through the
+outage, and a new backend has to reconcile on startup (pour log, then
+dispensed totals). Time is virtual -- sleeps in the poll loop and reply
+latency advance a shared clock instantly -- so a day runs in about a
+minute over real loopback HTTP.
+
+--outage-h takes the Pico off the network for that long in the middle of
+the run (it must be shorter than --hours), to check that the poll loop
+survives a multi-day outage and picks up again (use --host-restart-every-h
+0 so one backend sees all of it).
+
+--stream has the backend follow the Pico's push event stream instead of
+polling it; every --stream-kill-every-min the stream is dropped in the
+middle of a pour and the endpoint refuses reconnects for
+--stream-refuse-s, so the backend has to catch up by polling and then
+reconnect.
+
+At the end the Pico goes quiet, and every keg must have booked exactly
+what the Pico measured on its tap.
+
+    python tools/soak_pico.py [--hours 24] [--loss 0.02] [--reboot-every-h 6]
+                              [--host-restart-every-h 8] [--outage-h 72] [--stream] [--output report.json]
+"""
+import argparse
+import json
+import time
+
+import bench_support
+import pico_sensor_logic
+from fake_pico import FakePico, VirtualClock
+from pico_sensor_logic import PicoSensorLogic
+
+DRAIN_S = 120.0             # quiet time at the end so the host catches up
+TOLERANCE_LITERS = 0.01
+
+
+def run(args):
+    clock = VirtualClock()
+    pico = FakePico(taps=args.taps, busy=args.busy, seed=args.seed,
+                    latency_s=args.latency_ms / 1000.0, jitter_s=args.jitter_ms / 1000.0, loss=args.loss,
+                    reboot_every_s=args.reboot_every_h * 3600.0 if args.reboot_every_h else None,
+                    reboot_s=args.reboot_s, clock=clock, stream=args.stream).start()
+    settings = bench_support.BenchSettingsManager(args.taps, keg_volume_liters=1e6)
+    settings.pico_host = pico.address
+
+    offline_reports = [0]
+    ui_updates = [0]
+    last_status = {}
+
+    def on_batch(batch):
+        ui_updates[0] += len(batch)
+        for idx, _rate, _rem, status, _vol in batch:
+            if status == "Offline" and last_status.get(idx) != "Offline":
+                offline_reports[0] += 1
+            last_status[idx] = status
+
+    deadline = [0.0]
+    current = [None]
+    outage_at = [(args.hours - args.outage_h) * 1800.0 if args.outage_h else None]
+    max_failures = [0]
+    kill_every = args.stream_kill_every_min * 60.0 if args.stream else 0.0
+    next_kill = [kill_every]
+    stream_stats = {"connects": 0, "events": 0, "kills_mid_pour": 0}
+
+    def stop_at_deadline(_dt):
+        if outage_at[0] is not None and clock.now >= outage_at[0]:
+            outage_at[0] = None
+            pico.reboot(down_s=args.outage_h * 3600.0)
+        if current[0] is not None:
+            max_failures[0] = max(max_failures[0], current[0]._scheduler.failures)
+            if (kill_every and clock.now >= next_kill[0] and current[0]._stream_conn is not None
+                    and any(tap["pouring"] for tap in pico.taps)):
+                next_kill[0] = clock.now + kill_every
+                stream_stats["kills_mid_pour"] += 1
+                pico.kill_streams(refuse_s=args.stream_refuse_s)
+            if clock.now >= deadline[0]:
+                current[0]._running = False
+    clock.attach(stop_at_deadline)
+
+    def run_backend_until(t):
+        logic = PicoSensorLogic(args.taps, {"update_sensor_batch_cb": on_batch}, settings)
+        current[0], deadline[0] = logic, t
+        logic._running = True
+        logic._sensor_loop()            # Returns once the clock passes the deadline
+        stream_stats["connects"] += logic._stream_connects
+        stream_stats["events"] += logic._stream_events
+        logic.cleanup_gpio()            # Saves the baselines, as on app close
+        current[0] = None
+
+    original_time = pico_sensor_logic.time
+    pico_sensor_logic.time = clock
+    wall_start = time.monotonic()
+    end = args.hours * 3600.0
+    restart_every = args.host_restart_every_h * 3600.0 if args.host_restart_every_h else end
+    restarts = 0
+    try:
+        while clock.now < end:
+            run_backend_until(min(end, clock.now + restart_every))
+            if clock.now < end:
+                restarts += 1
+                clock.advance(args.host_down_min * 60.0)   # Host down, Pico keeps pouring
+        # Quiet end: no new pours or faults, one last backend catches up
+        pico.busy, pico.loss, pico.reboot_every_s, pico._next_reboot = 0.0, 0.0, None, None
+        clock.advance(10.0)
+        run_backend_until(clock.now + DRAIN_S)
+    finally:
+        pico_sensor_logic.time = original_time
+        pico.stop()
+    wall = time.monotonic() - wall_start
+
+    per_tap = []
+    for i in range(args.taps):
+        measured = pico.taps[i]["dispensed_liters"]
+        booked = settings.keg_map[settings.assignments[i]]["current_dispensed_liters"]
+        per_tap.append({"tap": i + 1, "pico_liters": round(measured, 4), "booked_liters": round(booked, 4),
+                        "diff_liters": round(booked - measured, 4)})
+    worst = max(abs(t["diff_liters"]) for t in per_tap)
+    return {
+        "virtual_hours": round(clock.now / 3600.0, 2),
+        "wall_seconds": round(wall, 1),
+        "speedup": round(clock.now / wall) if wall > 0 else None,
+        "config": vars(args),
+        "pico": {"requests": pico.requests, "dropped": pico.dropped, "reboots": pico.reboots,
+                 "pours": pico.pours, "kib_sent": round(pico.bytes_sent / 1024.0, 1)},
+        "host_restarts": restarts,
+        "offline_reports": offline_reports[0],
+        "max_poll_failures": max_failures[0],
+        "stream": stream_stats if args.stream else None,
+        "ui_updates": ui_updates[0],
+        "per_tap": per_tap,
+        "max_diff_liters": worst,
+        "ok": worst <= TOLERANCE_LITERS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24.0, help="virtual run length")
+    parser.add_argument("--taps", type=int, default=5)
+    parser.add_argument("--busy", type=float, default=0.02, help="fraction of time each tap pours")
+    parser.add_argument("--loss", type=float, default=0.02)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--reboot-every-h", type=float, default=6.0)
+    parser.add_argument("--reboot-s", type=float, default=30.0)
+    parser.add_argument("--host-restart-every-h", type=float, default=8.0)
+    parser.add_argument("--host-down-min", type=float, default=45.0)
+    parser.add_argument("--outage-h", type=float, default=0.0, help="Pico off the network this long, mid-run")
+    parser.add_argument("--stream", action="store_true", help="use the push event stream")
+    parser.add_argument("--stream-kill-every-min", type=float, default=30.0)
+    parser.add_argument("--stream-refuse-s", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.outage_h >= args.hours:
+        parser.error("--outage-h must be shorter than --hours")
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+    raise SystemExit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()